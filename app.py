@@ -1,4 +1,6 @@
 import streamlit as st
+from utils.ee_cache import cache_stats
+from utils.tile_proxy import get_tile_proxy
 
 # Contenu de la barre latérale
 with st.sidebar:
@@ -39,6 +41,29 @@ with st.sidebar:
         """
     )
 
+    # Statistiques du cache Earth Engine (chaque succès est une requête évitée)
+    st.markdown("---")
+    with st.expander("Cache Earth Engine"):
+        stats = cache_stats()
+        if stats:
+            st.table({name: {'Succès': v['hits'], 'Échecs': v['misses'], 'Taux': f"{v['hit_rate']:.0%}"} for name, v in stats.items()})
+            st.caption(f"Requêtes Earth Engine évitées : {sum(v['hits'] for v in stats.values())}")
+        else:
+            st.caption("Aucune statistique pour le moment.")
+
+    # Statistiques du proxy de tuiles local (TILE_PROXY=1)
+    tile_proxy = get_tile_proxy()
+    if tile_proxy is not None:
+        with st.expander("Proxy de tuiles"):
+            proxy_stats = tile_proxy.stats()
+            st.metric("Taux de succès", f"{proxy_stats['hit_rate']:.0%}")
+            st.caption(
+                f"{proxy_stats['hits']} tuiles servies depuis le disque, {proxy_stats['misses']} depuis Earth Engine, "
+                f"{proxy_stats['errors']} erreurs"
+            )
+            if proxy_stats['hit_ms'] is not None and proxy_stats['miss_ms'] is not None:
+                st.caption(f"Latence moyenne : {proxy_stats['hit_ms']:.0f} ms (disque), {proxy_stats['miss_ms']:.0f} ms (Earth Engine)")
+
 
 
    
@@ -0,0 +1,63 @@
+"""
+Throughput of the NumPy vegetation-index kernels (utils/indices.py).
+
+For every index of the registry, measures the pixels per second of numpy_index on
+random Sentinel-2 reflectances, then of numpy_indices computing all of them in one pass.
+
+Usage (from the repository root):
+    python benchmarks/indices.py                # 4096 x 4096 pixels
+    python benchmarks/indices.py --size 1024 --repeat 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.indices import INDICES, index_bands, numexpr, numpy_index, numpy_indices  # noqa: E402
+
+
+def best_time(func, repeat):
+    """
+    Best wall-clock time of func over repeat runs.
+
+    Returns:
+        float: Seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=4096, help="side of the square test raster in pixels")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per kernel (the best is kept)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    bands = {
+        band: rng.integers(1, 10000, size=(args.size, args.size), dtype='uint16')
+        for band in index_bands(list(INDICES))
+    }
+    pixels = args.size * args.size
+
+    print(f"{pixels:,} pixels, {'numexpr' if numexpr is not None else 'NumPy'} kernels")
+    print(f"{'index':<10} {'Mpixels/s':>10}")
+    for index in INDICES:
+        seconds = best_time(lambda: numpy_index(bands, index), args.repeat)
+        print(f"{index:<10} {pixels / seconds / 1e6:>10.1f}")
+
+    seconds = best_time(lambda: numpy_indices(bands, list(INDICES)), args.repeat)
+    print(f"{'all (' + str(len(INDICES)) + ')':<10} {pixels / seconds / 1e6:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
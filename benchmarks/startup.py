@@ -0,0 +1,164 @@
+"""
+Cold-start benchmark for the Streamlit app.
+
+For app.py and every page, measures in a fresh interpreter:
+- the import time of the script's top-level imports;
+- the first-render time (imports included) with streamlit.testing.AppTest.
+
+Usage (from the repository root):
+    python benchmarks/startup.py             # compare with benchmarks/startup_budget.json
+    python benchmarks/startup.py --update    # record the current timings as the budget
+
+Exits with status 1 when a timing exceeds its budget by more than --tolerance. Scripts
+without a recorded budget are reported but do not fail the run.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(ROOT, "benchmarks", "startup_budget.json")
+
+IMPORT_SNIPPET = """
+import ast, json, sys, time
+path = sys.argv[1]
+with open(path, encoding="utf-8") as f:
+    tree = ast.parse(f.read())
+imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+code = compile(ast.Module(body=imports, type_ignores=[]), path, "exec")
+start = time.perf_counter()
+exec(code, {"__name__": "__startup_benchmark__"})
+print(json.dumps(time.perf_counter() - start))
+"""
+
+RENDER_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[2]))
+app.run()
+print(json.dumps({"seconds": time.perf_counter() - start, "exceptions": [e.message for e in app.exception]}))
+"""
+
+
+def scripts():
+    """
+    The entry point and the pages of the app.
+
+    Returns:
+        list: Paths relative to the repository root.
+    """
+    pages = sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+    return ["app.py"] + [os.path.relpath(page, ROOT) for page in pages]
+
+
+def run_snippet(snippet, *args, timeout=120):
+    """
+    Run a snippet in a fresh interpreter from the repository root.
+
+    Returns:
+        The JSON value printed by the snippet.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run(
+        [sys.executable, "-c", snippet, *args],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(script, repeat, render_timeout):
+    """
+    Median cold import and first-render times of a script.
+
+    Returns:
+        dict: {'import_s': float, 'render_s': float or None, 'errors': [str, ...]}
+    """
+    path = os.path.join(ROOT, script)
+    errors = []
+
+    try:
+        import_times = [run_snippet(IMPORT_SNIPPET, path) for _ in range(repeat)]
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        return {"import_s": None, "render_s": None, "errors": [f"import: {e}"]}
+
+    render_times = []
+    for _ in range(repeat):
+        try:
+            result = run_snippet(RENDER_SNIPPET, path, str(render_timeout), timeout=render_timeout + 30)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            errors.append(f"render: {e}")
+            break
+        render_times.append(result["seconds"])
+        errors.extend(result["exceptions"])
+
+    return {
+        "import_s": statistics.median(import_times),
+        "render_s": statistics.median(render_times) if render_times else None,
+        "errors": sorted(set(errors)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="cold runs per script (median is kept)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default: 20%%)")
+    parser.add_argument("--render-timeout", type=float, default=60, help="first-render timeout in seconds")
+    parser.add_argument("--update", action="store_true", help="record the current timings as the budget")
+    args = parser.parse_args()
+
+    budget = {}
+    if os.path.exists(BUDGET_FILE):
+        with open(BUDGET_FILE) as f:
+            budget = json.load(f)
+    elif not args.update:
+        print(f"Warning: no budget in {os.path.relpath(BUDGET_FILE, ROOT)}, timings are only reported "
+              f"(record one with --update).")
+
+    results = {}
+    failures = []
+    print(f"{'script':<45} {'import (s)':>11} {'render (s)':>11}  budget")
+    for script in scripts():
+        result = measure(script, args.repeat, args.render_timeout)
+        results[script] = {
+            key: round(result[key], 3) if result[key] is not None else None for key in ("import_s", "render_s")
+        }
+
+        status = []
+        for key in ("import_s", "render_s"):
+            limit = budget.get(script, {}).get(key)
+            if limit is None or result[key] is None:
+                continue
+            if result[key] > limit * (1 + args.tolerance):
+                failures.append(f"{script}: {key} {result[key]:.3f}s > {limit:.3f}s budget")
+                status.append(f"{key} over")
+        if result["import_s"] is None:
+            failures.append(f"{script}: could not be imported")
+        timings = [f"{result[key]:.3f}" if result[key] is not None else "-" for key in ("import_s", "render_s")]
+        print(f"{script:<45} {timings[0]:>11} {timings[1]:>11}  {', '.join(status) or ('ok' if script in budget else 'none')}")
+        for error in result["errors"]:
+            print(f"    ! {error}")
+
+    if args.update:
+        with open(BUDGET_FILE, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Budget written to {os.path.relpath(BUDGET_FILE, ROOT)}")
+        return 0
+
+    if failures:
+        print("\nStart-up benchmark failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Latency and hit rate of the local tile proxy (utils/tile_proxy.py).
+
+Starts a stand-in upstream tile server (each tile delayed by --latency ms, like a
+remote tile server), points a TileProxy with a temporary store at it, requests a grid
+of tiles twice and prints the mean miss and hit latency and the hit rate.
+
+Usage (from the repository root):
+    python benchmarks/tile_proxy.py                 # 8 x 8 tiles, 150 ms upstream
+    python benchmarks/tile_proxy.py --tiles 16 --latency 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tile_proxy import TileProxy, TileStore  # noqa: E402
+
+TILE_BYTES = 20000  # about the size of an Earth Engine PNG tile
+
+
+def start_upstream(latency):
+    """
+    Stand-in tile server answering every path with a fixed-size PNG body after a delay.
+
+    Returns:
+        ThreadingHTTPServer: The running server (port in server_address).
+    """
+    body = b"\x89PNG" + os.urandom(TILE_BYTES)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def request_all(urls):
+    """
+    Request every URL and check the answers.
+
+    Returns:
+        float: Mean seconds per tile, as seen by the client.
+    """
+    start = time.perf_counter()
+    for url in urls:
+        with urllib.request.urlopen(url) as response:
+            if response.status != 200 or len(response.read()) != TILE_BYTES + 4:
+                raise RuntimeError(f"Unexpected answer for {url}")
+    return (time.perf_counter() - start) / len(urls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tiles", type=int, default=8, help="side of the requested tile grid")
+    parser.add_argument("--latency", type=float, default=150, help="upstream latency per tile in ms")
+    args = parser.parse_args()
+
+    upstream = start_upstream(args.latency / 1000)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}/map/{{z}}/{{x}}/{{y}}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        proxy = TileProxy(TileStore(directory), port=0).start()
+        try:
+            template = proxy.register("0123456789abcdef", upstream_url)
+            urls = [
+                template.format(z=10, x=x, y=y)
+                for x in range(500, 500 + args.tiles) for y in range(400, 400 + args.tiles)
+            ]
+            cold = request_all(urls)
+            warm = request_all(urls)
+            stats = proxy.stats()
+        finally:
+            proxy.stop()
+            upstream.shutdown()
+
+    print(f"{len(urls)} tiles, upstream latency {args.latency:.0f} ms")
+    print(f"{'':<6} {'client ms':>10} {'proxy ms':>10}")
+    print(f"{'miss':<6} {1000 * cold:>10.1f} {stats['miss_ms']:>10.1f}")
+    print(f"{'hit':<6} {1000 * warm:>10.1f} {stats['hit_ms']:>10.1f}")
+    print(f"hit rate {stats['hit_rate']:.0%} ({stats['hits']} hits, {stats['misses']} misses, {stats['errors']} errors)")
+    return 0 if stats['errors'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
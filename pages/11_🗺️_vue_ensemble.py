@@ -0,0 +1,160 @@
+import streamlit as st
+import folium
+from branca.colormap import LinearColormap
+from streamlit_folium import st_folium
+from utils.boundaries import OBJECT_NAME, load_topology, with_properties
+from utils.results import SUPPLY_CLASSES, SUPPLY_COLORS, list_runs, load_results
+
+# Contenu de la barre latérale
+with st.sidebar:
+    # Ajouter le logo de l'IAV et le titre
+    st.image("logo.png", caption="Geo - Parcours 2024", use_column_width=True)
+
+    st.markdown(
+        """
+        ### Application d'Estimation de la Phytomasse
+        Cette application aide la **Direction Provinciale d'Agriculture (DPA)** à estimer les indices de végétation et à calculer la phytomasse pour des provinces spécifiques.  
+        Développée dans le cadre d'un **projet de fin d'études (PFE)** à l'[Institut Agronomique et Vétérinaire Hassan II (IAV)](https://iav.ac.ma/).
+        """
+    )
+
+    # Navigation
+    st.markdown("---")
+    accueil_button = st.button("🏠 Accueil")
+    analyse_button = st.button("📊 Analyse de la Phytomasse")
+    contact_button = st.button("📞 Informations de Contact")
+
+    # Informations de contact
+    st.markdown("---")
+    st.markdown("### Contact")
+    st.markdown(
+        """
+        📧 **Email:** [example@iav.ac.ma](mailto:example@iav.ac.ma)  
+        📞 **Téléphone:** +212-123-456-789  
+        🌐 **Site web:** [IAV Hassan II](https://iav.ac.ma)
+        """
+    )
+
+    # Section de support
+    st.markdown("---")
+    st.markdown("### Support")
+    st.markdown(
+        """
+        Si vous avez des questions ou besoin d'assistance, n'hésitez pas à nous contacter. Nous sommes là pour vous aider !
+        """
+    )
+
+    st.markdown("---")
+
+
+# Indicator -> (label, palette); the supply class is categorical
+INDICATORS = {
+    'index_mean': ("Indice de végétation moyen", ['#f7fcb9', '#addd8e', '#31a354']),
+    'uf_ha': ("Phytomasse (UF/ha)", ['#ffffcc', '#78c679', '#006837']),
+    'supply_class': ("Classe d'offre", None),
+}
+NO_DATA_COLOR = 'lightgray'
+
+
+def indicator_style(indicator, colormap):
+    """
+    Style function of the commune layer for an indicator.
+
+    Args:
+        indicator (str): One of INDICATORS.
+        colormap (LinearColormap): The colormap of a numeric indicator (None for the supply class).
+
+    Returns:
+        callable: The folium style function.
+    """
+    supply_colors = dict(zip(SUPPLY_CLASSES, SUPPLY_COLORS))
+
+    def style(feature):
+        value = feature['properties'].get(indicator)
+        if value is None:
+            color = NO_DATA_COLOR
+        elif colormap is None:
+            color = supply_colors.get(value, NO_DATA_COLOR)
+        else:
+            color = colormap(value)
+        return {'fillColor': color, 'color': 'black', 'weight': 0.5, 'fillOpacity': 0.7}
+
+    return style
+
+
+st.title("Vue d'ensemble des Communes")
+
+# Résultats précalculés : aucune requête Earth Engine à l'affichage
+results = load_results()
+runs = list_runs(results)
+if runs.empty:
+    st.info(
+        "Aucun résultat précalculé pour le moment. Lancez le calcul pour toutes les communes depuis la page "
+        "Phytomasse, ou `python -m utils.results --date AAAA-MM-JJ --formula \"NDVI Linéaire\"`."
+    )
+    st.stop()
+
+col1, col2 = st.columns(2)
+with col1:
+    run_index = st.selectbox(
+        "Résultats",
+        range(len(runs)),
+        format_func=lambda i: f"{runs.loc[i, 'date']} — {runs.loc[i, 'formula']}",
+    )
+with col2:
+    indicator = st.radio("Indicateur", list(INDICATORS), format_func=lambda key: INDICATORS[key][0], horizontal=True)
+
+selected_run = runs.loc[run_index]
+table = results[(results['date'] == selected_run['date']) & (results['formula'] == selected_run['formula'])]
+st.caption(
+    f"Composite {selected_run['window']}, indice {selected_run['index']}, calculé le {selected_run['computed_at'][:10]}."
+)
+
+# Valeurs par commune, fusionnées dans la topologie (infobulles et couleurs)
+values = {
+    int(row['id_commune']): {
+        'index_mean': None if row['index_mean'] != row['index_mean'] else round(float(row['index_mean']), 3),
+        'uf_ha': None if row['uf_ha'] != row['uf_ha'] else round(float(row['uf_ha']), 2),
+        'supply_class': row['supply_class'] if isinstance(row['supply_class'], str) else None,
+    }
+    for row in table.to_dict('records')
+}
+topology = with_properties(load_topology(), values)
+
+label, palette = INDICATORS[indicator]
+colormap = None
+if palette is not None:
+    numeric = table[indicator].dropna()
+    if not numeric.empty:
+        colormap = LinearColormap(palette, vmin=float(numeric.min()), vmax=float(numeric.max()), caption=label)
+
+min_lon, min_lat, max_lon, max_lat = topology['bbox']
+overview_map = folium.Map(tiles='OpenStreetMap')
+overview_map.fit_bounds([[min_lat, min_lon], [max_lat, max_lon]])
+folium.TopoJson(
+    topology,
+    f'objects.{OBJECT_NAME}',
+    name=label,
+    style_function=indicator_style(indicator, colormap),
+    tooltip=folium.GeoJsonTooltip(
+        fields=['commune', 'index_mean', 'uf_ha', 'supply_class'],
+        aliases=['Commune', 'Indice moyen', 'UF/ha', "Classe d'offre"],
+    ),
+).add_to(overview_map)
+if colormap is not None:
+    colormap.add_to(overview_map)
+st_folium(overview_map, width=700, height=500, key="overview_map", returned_objects=[])
+
+if indicator == 'supply_class':
+    st.markdown(" ".join(
+        f"<span style='background:{color}; padding:0 8px;'>&nbsp;</span> {name}"
+        for name, color in zip(SUPPLY_CLASSES, SUPPLY_COLORS)
+    ), unsafe_allow_html=True)
+    st.caption("Classes d'offre : quintiles de la phytomasse par hectare (UF/ha) entre les communes.")
+
+st.dataframe(
+    table[['commune', 'index_mean', 'uf_ha', 'uf_total', 'area_ha', 'supply_class']]
+    .sort_values('uf_ha')
+    .round(2),
+    hide_index=True,
+)
@@ -1,18 +1,5 @@
 import streamlit as st
-import ee
-import json
-import pandas as pd
-import geopandas as gpd
-
-# Initialize Google Earth Engine
-def initialize_earth_engine():
-    try:
-        ee.Initialize()
-    except Exception as e:
-        ee.Authenticate()
-        ee.Initialize()
-
-initialize_earth_engine()
+from utils.communes import commune_names, get_commune_by_name
 
 
 # Contenu de la barre latérale
@@ -61,39 +48,6 @@ with st.sidebar:
 
 
 
-# Load GeoJSON and Excel data
-geojson_file = "finale_communes_4326.geojson"
-gdf = gpd.read_file(geojson_file)
-geojson_data = json.loads(gdf.to_json())
-
-excel_file = "Weighted_Averages_of_UF_and_KG_per_Commune.xlsx"
-data = pd.read_excel(excel_file)
-
-# Extract communes
-if all(col in data.columns for col in ['id_commune', 'commune']):
-    communes = data[['id_commune', 'commune']]
-else:
-    st.error("The Excel file must contain 'id_commune' and 'commune' columns.")
-    communes = pd.DataFrame()  # Empty fallback
-
-# Function to get commune geometry
-def get_commune_geometry(geojson, commune_id):
-    for feature in geojson['features']:
-        if feature['properties']['id_commune'] == commune_id:
-            coords = feature['geometry']['coordinates']
-            if feature['geometry']['type'] == 'Polygon':
-                return ee.Geometry.Polygon(coords[0])
-            elif feature['geometry']['type'] == 'MultiPolygon':
-                return ee.Geometry.MultiPolygon(coords)
-    raise ValueError(f"Commune with ID '{commune_id}' not found.")
-
-# Function to calculate area
-def calculate_area(geometry):
-    """
-    Calculate the area of a geometry in hectares using Google Earth Engine.
-    """
-    area = geometry.area().divide(10000).getInfo()  # Convert square meters to hectares
-    return area
 
 # Function to categorize demand/offer ratio
 def categorize_ratio(ratio):
@@ -112,15 +66,14 @@ def categorize_ratio(ratio):
 st.title("Comparaison entre la Demande et l'Offre par Commune")
 
 # Commune selection
-selected_commune = st.selectbox("Sélectionnez une commune :", communes['commune'].unique())
+selected_commune = st.selectbox("Sélectionnez une commune :", commune_names())
 
 if selected_commune:
     # Get selected commune details
-    commune_id = communes[communes['commune'] == selected_commune]['id_commune'].values[0]
-    commune_geometry = get_commune_geometry(geojson_data, commune_id)
+    commune = get_commune_by_name(selected_commune)
 
-    # Calculate area using GEE
-    area_ha = calculate_area(commune_geometry)
+    # Geodesic area from the commune index (computed locally, no Earth Engine request)
+    area_ha = commune['area_ha']
 
     # Display commune details
     st.write(f"**Superficie de la commune sélectionnée :** {area_ha:.2f} hectares")
@@ -1,12 +1,24 @@
 import streamlit as st
+import ee
+import folium
 import geemap.foliumap as geemap
 from streamlit_folium import st_folium
-import folium
-import ee
-import geopandas as gpd
-import pandas as pd
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
+from utils.communes import commune_names, get_commune_by_name, commune_ee_geometry, commune_ee_bounds
+from utils.boundaries import OBJECT_NAME, boundary_layer, load_topology
+from utils.ee_batch import communes_bbox
+from utils.ee_cache import DEFAULT_TTL
+from utils.ee_executor import run
+from utils.ee_export import export_geotiff
+from utils.ee_composite import CLOUD_MASKS, DEFAULT_MAX_CLOUD, index_composite
+from utils.ee_stats import compute_formula_totals, compute_statistics
+from utils.ee_tiles import ee_layer, resolve_layers
+from utils.local_backend import is_available as local_backend_available
+from utils.indices import INDICES
+from utils.windows import DEFAULT_WINDOW, WINDOW_POLICIES, composite_window, describe_window
+from utils.jobs import FAILED, QUEUED, RUNNING, get_job, job_progress, submit_job
+from utils.results import precompute_job
+from utils.phytomass import comparison_table, ee_phytomass, formulas_for, get_formula
 
 
 
@@ -29,6 +41,25 @@ with st.sidebar:
     analyse_button = st.button("📊 Analyse de la Phytomasse")
     contact_button = st.button("📞 Informations de Contact")
 
+    # Fenêtre des composites : les dates d'une même période partagent le même composite
+    st.markdown("---")
+    window_policy = st.selectbox(
+        "Fenêtre des composites",
+        list(WINDOW_POLICIES),
+        index=list(WINDOW_POLICIES).index(DEFAULT_WINDOW),
+        format_func=WINDOW_POLICIES.get,
+        help="Les fenêtres par périodes s'arrêtent à la dernière période complète : "
+             "jusqu'aux 10 derniers jours avant la date (15 pour les quinzaines, un mois "
+             "pour les mois calendaires) ne sont pas inclus. Les 30 jours glissants se terminent à la date."
+    )
+
+    # Pré-sélection des scènes : moins d'images, plus légères, par composite
+    scene_options = {
+        'cloud_mask': st.selectbox("Masque des nuages", list(CLOUD_MASKS), format_func=CLOUD_MASKS.get),
+        'max_cloud': st.slider("Couverture nuageuse maximale des scènes (%)", 0, 100, DEFAULT_MAX_CLOUD, step=5),
+        'max_scenes': st.number_input("Nombre maximal de scènes (les plus claires)", 1, 50, 12),
+    }
+
     # Informations de contact
     st.markdown("---")
     st.markdown("### Contact")
@@ -66,101 +97,10 @@ def initialize_earth_engine():
         ee.Initialize()
     return ee
 
-def get_download_link(image, region, scale=10, filename='output'):
-    """
-    Generate a link to download the image as a GeoTIFF.
-
-    Args:
-        image (ee.Image): The image to download (e.g., index or phytomass).
-        region (ee.Geometry): The region to clip the image.
-        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
-        filename (str): The desired filename for the downloaded GeoTIFF.
-
-    Returns:
-        str: A URL to download the GeoTIFF.
-    """
-    # Clip the image to the region
-    image = image.clip(region)
-
-    # Prepare the download URL
-    url = image.getDownloadURL({
-        'scale': scale,
-        'region': region,  # Pass region directly
-        'format': 'GeoTIFF',
-        'name': filename
-    })
-    return url
-
-
-def calculate_sum(image, region, scale=10):
-    """
-    Calculate the sum of pixel values over the specified region.
-
-    Args:
-        image (ee.Image): The image (e.g., index or phytomass) for which the sum will be calculated.
-        region (ee.Geometry): The region over which the sum will be calculated.
-        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
-
-    Returns:
-        float: The sum of the pixel values within the region.
-    """
-    sum_result = image.reduceRegion(
-        reducer=ee.Reducer.sum(),
-        geometry=region,
-        scale=scale,
-        maxPixels=1e9
-    ).getInfo()
-    return sum_result
-
-def calculate_mean(image, region, scale=10):
-    """
-    Calculate the sum of pixel values over the specified region.
-
-    Args:
-        image (ee.Image): The image (e.g., index or phytomass) for which the sum will be calculated.
-        region (ee.Geometry): The region over which the sum will be calculated.
-        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
-
-    Returns:
-        float: The sum of the pixel values within the region.
-    """
-    sum_result = image.reduceRegion(
-        reducer=ee.Reducer.mean(),
-        geometry=region,
-        scale=scale,
-        maxPixels=1e9
-    ).getInfo()
-    return sum_result
-
-def get_download_link(image, region, scale=10, filename='output'):
-    """
-    Generate a link to download the image as a GeoTIFF.
-
-    Args:
-        image (ee.Image): The image to download (e.g., index or phytomass).
-        region (ee.Geometry): The region to clip the image.
-        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
-        filename (str): The desired filename for the downloaded GeoTIFF.
-
-    Returns:
-        str: A URL to download the GeoTIFF.
-    """
-    # Clip the image to the region
-    image = image.clip(region)
-
-    # Prepare the download URL
-    url = image.getDownloadURL({
-        'scale': scale,
-        'region': region,  # Pass region directly
-        'format': 'GeoTIFF',
-        'name': filename
-    })
-    return url
-
-
 
 # Function to calculate the selected vegetation index
-def calculate_index(region, date, index, mask_clouds=True, scale_factor=1):
+def calculate_index(region, date, index, mask_clouds=True, scale_factor=1, bounds=None, window=DEFAULT_WINDOW,
+                    **scene_options):
     """
     Calculate a vegetation index over the specified geometry and date range.
 
@@ -170,78 +110,31 @@ def calculate_index(region, date, index, mask_clouds=True, scale_factor=1):
         index (str): The name of the vegetation index to calculate (e.g., "NDVI", "RVI", "DVI", etc.).
         mask_clouds (bool): Whether to apply cloud masking (default: True).
         scale_factor (float): Factor to scale the index values (default: 1).
+        bounds (ee.Geometry, optional): A lighter geometry (e.g., the bounding box) used to
+            select the scenes instead of the region itself.
+        window (str): The composite window policy (see utils.windows.WINDOW_POLICIES).
+        **scene_options: cloud_mask, max_cloud and max_scenes (see utils.ee_composite.index_collection).
 
     Returns:
         ee.Image: The calculated vegetation index image clipped to the provided region.
     """
-    # Define date range
-    end_date = datetime.strptime(date, "%Y-%m-%d")
-    start_date = end_date - timedelta(days=30)  # 1 month of data
-
-    # Load Sentinel-2 collection
-    s2_sr = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-        .filterBounds(region) \
-        .filterDate(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-
-    # Apply cloud masking if enabled
-    if mask_clouds:
-        def mask_clouds_function(image):
-            cloud_mask = image.select('QA60').lt(1)
-            return image.updateMask(cloud_mask)
-        s2_sr = s2_sr.map(mask_clouds_function)
-
-    # Define the index calculation
-    def calculate_image_index(image, index):
-        if index == 'NDVI':
-            return image.normalizedDifference(['B8', 'B4']).rename('NDVI')
-        elif index == 'RVI':
-            return image.expression('B4 / B8', {'B4': image.select('B4'), 'B8': image.select('B8')}).rename('RVI')
-        elif index == 'DVI':
-            return image.expression('B8 - B4', {'B4': image.select('B4'), 'B8': image.select('B8')}).rename('DVI')
-        elif index == 'SAVI':
-            L = 0.5
-            return image.expression('((B8 - B4) / (B8 + B4 + L)) * (1 + L)', {'B4': image.select('B4'), 'B8': image.select('B8'), 'L': L}).rename('SAVI')
-        elif index == 'EVI':
-            return image.expression('2.5 * ((B8 - B4) / (B8 + 6 * B4 - 7.5 * B2 + 1))', {'B4': image.select('B4'), 'B8': image.select('B8'), 'B2': image.select('B2')}).rename('EVI')
-        elif index == 'GNDVI':
-            return image.normalizedDifference(['B8', 'B3']).rename('GNDVI')
-        elif index == 'IPVI':
-            return image.expression('B8 / (B8 + B4)', {'B4': image.select('B4'), 'B8': image.select('B8')}).rename('IPVI')
-        elif index == 'NDWI':
-            return image.normalizedDifference(['B3', 'B8']).rename('NDWI')
-        elif index == 'MSAVI':
-            return image.expression('(2 * B8 + 1 - sqrt((2 * B8 + 1) ** 2 - 8 * (B8 - B4))) / 2', {'B4': image.select('B4'), 'B8': image.select('B8')}).rename('MSAVI')
-        elif index == 'TSAVI':
-            a = 1.339198  # Slope for 2020 (adjust as needed)
-            b = 0.006262  # Intercept for 2020 (adjust as needed)
-            return image.expression(
-                'a * (B8 - a * B4 - b) / (B8 + B4 - a * b + 0.08 * (1 + a**2))',
-                {
-                    'B4': image.select('B4'),
-                    'B8': image.select('B8'),
-                    'a': a,
-                    'b': b
-                }
-            ).rename('TSAVI')
-        else:
-            raise ValueError(f"Unsupported index: {index}")
-
+    # Define date range, snapped to the canonical window of the date
+    start_date, end_date = composite_window(date, window)
 
-    # Apply the index calculation
-    index_image = s2_sr.map(lambda img: calculate_image_index(img, index)).median()
+    # Median composite of the index (same code path as multi-index composites)
+    index_image = index_composite(
+        region, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), [index],
+        mask_clouds=mask_clouds, bounds=bounds, **scene_options
+    )
 
     # Scale the index if a scale factor is provided
     if scale_factor != 1:
         index_image = index_image.multiply(scale_factor)
 
-    # Clip the image to the region
-    index_image = index_image.clip(region)
-
     return index_image
 
 
 
-# Function to calculate phytomass
 # Function to calculate phytomass
 def calculate_phytomass(index_image, formula):
     """
@@ -252,135 +145,13 @@ def calculate_phytomass(index_image, formula):
         formula (str): The formula to use for phytomass calculation.
 
     Returns:
-        tuple: A tuple containing the phytomass image and the fixed R² value (0.8).
+        tuple: A tuple containing the phytomass image and the R² value of the formula.
     """
-    r_squared = 0.8  # Fixed R² value for all formulas
-
-    if formula == 'NDVI Linéaire':
-        phytomass = index_image.expression(
-            '2.53 + 28.70 * NDVI',
-            {'NDVI': index_image.select('NDVI')}
-        ).rename('Phytomass')
-    elif formula == 'NDVI Polynomial':
-        phytomass = index_image.expression(
-            '-1.82 + 21.44 * NDVI + 116.10 * (NDVI ** 2)',
-            {'NDVI': index_image.select('NDVI')}
-        ).rename('Phytomass')
-    elif formula == 'RVI Linéaire':
-        phytomass = index_image.expression(
-            '-10.80 + 9.05 * RVI',
-            {'RVI': index_image.select('RVI')}
-        ).rename('Phytomass')
-    elif formula == 'RVI Polynomial':
-        phytomass = index_image.expression(
-            '-6.95 + 5.90 * RVI + 15.49 * (RVI ** 2)',
-            {'RVI': index_image.select('RVI')}
-        ).rename('Phytomass')
-    elif formula == 'DVI Linéaire':
-        phytomass = index_image.expression(
-            '-2.99 + 48.50 * DVI',
-            {'DVI': index_image.select('DVI')}
-        ).rename('Phytomass')
-    elif formula == 'DVI Polynomial':
-        phytomass = index_image.expression(
-            '-2.62 + 39.86 * DVI + 1901.45 * (DVI ** 2)',
-            {'DVI': index_image.select('DVI')}
-        ).rename('Phytomass')
-    elif formula == 'SAVI Linéaire':
-        phytomass = index_image.expression(
-            '-3.29 + 40.13 * SAVI',
-            {'SAVI': index_image.select('SAVI')}
-        ).rename('Phytomass')
-    elif formula == 'SAVI Polynomial':
-        phytomass = index_image.expression(
-            '-1.68 + 20.76 * SAVI + 682.13 * (SAVI ** 2)',
-            {'SAVI': index_image.select('SAVI')}
-        ).rename('Phytomass')
-    elif formula == 'MSAVI Linéaire':
-        phytomass = index_image.expression(
-            '1.09 - 1.12 * MSAVI',
-            {'MSAVI': index_image.select('MSAVI')}
-        ).rename('Phytomass')
-    elif formula == 'MSAVI Polynomial':
-        phytomass = index_image.expression(
-            '1.87 + 14.94 * MSAVI - 97.55 * (MSAVI - 0.26) ** 2',
-            {'MSAVI': index_image.select('MSAVI')}
-        ).rename('Phytomass')
-    elif formula == 'TSAVI Linéaire':
-        phytomass = index_image.expression(
-            '-0.97 - 3.90 * TSAVI',
-            {'TSAVI': index_image.select('TSAVI')}
-        ).rename('Phytomass')
-
-        # Set negative values to 0
-        phytomass = phytomass.where(phytomass.lt(0), 0)
-
-    elif formula == 'TSAVI Polynomial':
-        phytomass = index_image.expression(
-            '-1.53 - 5.38 * TSAVI + 2.23 * (TSAVI - 0.4551) ** 2',
-            {'TSAVI': index_image.select('TSAVI')}
-        ).rename('Phytomass')
-
-        # Set negative values to 0
-        phytomass = phytomass.where(phytomass.lt(0), 0)
-
-    elif formula == 'ARVI Linéaire':
-        phytomass = index_image.expression(
-            '2.95 + 20.97 * ARVI',
-            {'ARVI': index_image.select('ARVI')}
-        ).rename('Phytomass')
-    elif formula == 'ARVI Polynomial':
-        phytomass = index_image.expression(
-            '2.19 + 15.17 * ARVI + 75.16 * (ARVI - 0.1027) ** 2',
-            {'ARVI': index_image.select('ARVI')}
-        ).rename('Phytomass')
-    elif formula == 'IPVI Linéaire':
-        phytomass = index_image.expression(
-            '-27.13 + 49.81 * IPVI',
-            {'IPVI': index_image.select('IPVI')}
-        ).rename('Phytomass')
-    elif formula == 'IPVI Polynomial':
-        phytomass = index_image.expression(
-            '-1.87 + 14.94 * IPVI - 97.55 * (IPVI - 0.27) ** 2',
-            {'IPVI': index_image.select('IPVI')}
-        ).rename('Phytomass')
-    else:
-        raise ValueError(f"Unsupported formula: {formula}")
-
-    return phytomass, r_squared
-
-
-# Function to get commune geometry and center coordinates
-def get_commune_geometry(geojson, commune_id):
-    for feature in geojson['features']:
-        if feature['properties']['id_commune'] == commune_id:
-            coords = feature['geometry']['coordinates']
-            if feature['geometry']['type'] == 'Polygon':
-                geometry = ee.Geometry.Polygon(coords[0])
-                center = geometry.centroid().getInfo()['coordinates']
-                return geometry, feature['geometry'], center
-            elif feature['geometry']['type'] == 'MultiPolygon':
-                geometry = ee.Geometry.MultiPolygon(coords)
-                center = geometry.centroid().getInfo()['coordinates']
-                return geometry, feature['geometry'], center
-    raise ValueError(f"Commune with ID '{commune_id}' not found.")
+    # Coefficients and R² come from the formula table
+    return ee_phytomass(index_image, formula), get_formula(formula)['r_squared']
 
-# Initialize Earth Engine
-ee = initialize_earth_engine()
 
-# Load GeoJSON and Excel data
-geojson_file = "finale_communes_4326.geojson"
-gdf = gpd.read_file(geojson_file)
-geojson_data = json.loads(gdf.to_json())
 
-excel_file = "Weighted_Averages_of_UF_and_KG_per_Commune.xlsx"
-data = pd.read_excel(excel_file)
-
-# Extract communes
-if all(col in data.columns for col in ['id_commune', 'commune']):
-    communes = data[['id_commune', 'commune']]
-else:
-    st.error("The Excel file must contain 'id_commune' and 'commune' columns.")
 # Initialize session state for map configuration
 if "map_center" not in st.session_state:
     st.session_state.map_center = [31.5, -7.0]  # Default center (Morocco)
@@ -394,6 +165,9 @@ if "map_layers" not in st.session_state:
 # Streamlit app layout
 st.title("Calcul de l'Indice de Végétation et de la Phytomasse par Commune")
 
+EARTH_ENGINE_BACKEND = "Earth Engine"
+LOCAL_BACKEND = "Fichiers Sentinel-2 locaux"
+
 with st.form("index_form"):
     # Define formula-to-index mapping
     formula_to_index = {
@@ -407,7 +181,7 @@ with st.form("index_form"):
     }
 
     # Commune selection
-    selected_commune = st.selectbox("Sélectionnez une commune", communes['commune'].unique())
+    selected_commune = st.selectbox("Sélectionnez une commune", commune_names())
 
     # Date input
     selected_date = st.date_input(
@@ -416,86 +190,136 @@ with st.form("index_form"):
         min_value=datetime(2000, 1, 1),
         max_value=datetime.today()
     )
+    st.caption(f"Composite {describe_window(*composite_window(selected_date.strftime('%Y-%m-%d'), window_policy))}")
     # Formula selection
     formula = st.selectbox("Sélectionnez une formule de phytomasse", list(formula_to_index.keys()))
 
+    # Image source: local Sentinel-2 tiles are offered when they are present
+    backends = [EARTH_ENGINE_BACKEND]
+    if local_backend_available():
+        backends.append(LOCAL_BACKEND)
+    backend = st.radio("Source des images", backends, horizontal=True)
+
     # Submit button
     calculate_button = st.form_submit_button("Calculer")
 
 
 # Check if the button was clicked and calculate the results
-if calculate_button:
+if calculate_button and backend == LOCAL_BACKEND:
     try:
+        # Same computation with NumPy on the local tiles, without any Earth Engine request
+        from utils import local_backend
+
+        index = formula_to_index[formula]
+        date = selected_date.strftime('%Y-%m-%d')
+        commune = get_commune_by_name(selected_commune)
+        geometry_info = commune['geojson']
+
+        center = commune['centroid']
+        st.session_state.map_center = [center[1], center[0]]
+        st.session_state.map_zoom = 12
+
+        with st.spinner("Calcul à partir des scènes locales..."):
+            index_image = local_backend.calculate_index(geometry_info, date, index, window=window_policy)
+            phytomass_image, r_squared = local_backend.calculate_phytomass(index_image, formula)
+            stats = local_backend.compute_statistics(index_image, index, phytomass_image, geometry_info)
+        if not stats['index']['count']:
+            raise ValueError("Aucune image Sentinel-2 exploitable sur la période sélectionnée.")
+
+        st.session_state['results'] = {
+            'index_mean': stats['index']['mean'],
+            'phytomass_sum': stats['phytomass']['sum'],
+            'r_squared': r_squared,
+            'area_hectares': commune['area_ha'],
+            'window': describe_window(*composite_window(date, window_policy))
+        }
+        st.session_state.map_layers = [
+            boundary_layer([commune['id']])
+        ]
+        st.session_state.pop('exports', None)
+        st.session_state.pop('export_files', None)
+
+    except (ValueError, OSError) as e:
+        st.error(f"Error: {e}")
+
+elif calculate_button:
+    try:
+        # Initialize Earth Engine
+        ee = initialize_earth_engine()
+
         # Determine corresponding index
         index = formula_to_index[formula]
         date = selected_date.strftime('%Y-%m-%d')  # Convert the selected date to string format
 
-        # Get the selected commune's ID and geometry
-        commune_id = communes[communes['commune'] == selected_commune]['id_commune'].values[0]
-        commune_geometry, geometry_info, center = get_commune_geometry(geojson_data, commune_id)
+        # Get the selected commune's geometry from the commune index
+        commune = get_commune_by_name(selected_commune)
+        commune_geometry = commune_ee_geometry(commune)
 
         # Update session state with the map's center and zoom
+        center = commune['centroid']
         st.session_state.map_center = [center[1], center[0]]
         st.session_state.map_zoom = 12
 
         # Calculate vegetation index
-        index_image = calculate_index(commune_geometry, date, index)
+        index_image = calculate_index(commune_geometry, date, index, bounds=commune_ee_bounds(commune), window=window_policy,
+                                      **scene_options)
 
         # Calculate phytomass
         phytomass_image, r_squared = calculate_phytomass(index_image, formula)
 
-        # Calculate the mean value of the index and the sum of the phytomass
-        index_mean = calculate_mean(index_image, commune_geometry).get(index)
-        phytomass_sum = calculate_sum(phytomass_image, commune_geometry).get('Phytomass')
-        # Calculate the area in square meters
-        area_sq_meters = commune_geometry.area().getInfo()
+        # Every statistic in a single request
+        stats = run(compute_statistics, index_image, index, phytomass_image, commune_geometry)
+        if not stats['index']['count']:
+            raise ValueError("Aucune image Sentinel-2 exploitable sur la période sélectionnée.")
 
-        # Convert the area to hectares
-        area_hectares = area_sq_meters / 10000
+        index_mean = stats['index']['mean']
+        phytomass_sum = stats['phytomass']['sum']
 
-        # Streamlit App
+        # Area from the local commune index
+        area_hectares = commune['area_ha']
 
         # Store the results in session state
         st.session_state['results'] = {
             'index_mean': index_mean,
             'phytomass_sum': phytomass_sum,
             'r_squared': r_squared,
-            'area_hectares' :area_hectares
+            'area_hectares' :area_hectares,
+            'window': describe_window(*composite_window(date, window_policy))
         }
 
-        # Prepare layers for the map
-        st.session_state.map_layers = []  # Reset layers
+        # Prepare layers for the map: tile URLs are looked up (cached by image graph and
+        # vis params) when the map is drawn
         index_params = {
-            'min': index_image.reduceRegion(ee.Reducer.min(), commune_geometry).getInfo()[index],
-            'max': index_image.reduceRegion(ee.Reducer.max(), commune_geometry).getInfo()[index],
+            'min': stats['index']['min'],
+            'max': stats['index']['max'],
             'palette': ['blue', 'green', 'yellow']
         }
-        st.session_state.map_layers.append(geemap.ee_tile_layer(index_image, index_params, 'Vegetation Index'))
-
         phytomass_params = {
-            'min': phytomass_image.reduceRegion(ee.Reducer.min(), commune_geometry).getInfo()['Phytomass'],
-            'max': phytomass_image.reduceRegion(ee.Reducer.max(), commune_geometry).getInfo()['Phytomass'],
+            'min': stats['phytomass']['min'],
+            'max': stats['phytomass']['max'],
             'palette': ['yellow', 'orange', 'red']
         }
-        st.session_state.map_layers.append(geemap.ee_tile_layer(phytomass_image, phytomass_params, 'Phytomass'))
 
+        st.session_state.map_layers = []  # Reset layers
+        st.session_state.map_layers.append(ee_layer(index_image, index_params, 'Vegetation Index'))
+        st.session_state.map_layers.append(ee_layer(phytomass_image, phytomass_params, 'Phytomass'))
         st.session_state.map_layers.append(
-            folium.GeoJson(
-                geometry_info,
-                name="Commune Boundary",
-                style_function=lambda x: {'color': 'red', 'weight': 2, 'fillOpacity': 0}
-            )
+            boundary_layer([commune['id']])
         )
 
-        # Generate download links and store in session state
-        phytomass_download_link = get_download_link(phytomass_image, commune_geometry, scale=10, filename='phytomass_map')
-        index_download_link = get_download_link(index_image, commune_geometry, scale=10, filename='index_map')
-        st.session_state['download_links'] = {
-            'phytomass': phytomass_download_link,
-            'index': index_download_link
+        # Images offered for download (exported on demand, see below)
+        st.session_state['exports'] = {
+            'geojson': commune['geojson'],
+            'layers': {
+                'phytomass': {'image': phytomass_image, 'int16_scale': 100, 'filename': 'phytomass_map',
+                              'range': (stats['phytomass']['min'], stats['phytomass']['max'])},
+                'index': {'image': index_image, 'int16_scale': 10000, 'filename': 'index_map',
+                          'range': (stats['index']['min'], stats['index']['max'])},
+            },
         }
+        st.session_state.pop('export_files', None)
 
-    except ValueError as e:
+    except (ValueError, TimeoutError, ee.EEException) as e:
         st.error(f"Error: {e}")
 
 # Display results in a stylish way
@@ -509,7 +333,7 @@ if 'results' in st.session_state:
     st.markdown("### Résumé du processus")
     st.markdown(f"""
     1. **Commune sélectionnée** : {selected_commune}
-    2. **Date de l'analyse** : {selected_date.strftime('%Y-%m-%d')}
+    2. **Date de l'analyse** : {selected_date.strftime('%Y-%m-%d')} (composite {results.get('window', '')})
     3. **Formule appliquée** : {formula}
     4. **Surface en hectare** : {area_hectares}
     5. **Résultats obtenus** :
@@ -521,19 +345,54 @@ if 'results' in st.session_state:
     7. **Liens de téléchargement** : Les cartes générées peuvent être téléchargées au format GeoTIFF.
     """)
 # Afficher les liens de téléchargement de manière claire et élégante
-if 'download_links' in st.session_state:
-    download_links = st.session_state['download_links']
-    
-    # Créer un conteneur pour les liens de téléchargement
-    st.markdown("### Liens de téléchargement")
-    st.markdown(f"- 🌿 [Télécharger la carte de phytomasse]({download_links['phytomass']})")
-    st.markdown(f"- 📈 [Télécharger la carte de l'indice de végétation]({download_links['index']})")
-
-# Create or update the map
-Map = geemap.Map(location=st.session_state.map_center, zoom_start=st.session_state.map_zoom)
+# (GeoTIFF découpés en tuiles, téléchargés en parallèle et assemblés en COG, gardés en cache sur disque)
+if 'exports' in st.session_state:
+    exports = st.session_state['exports']
+
+    st.markdown("### Téléchargements")
+    export_int16 = st.checkbox("Encodage entier int16 (fichiers plus légers, valeurs mises à l'échelle selon leur plage)", key="export_int16")
+    if st.button("Préparer les GeoTIFF"):
+        try:
+            with st.spinner("Export des cartes..."):
+                st.session_state['export_files'] = {
+                    'int16': export_int16,
+                    'files': {
+                        layer: export_geotiff(
+                            spec['image'], exports['geojson'], scale=10,
+                            int16_scale=spec['int16_scale'] if export_int16 else None, name=spec['filename'],
+                            value_range=spec['range']
+                        )
+                        for layer, spec in exports['layers'].items()
+                    },
+                }
+        except (ValueError, TimeoutError, OSError, ee.EEException) as e:
+            st.error(f"Error: {e}")
+
+    export_files = st.session_state.get('export_files')
+    if export_files and export_files['int16'] == export_int16:
+        for layer, label in [('phytomass', "🌿 Télécharger la carte de phytomasse"),
+                             ('index', "📈 Télécharger la carte de l'indice de végétation")]:
+            with open(export_files['files'][layer], 'rb') as f:
+                st.download_button(
+                    label=label,
+                    data=f.read(),
+                    file_name=f"{exports['layers'][layer]['filename']}.tif",
+                    mime="image/tiff",
+                    key=f"download_{layer}"
+                )
+
+# Create or update the map (Earth Engine layers are plain tile layers: the map itself
+# must not initialize Earth Engine, which the local backend does not need)
+Map = geemap.Map(location=st.session_state.map_center, zoom_start=st.session_state.map_zoom, ee_initialize=False)
 
 # Add all layers stored in session state
-for layer in st.session_state.map_layers:
+# (Earth Engine tile URLs come from the cache: no request unless they expired)
+try:
+    map_layers = resolve_layers(st.session_state.map_layers)
+except (ee.EEException, TimeoutError) as e:
+    st.error(f"Error: {e}")
+    map_layers = [layer for layer in st.session_state.map_layers if not isinstance(layer, dict)]
+for layer in map_layers:
     Map.add_child(layer)
 
 # Add layer control for toggling visibility
@@ -541,3 +400,121 @@ folium.LayerControl().add_to(Map)
 
 # Display the map
 st_folium(Map, width=700, height=500, key="main_map")
+
+
+# Comparaison de toutes les formules de phytomasse en une seule requête
+st.markdown("---")
+st.header("Comparaison des formules")
+
+with st.form("comparison_form"):
+    comparison_commune = st.selectbox("Sélectionnez une commune", commune_names(), key="comparison_commune")
+    comparison_date = st.date_input(
+        "Sélectionnez une date :",
+        datetime.today(),
+        min_value=datetime(2000, 1, 1),
+        max_value=datetime.today(),
+        key="comparison_date"
+    )
+    st.caption(f"Composite {describe_window(*composite_window(comparison_date.strftime('%Y-%m-%d'), window_policy))}")
+    comparison_button = st.form_submit_button("Comparer les formules")
+
+if comparison_button:
+    try:
+        ee = initialize_earth_engine()
+        commune = get_commune_by_name(comparison_commune)
+        commune_geometry = commune_ee_geometry(commune)
+        start_date, end_date = composite_window(comparison_date.strftime('%Y-%m-%d'), window_policy)
+
+        # Every formula whose index is available, its indices in one composite, every formula as a band
+        formulas = formulas_for(list(INDICES))
+        indices = list(dict.fromkeys(get_formula(formula)['index'] for formula in formulas))
+        with st.spinner("Calcul de toutes les formules..."):
+            composite = index_composite(
+                commune_geometry, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), indices,
+                bounds=commune_ee_bounds(commune), **scene_options
+            )
+            sums = run(compute_formula_totals, composite, formulas, commune_geometry)
+        st.session_state['comparison_results'] = {
+            'table': comparison_table(sums, commune['area_ha']),
+            'commune': comparison_commune,
+            'date': comparison_date.strftime('%Y-%m-%d'),
+            'window': describe_window(start_date, end_date),
+        }
+    except (ValueError, TimeoutError, ee.EEException) as e:
+        st.error(f"Error: {e}")
+
+if 'comparison_results' in st.session_state:
+    comparison_results = st.session_state['comparison_results']
+    comparison = comparison_results['table']
+    st.markdown(f"Commune **{comparison_results['commune']}**, composite {comparison_results['window']}")
+    st.dataframe(comparison.round(2))
+    st.bar_chart(comparison.set_index('formula')['uf_ha'])
+
+
+# Calcul pour toutes les communes de la province en une seule requête
+st.markdown("---")
+st.header("Toutes les communes")
+
+with st.form("batch_form"):
+    batch_date = st.date_input(
+        "Sélectionnez une date :",
+        datetime.today(),
+        min_value=datetime(2000, 1, 1),
+        max_value=datetime.today(),
+        key="batch_date"
+    )
+    st.caption(f"Composite {describe_window(*composite_window(batch_date.strftime('%Y-%m-%d'), window_policy))}")
+    batch_formula = st.selectbox("Sélectionnez une formule de phytomasse", list(formula_to_index.keys()), key="batch_formula")
+    batch_scale = st.selectbox("Résolution du calcul (m)", [10, 20, 30, 60], index=2, key="batch_scale")
+    batch_button = st.form_submit_button("Calculer pour toutes les communes")
+
+if batch_button:
+    # Long computation: run as a background job, found again after a page reload through
+    # its ID in the URL
+    st.query_params['batch_job'] = submit_job(
+        precompute_job,
+        ttl=DEFAULT_TTL,  # Like the cached reductions: recent dates may get new scenes
+        date=batch_date.strftime('%Y-%m-%d'),
+        formula=batch_formula,
+        window=window_policy,
+        scale=batch_scale,
+        cloud_mask=scene_options['cloud_mask'],
+        max_cloud=scene_options['max_cloud'],
+    )
+
+batch_job_id = st.query_params.get('batch_job')
+batch_job = get_job(batch_job_id) if batch_job_id else None
+if batch_job is not None and batch_job['status'] in (QUEUED, RUNNING):
+    job_progress(batch_job_id)
+elif batch_job is not None and batch_job['status'] == FAILED:
+    st.error(f"Error: {batch_job['error']}")
+elif batch_job is not None:
+    batch_results = batch_job['result']
+    batch_table = batch_results['table']
+
+    st.markdown(f"Résultats du **{batch_results['date']}** (composite {batch_results['window']}) avec la formule **{batch_results['formula']}**")
+    st.dataframe(batch_table.round(2))
+    st.download_button(
+        label="Télécharger le tableau en CSV",
+        data=batch_table.to_csv(index=False).encode('utf-8'),
+        file_name=f"phytomasse_communes_{batch_results['date']}.csv",
+        mime="text/csv"
+    )
+
+    # Carte choroplèthe de la phytomasse par hectare
+    batch_map = geemap.Map(ee_initialize=False)
+    min_lon, min_lat, max_lon, max_lat = communes_bbox()
+    batch_map.fit_bounds([[min_lat, min_lon], [max_lat, max_lon]])
+    folium.Choropleth(
+        geo_data=load_topology(),
+        topojson=f'objects.{OBJECT_NAME}',
+        data=batch_table,
+        columns=['id_commune', 'uf_ha'],
+        key_on='feature.properties.id_commune',
+        fill_color='YlGn',
+        nan_fill_color='lightgray',
+        legend_name='Phytomasse (UF/ha)',
+        name='Phytomasse (UF/ha)'
+    ).add_to(batch_map)
+    folium.LayerControl().add_to(batch_map)
+    st_folium(batch_map, width=700, height=500, key="batch_map")
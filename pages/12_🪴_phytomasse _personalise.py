@@ -1,42 +1,49 @@
 import streamlit as st
+import ee
+import folium
 import geemap.foliumap as geemap
 from streamlit_folium import st_folium
-import folium
-import ee
-import geopandas as gpd
-import pandas as pd
 import json
-from datetime import datetime, timedelta
+from datetime import datetime
+from shapely.geometry import shape
+from utils.communes import commune_ee_bounds, commune_ee_geometry, geojson_ee_geometry, geometry_metrics, get_commune_index
+from utils.ee_composite import index_composite
+from utils.ee_executor import run
+from utils.ee_export import export_geotiff
+from utils.ee_stats import compute_statistics
+from utils.ee_tiles import ee_layer, resolve_layers
+from utils.formula import compile_formula, preview_formula
+from utils.windows import DEFAULT_WINDOW, WINDOW_POLICIES, composite_window, describe_window
 def get_commune_geometry(geojson_data):
     """
-    Extracts the geometry from the uploaded GeoJSON file.
+    Geometry of the boundary to analyse: the first feature of the uploaded GeoJSON, or
+    the default commune of the index when no file was uploaded.
 
     Args:
-        geojson_data (dict): Parsed GeoJSON data.
+        geojson_data (dict): Parsed GeoJSON data (None when the uploaded file could not be read).
 
     Returns:
-        tuple: Geometry (as ee.Geometry), raw GeoJSON geometry, and center coordinates.
+        tuple: Geometry (as ee.Geometry, with all its parts and holes), raw GeoJSON
+        geometry and bounding box (as ee.Geometry).
+
+    Raises:
+        ValueError: If the file has no Polygon or MultiPolygon feature to use.
     """
+    if geojson_data is default_geojson:
+        return commune_ee_geometry(default_commune), default_commune['geojson'], commune_ee_bounds(default_commune)
     try:
         # Assuming the first feature is used for calculations
-        feature = geojson_data['features'][0]
-        coords = feature['geometry']['coordinates']
-        
-        # Determine geometry type
-        if feature['geometry']['type'] == 'Polygon':
-            geometry = ee.Geometry.Polygon(coords[0])
-        elif feature['geometry']['type'] == 'MultiPolygon':
-            geometry = ee.Geometry.MultiPolygon(coords)
-        else:
-            raise ValueError("Unsupported geometry type. Only Polygon and MultiPolygon are supported.")
-        
-        # Calculate center of the geometry
-        center = geometry.centroid().getInfo()['coordinates']
-        
-        return geometry, feature['geometry'], center
+        geometry_info = geojson_data['features'][0]['geometry']
+        geometry_type = geometry_info['type']
+    except (TypeError, KeyError, IndexError) as e:
+        raise ValueError("Le fichier GeoJSON ne contient aucune géométrie exploitable.") from e
+    if geometry_type not in ('Polygon', 'MultiPolygon'):
+        raise ValueError("Type de géométrie non pris en charge : seuls Polygon et MultiPolygon sont acceptés.")
+    try:
+        bounds = shape(geometry_info).bounds
     except Exception as e:
-        st.error(f"Erreur lors de l'extraction de la géométrie : {e}")
-        return None, None, None
+        raise ValueError(f"Erreur lors de l'extraction de la géométrie : {e}") from e
+    return geojson_ee_geometry(geometry_info), geometry_info, ee.Geometry.Rectangle(list(bounds))
 
 
 def load_geojson(file):
@@ -76,6 +83,18 @@ with st.sidebar:
     analyse_button = st.button("📊 Analyse de la Phytomasse")
     contact_button = st.button("📞 Informations de Contact")
 
+    # Fenêtre des composites : les dates d'une même période partagent le même composite
+    st.markdown("---")
+    window_policy = st.selectbox(
+        "Fenêtre des composites",
+        list(WINDOW_POLICIES),
+        index=list(WINDOW_POLICIES).index(DEFAULT_WINDOW),
+        format_func=WINDOW_POLICIES.get,
+        help="Les fenêtres par périodes s'arrêtent à la dernière période complète : "
+             "jusqu'aux 10 derniers jours avant la date (15 pour les quinzaines, un mois "
+             "pour les mois calendaires) ne sont pas inclus. Les 30 jours glissants se terminent à la date."
+    )
+
     # Informations de contact
     st.markdown("---")
     st.markdown("### Contact")
@@ -113,180 +132,6 @@ def initialize_earth_engine():
         ee.Initialize()
     return ee
 
-def get_download_link(image, region, scale=10, filename='output'):
-    """
-    Generate a link to download the image as a GeoTIFF.
-
-    Args:
-        image (ee.Image): The image to download (e.g., index or phytomass).
-        region (ee.Geometry): The region to clip the image.
-        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
-        filename (str): The desired filename for the downloaded GeoTIFF.
-
-    Returns:
-        str: A URL to download the GeoTIFF.
-    """
-    # Clip the image to the region
-    image = image.clip(region)
-
-    # Prepare the download URL
-    url = image.getDownloadURL({
-        'scale': scale,
-        'region': region,  # Pass region directly
-        'format': 'GeoTIFF',
-        'name': filename
-    })
-    return url
-
-
-def calculate_sum(image, region, scale=10):
-    """
-    Calculate the sum of pixel values over the specified region.
-
-    Args:
-        image (ee.Image): The image (e.g., index or phytomass) for which the sum will be calculated.
-        region (ee.Geometry): The region over which the sum will be calculated.
-        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
-
-    Returns:
-        float: The sum of the pixel values within the region.
-    """
-    sum_result = image.reduceRegion(
-        reducer=ee.Reducer.sum(),
-        geometry=region,
-        scale=scale,
-        maxPixels=1e9
-    ).getInfo()
-    return sum_result
-
-def calculate_mean(image, region, scale=10):
-    """
-    Calculate the sum of pixel values over the specified region.
-
-    Args:
-        image (ee.Image): The image (e.g., index or phytomass) for which the sum will be calculated.
-        region (ee.Geometry): The region over which the sum will be calculated.
-        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
-
-    Returns:
-        float: The sum of the pixel values within the region.
-    """
-    sum_result = image.reduceRegion(
-        reducer=ee.Reducer.mean(),
-        geometry=region,
-        scale=scale,
-        maxPixels=1e9
-    ).getInfo()
-    return sum_result
-
-def get_download_link(image, region, scale=10, filename='output'):
-    """
-    Generate a link to download the image as a GeoTIFF.
-
-    Args:
-        image (ee.Image): The image to download (e.g., index or phytomass).
-        region (ee.Geometry): The region to clip the image.
-        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
-        filename (str): The desired filename for the downloaded GeoTIFF.
-
-    Returns:
-        str: A URL to download the GeoTIFF.
-    """
-    # Clip the image to the region
-    image = image.clip(region)
-
-    # Prepare the download URL
-    url = image.getDownloadURL({
-        'scale': scale,
-        'region': region,  # Pass region directly
-        'format': 'GeoTIFF',
-        'name': filename
-    })
-    return url
-
-
-
-# Function to calculate the selected vegetation index
-def calculate_index(region, date, index, mask_clouds=True, scale_factor=1):
-    """
-    Calculate a vegetation index over the specified geometry and date range.
-
-    Args:
-        region (ee.Geometry): The geometry for which the index will be calculated.
-        date (str): The end date in "YYYY-MM-DD" format.
-        index (str): The name of the vegetation index to calculate (e.g., "NDVI", "RVI", "DVI", etc.).
-        mask_clouds (bool): Whether to apply cloud masking (default: True).
-        scale_factor (float): Factor to scale the index values (default: 1).
-
-    Returns:
-        ee.Image: The calculated vegetation index image clipped to the provided region.
-    """
-    # Define date range
-    end_date = datetime.strptime(date, "%Y-%m-%d")
-    start_date = end_date - timedelta(days=30)  # 1 month of data
-
-    # Load Sentinel-2 collection
-    s2_sr = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-        .filterBounds(region) \
-        .filterDate(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-
-    # Apply cloud masking if enabled
-    if mask_clouds:
-        def mask_clouds_function(image):
-            cloud_mask = image.select('QA60').lt(1)
-            return image.updateMask(cloud_mask)
-        s2_sr = s2_sr.map(mask_clouds_function)
-
-    # Define the index calculation
-    def calculate_image_index(image, index):
-        if index == 'NDVI':
-            return image.normalizedDifference(['B8', 'B4']).rename('NDVI')
-        elif index == 'RVI':
-            return image.expression('B4 / B8', {'B4': image.select('B4'), 'B8': image.select('B8')}).rename('RVI')
-        elif index == 'DVI':
-            return image.expression('B8 - B4', {'B4': image.select('B4'), 'B8': image.select('B8')}).rename('DVI')
-        elif index == 'SAVI':
-            L = 0.5
-            return image.expression('((B8 - B4) / (B8 + B4 + L)) * (1 + L)', {'B4': image.select('B4'), 'B8': image.select('B8'), 'L': L}).rename('SAVI')
-        elif index == 'EVI':
-            return image.expression('2.5 * ((B8 - B4) / (B8 + 6 * B4 - 7.5 * B2 + 1))', {'B4': image.select('B4'), 'B8': image.select('B8'), 'B2': image.select('B2')}).rename('EVI')
-        elif index == 'GNDVI':
-            return image.normalizedDifference(['B8', 'B3']).rename('GNDVI')
-        elif index == 'IPVI':
-            return image.expression('B8 / (B8 + B4)', {'B4': image.select('B4'), 'B8': image.select('B8')}).rename('IPVI')
-        elif index == 'NDWI':
-            return image.normalizedDifference(['B3', 'B8']).rename('NDWI')
-        elif index == 'MSAVI':
-            return image.expression('(2 * B8 + 1 - sqrt((2 * B8 + 1) ** 2 - 8 * (B8 - B4))) / 2', {'B4': image.select('B4'), 'B8': image.select('B8')}).rename('MSAVI')
-        elif index == 'TSAVI':
-            a = 1.339198  # Slope for 2020 (adjust as needed)
-            b = 0.006262  # Intercept for 2020 (adjust as needed)
-            return image.expression(
-                'a * (B8 - a * B4 - b) / (B8 + B4 - a * b + 0.08 * (1 + a**2))',
-                {
-                    'B4': image.select('B4'),
-                    'B8': image.select('B8'),
-                    'a': a,
-                    'b': b
-                }
-            ).rename('TSAVI')
-        else:
-            raise ValueError(f"Unsupported index: {index}")
-
-
-    # Apply the index calculation
-    index_image = s2_sr.map(lambda img: calculate_image_index(img, index)).median()
-
-    # Scale the index if a scale factor is provided
-    if scale_factor != 1:
-        index_image = index_image.multiply(scale_factor)
-
-    # Clip the image to the region
-    index_image = index_image.clip(region)
-
-    return index_image
-
-
 
 # Function to calculate phytomass
 # Function to calculate phytomass
@@ -318,22 +163,15 @@ def calculate_phytomass(index_image, formula_type, custom_formula=None, custom_v
 
     return phytomass, r_squared
 
-# Initialize Earth Engine
-ee = initialize_earth_engine()
 
-# Load GeoJSON and Excel data
-geojson_file = "finale_communes_4326.geojson"
-gdf = gpd.read_file(geojson_file)
-geojson_data = json.loads(gdf.to_json())
+# Default boundary (first commune of the shared commune index) until a file is uploaded
+default_commune = next(iter(get_commune_index()['by_id'].values()))
+default_geojson = {
+    'type': 'FeatureCollection',
+    'features': [{'type': 'Feature', 'geometry': default_commune['geojson'], 'properties': default_commune['properties']}]
+}
+geojson_data = default_geojson
 
-excel_file = "Weighted_Averages_of_UF_and_KG_per_Commune.xlsx"
-data = pd.read_excel(excel_file)
-
-# Extract communes
-if all(col in data.columns for col in ['id_commune', 'commune']):
-    communes = data[['id_commune', 'commune']]
-else:
-    st.error("The Excel file must contain 'id_commune' and 'commune' columns.")
 # Initialize session state for map configuration
 if "map_center" not in st.session_state:
     st.session_state.map_center = [31.5, -7.0]  # Default center (Morocco)
@@ -346,6 +184,52 @@ if "map_layers" not in st.session_state:
 
 # Streamlit app layout
 st.title("Formule personnalisée de la Phytomasse par Commune")
+
+# The formula is edited outside the form: it is validated and previewed locally at
+# each change, without any Earth Engine request
+# Index selection
+selected_index = st.selectbox(
+    "Sélectionnez un index de végétation pour la formule personnalisée",
+    ['NDVI', 'RVI', 'DVI', 'SAVI', 'MSAVI', 'TSAVI', 'IPVI']
+)
+
+# Explanation for custom formula
+st.markdown(f"""
+    ### Définissez une formule personnalisée
+    Entrez une formule en utilisant l'index sélectionné : **{selected_index}**.
+
+    - L'index sélectionné représente la valeur de végétation pour vos calculs.
+    - Exemple de formule : `35 + 100 * {selected_index} - 50 * ({selected_index} ** 2)`
+
+    Assurez-vous que votre formule utilise correctement cet index.
+""")
+
+# Custom formula input
+custom_formula = st.text_input(
+    "Entrez votre formule personnalisée ici :",
+    value=f"35 + 100 * {selected_index} - 50 * ({selected_index} ** 2)"
+)
+
+# Aperçu instantané de la courbe de réponse sur la plage de l'indice
+# The formula is only sent to Earth Engine once its preview has been evaluated
+compiled_formula = None
+try:
+    compiled = compile_formula(custom_formula, (selected_index,))
+    preview, preview_range = preview_formula(custom_formula, selected_index)
+    compiled_formula = compiled
+    st.line_chart(preview.set_index(selected_index))
+    if preview_range['min'] is not None:
+        st.caption(
+            f"Phytomasse attendue entre **{preview_range['min']:.2f}** et **{preview_range['max']:.2f}** "
+            f"pour {selected_index} dans sa plage d'affichage."
+        )
+    if preview_range['invalid']:
+        st.warning(f"La formule n'est pas définie pour {preview_range['invalid']} valeurs de l'indice sur {len(preview)}.")
+    elif preview_range['min'] is not None and preview_range['min'] < 0:
+        st.warning("La formule donne des valeurs négatives sur une partie de la plage de l'indice.")
+except ValueError as e:
+    st.error(f"Formule invalide : {e}")
+
 with st.form("index_form"):
     # Commune selection
     uploaded_file = st.file_uploader(
@@ -370,98 +254,87 @@ with st.form("index_form"):
         min_value=datetime(2000, 1, 1),
         max_value=datetime.today()
     )
-
-    # Index selection
-    selected_index = st.selectbox(
-        "Sélectionnez un index de végétation pour la formule personnalisée",
-        ['NDVI', 'RVI', 'DVI', 'SAVI', 'MSAVI', 'TSAVI', 'IPVI']
-    )
-
-    # Explanation for custom formula
-    st.markdown(f"""
-        ### Définissez une formule personnalisée
-        Entrez une formule en utilisant l'index sélectionné : **{selected_index}**.
-        
-        - L'index sélectionné représente la valeur de végétation pour vos calculs.
-        - Exemple de formule : `35 + 100 * {selected_index} - 50 * ({selected_index} ** 2)`
-        
-        Assurez-vous que votre formule utilise correctement cet index.
-    """)
-
-    # Custom formula input
-    custom_formula = st.text_input(
-        "Entrez votre formule personnalisée ici :",
-        value=f"35 + 100 * {selected_index} - 50 * ({selected_index} ** 2)"
-    )
+    st.caption(f"Composite {describe_window(*composite_window(selected_date.strftime('%Y-%m-%d'), window_policy))}")
 
     # Submit button
     calculate_button = st.form_submit_button("Calculer")
 
     # Handle form submission
     if calculate_button:
-        if custom_formula:
+        if compiled_formula:
             st.write("Index sélectionné :", selected_index)
             st.write("Formule personnalisée définie :")
-            st.latex(custom_formula)
+            st.latex(compiled_formula['expression'])
         else:
             st.error("Veuillez entrer une formule valide.")
 
-
-# Check if the button was clicked and calculate the results
-if calculate_button:
+# Check if the button was clicked and calculate the results (invalid formulas never
+# reach Earth Engine)
+if calculate_button and compiled_formula:
     try:
+        # Initialize Earth Engine
+        ee = initialize_earth_engine()
+
         # Determine corresponding index
         index = selected_index  # Directly use the selected index
         date = selected_date.strftime('%Y-%m-%d')  # Convert the selected date to string format
 
-        # Get the selected commune's ID and geometry
-        commune_geometry, geometry_info, center = get_commune_geometry(geojson_data)
+        # Get the selected commune's geometry (an unusable file stops here, before any request)
+        commune_geometry, geometry_info, commune_bounds = get_commune_geometry(geojson_data)
 
-        # Update session state with the map's center and zoom
-        st.session_state.map_center = [center[1], center[0]]
-        st.session_state.map_zoom = 12
-
-        # Calculate vegetation index
-        index_image = calculate_index(commune_geometry, date, index)
+        # Calculate vegetation index: the same composite as the phytomasse page, over the
+        # window of the date, with the scenes selected on the bounding box of the boundary
+        start_date, end_date = composite_window(date, window_policy)
+        index_image = index_composite(
+            commune_geometry, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), [index],
+            bounds=commune_bounds
+        )
         custom_variables = {index: index_image.select(index)}
 
         # Calculate phytomass
-        phytomass_image, r_squared = calculate_phytomass(index_image, 'Custom', custom_formula, custom_variables)
+        phytomass_image, r_squared = calculate_phytomass(index_image, 'Custom', compiled_formula['expression'], custom_variables)
+
+        # Index and phytomass statistics in a single request
+        stats = run(compute_statistics, index_image, index, phytomass_image, commune_geometry)
+        if not stats['index']['count']:
+            raise ValueError("Aucune image Sentinel-2 exploitable sur la période sélectionnée.")
 
-        # Calculate the mean value of the index and the sum of the phytomass
-        index_mean = calculate_mean(index_image, commune_geometry).get(index)
-        phytomass_sum = calculate_sum(phytomass_image, commune_geometry).get('Phytomass')
-        # Calculate the area in square meters
-        area_sq_meters = commune_geometry.area().getInfo()
+        index_mean = stats['index']['mean']
+        phytomass_sum = stats['phytomass']['sum']
 
-        # Convert the area to hectares
-        area_hectares = area_sq_meters / 10000
+        # Area and centroid of the boundary, computed locally
+        metrics = geometry_metrics(geometry_info)
+        area_hectares = metrics['area_ha']
 
-        # Streamlit App
+        # Update session state with the map's center and zoom
+        center = metrics['centroid']
+        st.session_state.map_center = [center[1], center[0]]
+        st.session_state.map_zoom = 12
 
         # Store the results in session state
         st.session_state['results'] = {
             'index_mean': index_mean,
             'phytomass_sum': phytomass_sum,
             'r_squared': r_squared,
-            'area_hectares' :area_hectares
+            'area_hectares' :area_hectares,
+            'window': describe_window(start_date, end_date)
         }
 
         # Prepare layers for the map
         st.session_state.map_layers = []  # Reset layers
         index_params = {
-            'min': index_image.reduceRegion(ee.Reducer.min(), commune_geometry).getInfo()[index],
-            'max': index_image.reduceRegion(ee.Reducer.max(), commune_geometry).getInfo()[index],
+            'min': stats['index']['min'],
+            'max': stats['index']['max'],
             'palette': ['blue', 'green', 'yellow']
         }
-        st.session_state.map_layers.append(geemap.ee_tile_layer(index_image, index_params, 'Vegetation Index'))
+        st.session_state.map_layers.append(ee_layer(index_image, index_params, 'Vegetation Index'))
 
         phytomass_params = {
-            'min': phytomass_image.reduceRegion(ee.Reducer.min(), commune_geometry).getInfo()['Phytomass'],
-            'max': phytomass_image.reduceRegion(ee.Reducer.max(), commune_geometry).getInfo()['Phytomass'],
+            'min': stats['phytomass']['min'],
+            'max': stats['phytomass']['max'],
             'palette': ['yellow', 'orange', 'red']
         }
-        st.session_state.map_layers.append(geemap.ee_tile_layer(phytomass_image, phytomass_params, 'Phytomass'))
+        st.session_state.map_layers.append(ee_layer(phytomass_image, phytomass_params, 'Phytomass'))
 
         st.session_state.map_layers.append(
             folium.GeoJson(
@@ -471,15 +344,19 @@ if calculate_button:
             )
         )
 
-        # Generate download links and store in session state
-        phytomass_download_link = get_download_link(phytomass_image, commune_geometry, scale=10, filename='phytomass_map')
-        index_download_link = get_download_link(index_image, commune_geometry, scale=10, filename='index_map')
-        st.session_state['download_links'] = {
-            'phytomass': phytomass_download_link,
-            'index': index_download_link
+        # Images offered for download (exported on demand, see below)
+        st.session_state['exports'] = {
+            'geojson': geometry_info,
+            'layers': {
+                'phytomass': {'image': phytomass_image, 'int16_scale': 100, 'filename': 'phytomass_map',
+                              'range': (stats['phytomass']['min'], stats['phytomass']['max'])},
+                'index': {'image': index_image, 'int16_scale': 10000, 'filename': 'index_map',
+                          'range': (stats['index']['min'], stats['index']['max'])},
+            },
         }
+        st.session_state.pop('export_files', None)
 
-    except ValueError as e:
+    except (ValueError, TimeoutError, ee.EEException) as e:
         st.error(f"Error: {e}")
 
 # Display results in a stylish way
@@ -492,7 +369,7 @@ if 'results' in st.session_state:
     # Créer un conteneur pour les résultats
     st.markdown("### Résumé du processus")
     st.markdown(f"""
-    2. **Date de l'analyse** : {selected_date.strftime('%Y-%m-%d')}
+    2. **Date de l'analyse** : {selected_date.strftime('%Y-%m-%d')} (composite {results.get('window', '')})
     4. **Résultats obtenus** :
     - Valeur moyenne de l'indice de végétation sur la commune : **{index_mean} (sans unité)**.
     - Phytomasse totale dans la commune : **{phytomass_sum/10} UF**.
@@ -502,19 +379,53 @@ if 'results' in st.session_state:
     6. **Liens de téléchargement** : Les cartes générées peuvent être téléchargées au format GeoTIFF.
     """)
 # Afficher les liens de téléchargement de manière claire et élégante
-if 'download_links' in st.session_state:
-    download_links = st.session_state['download_links']
-    
-    # Créer un conteneur pour les liens de téléchargement
-    st.markdown("### Liens de téléchargement")
-    st.markdown(f"- 🌿 [Télécharger la carte de phytomasse]({download_links['phytomass']})")
-    st.markdown(f"- 📈 [Télécharger la carte de l'indice de végétation]({download_links['index']})")
+# (GeoTIFF découpés en tuiles, téléchargés en parallèle et assemblés en COG, gardés en cache sur disque)
+if 'exports' in st.session_state:
+    exports = st.session_state['exports']
+
+    st.markdown("### Téléchargements")
+    export_int16 = st.checkbox("Encodage entier int16 (fichiers plus légers, valeurs mises à l'échelle selon leur plage)", key="export_int16")
+    if st.button("Préparer les GeoTIFF"):
+        try:
+            with st.spinner("Export des cartes..."):
+                st.session_state['export_files'] = {
+                    'int16': export_int16,
+                    'files': {
+                        layer: export_geotiff(
+                            spec['image'], exports['geojson'], scale=10,
+                            int16_scale=spec['int16_scale'] if export_int16 else None, name=spec['filename'],
+                            value_range=spec['range']
+                        )
+                        for layer, spec in exports['layers'].items()
+                    },
+                }
+        except (ValueError, TimeoutError, OSError, ee.EEException) as e:
+            st.error(f"Error: {e}")
+
+    export_files = st.session_state.get('export_files')
+    if export_files and export_files['int16'] == export_int16:
+        for layer, label in [('phytomass', "🌿 Télécharger la carte de phytomasse"),
+                             ('index', "📈 Télécharger la carte de l'indice de végétation")]:
+            with open(export_files['files'][layer], 'rb') as f:
+                st.download_button(
+                    label=label,
+                    data=f.read(),
+                    file_name=f"{exports['layers'][layer]['filename']}.tif",
+                    mime="image/tiff",
+                    key=f"download_{layer}"
+                )
 
 # Create or update the map
-Map = geemap.Map(location=st.session_state.map_center, zoom_start=st.session_state.map_zoom)
+Map = geemap.Map(location=st.session_state.map_center, zoom_start=st.session_state.map_zoom, ee_initialize=False)
 
 # Add all layers stored in session state
-for layer in st.session_state.map_layers:
+# (Earth Engine tile URLs come from the cache: no request unless they expired)
+try:
+    map_layers = resolve_layers(st.session_state.map_layers)
+except (ee.EEException, TimeoutError) as e:
+    st.error(f"Error: {e}")
+    map_layers = [layer for layer in st.session_state.map_layers if not isinstance(layer, dict)]
+for layer in map_layers:
     Map.add_child(layer)
 
 # Add layer control for toggling visibility
@@ -2,46 +2,13 @@ import streamlit as st
 import pandas as pd
 import datetime
 import ee
-import json
-import pandas as pd
-import geopandas as gpd
-import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.linear_model import LinearRegression
-
-# Initialize Google Earth Engine
-ee.Initialize()
-
-
-# Function to get commune geometry
-def get_commune_geometry(geojson, commune_id):
-    for feature in geojson['features']:
-        if feature['properties']['id_commune'] == commune_id:
-            coords = feature['geometry']['coordinates']
-            if feature['geometry']['type'] == 'Polygon':
-                geometry = ee.Geometry.Polygon(coords[0])
-                center = geometry.centroid().getInfo()['coordinates']
-                return geometry, feature['geometry'], center
-            elif feature['geometry']['type'] == 'MultiPolygon':
-                geometry = ee.Geometry.MultiPolygon(coords)
-                center = geometry.centroid().getInfo()['coordinates']
-                return geometry, feature['geometry'], center
-    raise ValueError(f"Commune with ID '{commune_id}' not found.")
-
-
-# Load GeoJSON and Excel data
-geojson_file = "finale_communes_4326.geojson"
-gdf = gpd.read_file(geojson_file)
-geojson_data = json.loads(gdf.to_json())
-
-excel_file = "Weighted_Averages_of_UF_and_KG_per_Commune.xlsx"
-data = pd.read_excel(excel_file)
-
-# Extract communes
-if all(col in data.columns for col in ['id_commune', 'commune']):
-    communes = data[['id_commune', 'commune']]
-else:
-    st.error("The Excel file must contain 'id_commune' and 'commune' columns.")
+from utils.communes import commune_names, get_commune_by_name, commune_ee_geometry
+from utils.jobs import FAILED, QUEUED, RUNNING, get_job, job_progress, submit_job
+from utils.regression import best_lags, fit_lagged, fit_tables, load_regression, regression_job
+from utils.timeseries_store import monthly_series
+
+
+
 
 # Function to calculate monthly precipitation
 def get_monthly_precipitation(geometry, start_date, end_date):
@@ -133,10 +100,16 @@ st.title("Analyse Mensuelle des Précipitations et de l'Indice de Végétation p
 # User Inputs
 with st.sidebar:
     st.header("Inputs")
-    selected_commune = st.selectbox("Sélectionnez une commune", communes['commune'].unique())
+    selected_commune = st.selectbox("Sélectionnez une commune", commune_names())
     start_date = st.date_input("Select Start Date", datetime.date(2021, 1, 1), min_value=datetime.date(2000, 1, 1))
     end_date = st.date_input("Select End Date", datetime.date(2021, 12, 31), min_value=datetime.date(2000, 1, 1))
     selected_index = st.selectbox("Select Vegetation Index", ["NDVI", "EVI", "DVI", "SAVI"])
+    server_side = st.checkbox(
+        "Stock local et calcul côté serveur",
+        value=True,
+        help="Lit les mois déjà récupérés depuis le disque et ne demande à Earth Engine que les mois "
+             "manquants, en une requête par période continue (mois complets)."
+    )
 
 # Generate Results
 if st.button("Générer les données mensuelles"):
@@ -145,11 +118,23 @@ if st.button("Générer les données mensuelles"):
     else:
         with st.spinner("Calcul des données mensuelles en cours..."):
             try:
-                commune_id = communes[communes['commune'] == selected_commune]['id_commune'].values[0]
-                commune_geometry, geometry_info, center = get_commune_geometry(geojson_data, commune_id)
-                
-                precipitation_df = get_monthly_precipitation(commune_geometry, start_date, end_date)
-                index_df = get_monthly_vegetation_index(commune_geometry, start_date, end_date, selected_index)
+                commune = get_commune_by_name(selected_commune)
+
+                if server_side:
+                    precipitation_df, index_df, fetch_stats = monthly_series(
+                        commune, start_date, end_date, selected_index
+                    )
+                    st.caption(
+                        f"{fetch_stats['stored']} mois lus depuis le stock local, "
+                        f"{fetch_stats['fetched']} mois récupérés depuis Earth Engine "
+                        f"({fetch_stats['requests']} requête(s))."
+                    )
+                else:
+                    if not ee.data.is_initialized():
+                        ee.Initialize()
+                    commune_geometry = commune_ee_geometry(commune)
+                    precipitation_df = get_monthly_precipitation(commune_geometry, start_date, end_date)
+                    index_df = get_monthly_vegetation_index(commune_geometry, start_date, end_date, selected_index)
 
                 results_df = pd.merge(precipitation_df, index_df, on='Month', how='outer')
 
@@ -186,35 +171,77 @@ if st.button("Générer les données mensuelles"):
                 st.write(f"Corrélation entre '{col1_name}' et '{col2_name}' : {correlation:.2f}")
                 # Calcul de la corrélation
 
-                                # Linear regression
-                X = results_df[[col1_name]].values.astype(np.float64)  # Use np.float64 to fix the deprecation
-                y = results_df[col2_name].values.astype(np.float64)
-
-                # Modèle de régression
-                regressor = LinearRegression()
-                regressor.fit(X, y)
-
-                # Prédiction
-                y_pred = regressor.predict(X)
+                # Régressions décalées (0 à 3 mois), ajustées en un seul lot NumPy
+                fit = fit_lagged(results_df[col1_name].values, results_df[col2_name].values)
+                fits, _ = fit_tables([commune['id']], [selected_commune], list(results_df['Month']), fit)
+                st.write("### Régression de l'indice sur la pluie décalée")
+                st.dataframe(fits[['lag', 'slope', 'intercept', 'r2', 'n_months']].rename(columns={
+                    'lag': 'Décalage (mois)', 'slope': 'Pente', 'intercept': 'Ordonnée', 'r2': 'R²', 'n_months': 'Mois'
+                }).round(4))
+
+                best = best_lags(fits)
+                if best.empty:
+                    st.warning("Pas assez de mois valides pour ajuster une régression.")
+                else:
+                    best = best.iloc[0]
+                    lag = int(best['lag'])
+                    x = results_df[col1_name].shift(lag)
+
+                    # matplotlib is only loaded on this code path
+                    import matplotlib.pyplot as plt
+
+                    fig, ax = plt.subplots()
+                    ax.scatter(x, results_df[col2_name], label="Points de données", color="blue")
+                    ax.plot(x, best['slope'] * x + best['intercept'], color="red", label="Régression Linéaire")
+                    ax.set_xlabel(f"{col1_name}, {lag} mois avant")
+                    ax.set_ylabel(col2_name)
+                    ax.legend()
+                    ax.set_title(f"Nuage de Points avec Régression Linéaire (meilleur décalage : {lag} mois)")
+                    st.pyplot(fig)
+
+                    st.write("**Équation de la régression linéaire :**")
+                    st.write(f"y = {best['slope']:.5f} * x(t-{lag}) + {best['intercept']:.2f}  (R² = {best['r2']:.2f})")
 
-                # Affichage dans Streamlit
-                st.title("Nuage de Points et Régression Linéaire")
-
-                # Affichage du graphique
-                fig, ax = plt.subplots()
-                ax.scatter(results_df[col1_name], results_df[col2_name], label="Points de données", color="blue")
-                ax.plot(results_df[col1_name], y_pred, color="red", label="Régression Linéaire")
-                ax.set_xlabel(col1_name)
-                ax.set_ylabel(col2_name)
-                ax.legend()
-                ax.set_title("Nuage de Points avec Régression Linéaire")
+            except Exception as e:
+                st.error(f"Une erreur est survenue : {e}")
 
-                # Afficher le graphique dans Streamlit
-                st.pyplot(fig)
 
-                # Afficher les coefficients de régression
-                st.write("**Équation de la régression linéaire :**")
-                st.write(f"y = {regressor.coef_[0]:.5f} * x + {regressor.intercept_:.2f}")
-                                
-            except Exception as e:
-                st.error(f"Une erreur est survenue : {e}")
\ No newline at end of file
+# Régressions de toutes les communes, stockées pour être relues sans recalcul
+st.write("### Toutes les communes")
+run = {
+    'index': selected_index,
+    'start_date': start_date.strftime("%Y-%m-%d"),
+    'end_date': end_date.strftime("%Y-%m-%d"),
+}
+if st.button("Ajuster toutes les communes"):
+    if start_date >= end_date:
+        st.error("La date de fin doit être postérieure à la date de début.")
+    else:
+        st.query_params['regression_job'] = submit_job(regression_job, **run)
+
+job_id = st.query_params.get('regression_job')
+job = get_job(job_id) if job_id else None
+if job is not None and job['status'] in (QUEUED, RUNNING):
+    job_progress(job_id)
+elif job is not None and job['status'] == FAILED:
+    st.error(f"Une erreur est survenue : {job['error']}")
+
+all_fits = load_regression(**run)
+if all_fits.empty:
+    st.info("Aucune régression enregistrée pour cet indice et cette période.")
+else:
+    best_per_commune = best_lags(all_fits)
+    st.caption(f"Calculé le {all_fits['computed_at'].iloc[0]} : meilleur décalage de chaque commune.")
+    st.bar_chart(best_per_commune['lag'].value_counts().sort_index().rename("Communes"))
+    st.dataframe(best_per_commune[['commune', 'lag', 'slope', 'intercept', 'r2', 'n_months']].rename(columns={
+        'commune': 'Commune', 'lag': 'Décalage (mois)', 'slope': 'Pente', 'intercept': 'Ordonnée',
+        'r2': 'R²', 'n_months': 'Mois'
+    }).round(4), hide_index=True)
+
+    residuals = load_regression(**run, residuals=True)
+    st.download_button(
+        label="Télécharger les résidus en CSV",
+        data=residuals.to_csv(index=False).encode('utf-8'),
+        file_name=f"residus_{selected_index}_{run['start_date']}_{run['end_date']}.csv",
+        mime="text/csv"
+    )
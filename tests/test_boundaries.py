@@ -0,0 +1,60 @@
+from shapely.geometry import MultiPolygon, Polygon, shape
+
+from utils.boundaries import OBJECT_NAME, build_topology
+
+# Two communes sharing a border; the second one has a hole
+WEST = [[[-7.0, 31.0], [-6.9, 31.0], [-6.9, 31.1], [-7.0, 31.1], [-7.0, 31.0]]]
+EAST = [
+    [[-6.9, 31.0], [-6.8, 31.0], [-6.8, 31.1], [-6.9, 31.1], [-6.9, 31.0]],
+    [[-6.87, 31.03], [-6.83, 31.03], [-6.83, 31.07], [-6.87, 31.07], [-6.87, 31.03]],
+]
+GEOJSON = {'type': 'FeatureCollection', 'features': [
+    {'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': WEST},
+     'properties': {'id_commune': 1, 'commune': "Ouest", 'population': 100}},
+    {'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': EAST},
+     'properties': {'id_commune': 2, 'commune': "Est", 'population': 200}},
+]}
+
+
+def decode(topology, geometry):
+    """Shapely geometry of a topology feature: delta-decoded, stitched and dequantized arcs."""
+    (sx, sy), (tx, ty) = topology['transform']['scale'], topology['transform']['translate']
+    arcs = []
+    for arc in topology['arcs']:
+        x = y = 0
+        points = []
+        for dx, dy in arc:
+            x, y = x + dx, y + dy
+            points.append((x * sx + tx, y * sy + ty))
+        arcs.append(points)
+
+    def ring(refs):
+        points = []
+        for ref in refs:
+            arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            points.extend(arc if not points else arc[1:])
+        return points
+
+    return MultiPolygon([Polygon(ring(rings[0]), [ring(hole) for hole in rings[1:]]) for rings in geometry['arcs']])
+
+
+def test_topology_decodes_to_the_original_boundaries():
+    topology = build_topology(GEOJSON)
+    geometries = topology['objects'][OBJECT_NAME]['geometries']
+
+    assert [geometry['id'] for geometry in geometries] == [1, 2]
+    # Every vertex is snapped to the grid: at most half a grid step away
+    step = max(topology['transform']['scale'])
+    for feature, geometry in zip(GEOJSON['features'], geometries):
+        decoded = decode(topology, geometry)
+        assert decoded.hausdorff_distance(shape(feature['geometry'])) <= step
+        assert len(decoded.geoms[0].interiors) == len(feature['geometry']['coordinates']) - 1
+        assert 'population' not in geometry['properties']
+
+
+def test_shared_border_is_stored_once():
+    topology = build_topology(GEOJSON)
+    west, east = topology['objects'][OBJECT_NAME]['geometries']
+    west_arcs = {ref if ref >= 0 else ~ref for ref in west['arcs'][0][0]}
+    east_arcs = {ref if ref >= 0 else ~ref for ref in east['arcs'][0][0]}
+    assert len(west_arcs & east_arcs) == 1
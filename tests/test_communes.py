@@ -0,0 +1,29 @@
+import math
+
+from shapely.geometry import Polygon
+
+from utils.communes import SIMPLIFY_MAX_AREA_ERROR, simplify_geometry
+
+
+def jagged_boundary(points=2000, radius=0.05):
+    # A commune-sized ring (~10 km across) with a small zig-zag along its edge
+    return Polygon([
+        (-7.0 + (radius + 0.0002 * (i % 2)) * math.cos(2 * math.pi * i / points),
+         31.5 + (radius + 0.0002 * (i % 2)) * math.sin(2 * math.pi * i / points))
+        for i in range(points)
+    ])
+
+
+def test_simplified_boundary_stays_within_the_area_error():
+    boundary = jagged_boundary()
+    simplified, error = simplify_geometry(boundary)
+
+    assert len(simplified.exterior.coords) < len(boundary.exterior.coords)
+    assert simplified.is_valid
+    assert error <= SIMPLIFY_MAX_AREA_ERROR
+    assert math.isclose(simplified.symmetric_difference(boundary).area / boundary.area, error)
+
+
+def test_boundary_is_kept_when_no_tolerance_meets_the_bound():
+    boundary = jagged_boundary()
+    assert simplify_geometry(boundary, max_area_error=0.0) == (boundary, 0.0)
@@ -0,0 +1,38 @@
+import pytest
+
+from utils import ee_cache
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    monkeypatch.setattr(ee_cache, 'CACHE_PATH', str(tmp_path / "ee_cache.sqlite"))
+    monkeypatch.setattr(ee_cache, '_connection', None)
+    now = [1_000_000.0]
+    monkeypatch.setattr(ee_cache.time, 'time', lambda: now[0])
+    yield now
+    if ee_cache._connection is not None:
+        ee_cache._connection.close()
+
+
+def test_entry_expires_after_its_ttl(clock):
+    ee_cache.cache_set('key', {'mean': 0.5}, ttl=60)
+    clock[0] += 59
+    assert ee_cache.cache_get('key') == (True, {'mean': 0.5})
+    clock[0] += 2
+    assert ee_cache.cache_get('key') == (False, None)
+
+
+def test_least_recently_used_entries_are_evicted(clock, monkeypatch):
+    monkeypatch.setattr(ee_cache, 'CACHE_MAX_BYTES', 100)
+    value = "x" * 38  # 40 bytes once serialized
+    ee_cache.cache_set('a', value)
+    clock[0] += 1
+    ee_cache.cache_set('b', value)
+    clock[0] += 1
+    ee_cache.cache_get('a')
+    clock[0] += 1
+    ee_cache.cache_set('c', value)
+
+    assert ee_cache.cache_get('b') == (False, None)
+    assert ee_cache.cache_get('a') == (True, value)
+    assert ee_cache.cache_get('c') == (True, value)
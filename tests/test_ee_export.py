@@ -0,0 +1,26 @@
+import pytest
+
+from utils.ee_export import INT16_MAX, fit_int16_scale
+
+
+def test_index_range_keeps_preferred_scale():
+    assert fit_int16_scale(10000, (-1.0, 1.0)) == 10000
+
+
+def test_dvi_range_round_trips():
+    value = -9876.54
+    scale = fit_int16_scale(10000, (-10000.0, 9999.0))
+    encoded = round(value * scale)
+    assert abs(encoded) <= INT16_MAX
+    assert abs(encoded / scale - value) <= 0.5 / scale
+
+
+def test_large_phytomass_is_not_clamped():
+    scale = fit_int16_scale(100, (0.0, 4500.0))
+    assert 4500.0 * scale <= INT16_MAX
+    assert scale == 1
+
+
+def test_unknown_range_is_refused():
+    with pytest.raises(ValueError):
+        fit_int16_scale(100, (None, None))
@@ -0,0 +1,19 @@
+import time
+
+import pytest
+
+from utils.formula import compile_formula
+
+NESTED_POWERS = "(((((((9**10)**10)**10)**10)**10)**10)**10) + NDVI"
+
+
+def test_nested_constant_powers_fail_fast():
+    start = time.monotonic()
+    compiled = compile_formula(NESTED_POWERS, ('NDVI',))
+    with pytest.raises(ValueError):
+        compiled['evaluate'](NDVI=0.5)
+    assert time.monotonic() - start < 1
+
+
+def test_constants_are_floats():
+    assert compile_formula("35 + 100 * NDVI", ('NDVI',))['expression'] == "35.0 + 100.0 * NDVI"
@@ -0,0 +1,78 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from utils import jobs, windows
+
+
+def add_job(progress, a, b):
+    progress(1.0, "fini")
+    return {'sum': a + b}
+
+
+add_job.__module__, add_job.__qualname__ = windows.__name__, 'add_job'
+
+
+@pytest.fixture(autouse=True)
+def job_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOBS_PATH', str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(jobs, '_connection', None)
+    monkeypatch.setattr(jobs, '_start_dispatcher', lambda: None)
+    monkeypatch.setattr(windows, 'add_job', add_job, raising=False)
+    yield
+    if jobs._connection is not None:
+        jobs._connection.close()
+
+
+def set_worker(job_id, worker):
+    jobs._connect().execute("UPDATE jobs SET status = ?, worker = ? WHERE id = ?", (jobs.RUNNING, worker, job_id))
+
+
+def test_same_request_returns_the_same_job():
+    job_id = jobs.submit_job(add_job, a=1, b=2)
+    assert jobs.submit_job(add_job, b=2, a=1) == job_id
+    assert jobs.submit_job(add_job, a=1, b=3) != job_id
+    assert jobs.get_job(job_id)['status'] == jobs.QUEUED
+
+
+def test_claim_takes_each_queued_job_once():
+    job_id = jobs.submit_job(add_job, a=1, b=2)
+    claimed = jobs._claim()
+    assert claimed[0] == job_id
+    assert jobs._claim() is None
+    assert jobs.get_job(job_id)['status'] == jobs.RUNNING
+
+
+def test_finished_job_stores_its_result():
+    job_id = jobs.submit_job(add_job, a=1, b=2)
+    jobs._run(*jobs._claim())
+    job = jobs.get_job(job_id)
+    assert (job['status'], job['progress'], job['result']) == (jobs.DONE, 1.0, {'sum': 3})
+
+
+def test_failed_job_keeps_its_error():
+    job_id = jobs.submit_job(add_job, a=1, b="2")
+    jobs._run(*jobs._claim())
+    job = jobs.get_job(job_id)
+    assert job['status'] == jobs.FAILED and job['error']
+
+
+def test_recover_requeues_the_jobs_of_dead_processes():
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    host = socket.gethostname()
+    orphan = jobs.submit_job(add_job, a=1, b=2)
+    alive = jobs.submit_job(add_job, a=2, b=2)
+    elsewhere = jobs.submit_job(add_job, a=3, b=2)
+    set_worker(orphan, f"{host}:{dead.pid}")
+    set_worker(alive, f"{host}:{os.getppid()}")
+    set_worker(elsewhere, f"{host}-other:{dead.pid}")
+
+    jobs._recover()
+
+    assert jobs.get_job(orphan)['status'] == jobs.QUEUED
+    assert jobs.get_job(alive)['status'] == jobs.RUNNING
+    assert jobs.get_job(elsewhere)['status'] == jobs.RUNNING
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from utils import tile_proxy
+from utils.tile_proxy import TileStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(tile_proxy.time, 'time', lambda: now[0])
+    return now
+
+
+def test_tile_expires_after_its_ttl(tmp_path, clock):
+    store = TileStore(str(tmp_path), max_bytes=1024, ttl=60)
+    store.put('a' * 16, 'image/png', b"tile")
+    clock[0] += 59
+    assert store.get('a' * 16) == ('image/png', b"tile")
+    clock[0] += 2
+    assert store.get('a' * 16) is None
+    assert not os.path.exists(store._path('a' * 16))
+
+
+def test_least_recently_used_tiles_are_evicted(tmp_path, clock):
+    store = TileStore(str(tmp_path), max_bytes=100, ttl=60)
+    first, second, third = 'a' * 16, 'b' * 16, 'c' * 16
+    store.put(first, 'image/png', b"x" * 40)
+    clock[0] += 1
+    store.put(second, 'image/png', b"x" * 40)
+    clock[0] += 1
+    store.get(first)
+    clock[0] += 1
+    store.put(third, 'image/png', b"x" * 40)
+
+    assert store.get(second) is None
+    assert not os.path.exists(store._path(second))
+    assert store.get(first) is not None
+    assert store.get(third) is not None
@@ -0,0 +1,31 @@
+from datetime import date
+
+import pytest
+
+from utils.timeseries_store import is_final, plan_fetch
+
+MONTHS = ['2023-01', '2023-02', '2023-03', '2023-04', '2023-05', '2023-06']
+
+
+@pytest.mark.parametrize('month, today, final', [
+    ('2024-01', date(2024, 3, 16), False),
+    ('2024-01', date(2024, 3, 17), True),  # February 1st + FINAL_DELAY_DAYS (45)
+    ('2023-12', date(2024, 2, 15), True),  # month ending with the year
+    ('2023-12', date(2024, 2, 14), False),
+])
+def test_is_final(month, today, final):
+    assert is_final(month, today) is final
+
+
+def test_missing_months_are_grouped_into_runs():
+    stored = {'2023-01', '2023-02', '2023-04'}
+    assert plan_fetch(MONTHS, stored, date(2024, 1, 1)) == [('2023-03', '2023-03'), ('2023-05', '2023-06')]
+
+
+def test_stored_months_are_fetched_again_until_final():
+    assert plan_fetch(MONTHS, set(MONTHS), date(2023, 7, 1)) == [('2023-05', '2023-06')]
+
+
+def test_nothing_to_fetch():
+    assert plan_fetch(MONTHS, set(MONTHS), date(2024, 1, 1)) == []
+    assert plan_fetch([], set(), date(2024, 1, 1)) == []
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+
+from utils.windows import composite_window, describe_window
+
+
+@pytest.mark.parametrize('policy, date, start, end', [
+    ('dekad', '2024-03-14', '2024-02-11', '2024-03-11'),
+    ('dekad', '2024-03-10', '2024-02-11', '2024-03-11'),  # last day of a dekad includes it
+    ('dekad', '2024-01-31', '2024-01-01', '2024-02-01'),
+    ('half-month', '2024-03-14', '2024-02-01', '2024-03-01'),
+    ('half-month', '2024-03-31', '2024-03-01', '2024-04-01'),
+    ('month', '2024-03-14', '2024-02-01', '2024-03-01'),
+    ('month', '2024-12-31', '2024-12-01', '2025-01-01'),
+    ('rolling', '2024-03-14', '2024-02-13', '2024-03-14'),
+])
+def test_composite_window(policy, date, start, end):
+    assert composite_window(date, policy) == (datetime.fromisoformat(start), datetime.fromisoformat(end))
+
+
+@pytest.mark.parametrize('policy, first, last', [
+    ('dekad', 11, 19),
+    ('half-month', 1, 14),
+    ('month', 1, 30),
+])
+def test_dates_of_a_period_share_their_window(policy, first, last):
+    # Every day of a period but its last one (which completes the period) maps to the same window
+    windows = {composite_window(f'2024-03-{day:02d}', policy) for day in range(first, last + 1)}
+    assert len(windows) == 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        composite_window('2024-03-14', 'week')
+
+
+def test_describe_window_shows_the_last_included_day():
+    assert describe_window(*composite_window('2024-03-14', 'dekad')) == "du 2024-02-11 au 2024-03-10"
@@ -0,0 +1,301 @@
+"""
+Commune boundaries for the browser, as quantized TopoJSON.
+
+The communes GeoJSON is converted once (keyed on its checksum, like the columnar copies
+of utils/data.py) to a TopoJSON topology: coordinates are snapped to an integer grid,
+borders shared by two communes are stored once as arcs, and arcs are delta-encoded.
+Maps load the boundary overlay from this topology (the whole file, or the arcs of a
+single commune) instead of the full-precision GeoJSON.
+
+Build it ahead of time (and print the sizes) with:
+    python -m utils.boundaries
+"""
+import json
+import os
+
+import streamlit as st
+
+from utils.data import GEOJSON_FILE, ensure_columnar, file_signature
+
+OBJECT_NAME = 'communes'
+# Grid positions per axis over the extent of the communes: about 3e-5 degree (~3 m)
+# for the current file, well below a screen pixel at the zooms used by the maps
+QUANTIZATION = 100000
+# Feature properties kept in the topology (the others are only needed server-side)
+PROPERTIES = ['id_commune', 'commune', 'nom', 'region']
+
+
+def _polygons(geometry):
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+def _quantize_ring(ring, translate, scale):
+    points = []
+    for x, y in ring:
+        point = (round((x - translate[0]) / scale[0]), round((y - translate[1]) / scale[1]))
+        if not points or point != points[-1]:
+            points.append(point)
+    if points[0] != points[-1]:
+        points.append(points[0])
+    return points
+
+
+def _junctions(rings):
+    """Points where a ring meets a ring with different neighbours (ends of shared borders)."""
+    neighbours = {}
+    junctions = set()
+    for ring in rings:
+        n = len(ring) - 1
+        for i in range(n):
+            pair = frozenset((ring[i - 1], ring[i + 1]))
+            seen = neighbours.setdefault(ring[i], pair)
+            if seen != pair:
+                junctions.add(ring[i])
+    return junctions
+
+
+def _cut(ring, junctions):
+    """Split a closed ring into arcs between junctions (one arc if it has none)."""
+    points = ring[:-1]
+    starts = [i for i, point in enumerate(points) if point in junctions]
+    if not starts:
+        # Canonical rotation, so a ring shared whole (island / hole) is stored once
+        start = points.index(min(points))
+        points = points[start:] + points[:start]
+        return [points + [points[0]]]
+    points = points[starts[0]:] + points[:starts[0]]
+    points.append(points[0])
+    arcs = []
+    current = [points[0]]
+    for point in points[1:]:
+        current.append(point)
+        if point in junctions:
+            arcs.append(current)
+            current = [point]
+    return arcs
+
+
+def build_topology(geojson, quantization=QUANTIZATION, properties=PROPERTIES):
+    """
+    Build a quantized TopoJSON topology from a GeoJSON feature collection.
+
+    Args:
+        geojson (dict): A FeatureCollection of Polygon/MultiPolygon features (EPSG:4326).
+        quantization (int): The number of grid positions per axis.
+        properties (list): The feature properties to keep.
+
+    Returns:
+        dict: The topology, with the features in objects[OBJECT_NAME] (each geometry
+        has the 'id_commune' property as 'id').
+    """
+    features = [f for f in geojson['features'] if f.get('geometry') and _polygons(f['geometry'])]
+    xs = [x for f in features for polygon in _polygons(f['geometry']) for ring in polygon for x, _ in ring]
+    ys = [y for f in features for polygon in _polygons(f['geometry']) for ring in polygon for _, y in ring]
+    bbox = [min(xs), min(ys), max(xs), max(ys)]
+    translate = [bbox[0], bbox[1]]
+    scale = [
+        (bbox[2] - bbox[0]) / (quantization - 1) or 1,
+        (bbox[3] - bbox[1]) / (quantization - 1) or 1,
+    ]
+
+    # Quantized rings, dropping the rings that collapse to less than a triangle
+    shapes = []
+    for feature in features:
+        polygons = []
+        for polygon in _polygons(feature['geometry']):
+            rings = [_quantize_ring(ring, translate, scale) for ring in polygon]
+            rings = [ring for ring in rings if len(ring) >= 4]
+            if rings:
+                polygons.append(rings)
+        shapes.append(polygons)
+
+    junctions = _junctions([ring for polygons in shapes for rings in polygons for ring in rings])
+
+    arcs = []
+    arc_index = {}
+
+    def arc_ref(points):
+        key = tuple(points)
+        if key in arc_index:
+            return arc_index[key]
+        reverse = key[::-1]
+        if reverse in arc_index:
+            return ~arc_index[reverse]
+        arc_index[key] = len(arcs)
+        arcs.append(points)
+        return arc_index[key]
+
+    geometries = []
+    for feature, polygons in zip(features, shapes):
+        if not polygons:
+            continue
+        encoded = [[[arc_ref(arc) for arc in _cut(ring, junctions)] for ring in rings] for rings in polygons]
+        props = {key: feature['properties'].get(key) for key in properties if key in feature['properties']}
+        geometry = {'type': 'MultiPolygon', 'arcs': encoded, 'properties': props}
+        if 'id_commune' in props:
+            geometry['id'] = props['id_commune']
+        geometries.append(geometry)
+
+    # Delta encoding: first point absolute, then differences
+    delta_arcs = [
+        [list(arc[0])] + [[x - px, y - py] for (px, py), (x, y) in zip(arc, arc[1:])]
+        for arc in arcs
+    ]
+    return {
+        'type': 'Topology',
+        'bbox': bbox,
+        'transform': {'scale': scale, 'translate': translate},
+        'objects': {OBJECT_NAME: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': delta_arcs,
+    }
+
+
+def sub_topology(topology, ids):
+    """
+    Topology restricted to some features, keeping only the arcs they use.
+
+    Args:
+        topology (dict): A topology built by build_topology.
+        ids (iterable): The IDs of the features to keep.
+
+    Returns:
+        dict: The smaller topology (arcs renumbered).
+    """
+    ids = set(ids)
+    geometries = [g for g in topology['objects'][OBJECT_NAME]['geometries'] if g.get('id') in ids]
+    used = sorted({
+        ref if ref >= 0 else ~ref
+        for g in geometries for rings in g['arcs'] for ring in rings for ref in ring
+    })
+    renumber = {old: new for new, old in enumerate(used)}
+
+    def remap(ref):
+        return renumber[ref] if ref >= 0 else ~renumber[~ref]
+
+    return {
+        'type': 'Topology',
+        'bbox': topology['bbox'],
+        'transform': topology['transform'],
+        'objects': {OBJECT_NAME: {'type': 'GeometryCollection', 'geometries': [
+            dict(g, arcs=[[[remap(ref) for ref in ring] for ring in rings] for rings in g['arcs']])
+            for g in geometries
+        ]}},
+        'arcs': [topology['arcs'][i] for i in used],
+    }
+
+
+def with_properties(topology, values):
+    """
+    Copy of a topology with extra properties merged into its features (e.g., for tooltips
+    and style functions); the arcs are shared with the original.
+
+    Args:
+        topology (dict): A topology built by build_topology.
+        values (dict): Extra properties per commune ID.
+
+    Returns:
+        dict: The new topology.
+    """
+    geometries = topology['objects'][OBJECT_NAME]['geometries']
+    return dict(topology, objects={OBJECT_NAME: {'type': 'GeometryCollection', 'geometries': [
+        dict(g, properties={**g['properties'], **values.get(g.get('id'), {})}) for g in geometries
+    ]}})
+
+
+def _geojson_to_topojson(source, target):
+    with open(source, encoding='utf-8') as f:
+        topology = build_topology(json.load(f))
+    with open(target, 'w', encoding='utf-8') as f:
+        json.dump(topology, f, separators=(',', ':'), ensure_ascii=False)
+
+
+def topojson_file(path=GEOJSON_FILE):
+    """
+    Path of the TopoJSON copy of the communes, built if missing or outdated.
+
+    Args:
+        path (str): The communes GeoJSON file.
+
+    Returns:
+        str: The TopoJSON file.
+    """
+    return ensure_columnar(path, '.topojson', _geojson_to_topojson)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_topology(path, signature):
+    with open(topojson_file(path), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_topology(path=GEOJSON_FILE):
+    """
+    Topology of all the communes, shared by every session of the process.
+
+    Returns:
+        dict: The topology (shared object, do not modify in place).
+    """
+    return _load_topology(path, file_signature(path))
+
+
+@st.cache_resource(show_spinner=False, max_entries=256)
+def _commune_topology(commune_ids, signature):
+    return sub_topology(load_topology(), commune_ids)
+
+
+def commune_topology(commune_ids):
+    """
+    Topology of some communes only (e.g., the boundary of the selected commune).
+
+    Args:
+        commune_ids (iterable): The IDs of the communes.
+
+    Returns:
+        dict: The topology (shared object, do not modify in place).
+    """
+    return _commune_topology(tuple(sorted(int(i) for i in commune_ids)), file_signature(GEOJSON_FILE))
+
+
+def boundary_layer(commune_ids=None, name="Commune Boundary", style_function=None, **kwargs):
+    """
+    Folium layer drawing commune boundaries from the TopoJSON topology.
+
+    Args:
+        commune_ids (iterable): The IDs of the communes to draw (default: all of them).
+        name (str): The name of the layer in the layer control.
+        style_function (callable): The folium style function (default: red outline).
+        **kwargs: Other folium.TopoJson arguments (e.g., tooltip).
+
+    Returns:
+        folium.TopoJson: The layer.
+    """
+    import folium
+    topology = load_topology() if commune_ids is None else commune_topology(commune_ids)
+    return folium.TopoJson(
+        topology,
+        f'objects.{OBJECT_NAME}',
+        name=name,
+        style_function=style_function or (lambda x: {'color': 'red', 'weight': 2, 'fillOpacity': 0}),
+        **kwargs
+    )
+
+
+def main():
+    target = topojson_file()
+    source_size = os.path.getsize(GEOJSON_FILE)
+    target_size = os.path.getsize(target)
+    print(f"{GEOJSON_FILE}: {source_size / 1e6:.2f} MB")
+    print(f"{target}: {target_size / 1e6:.2f} MB ({source_size / target_size:.1f}x smaller)")
+    with open(target, encoding='utf-8') as f:
+        topology = json.load(f)
+    ids = [g['id'] for g in topology['objects'][OBJECT_NAME]['geometries'] if 'id' in g]
+    sizes = [len(json.dumps(sub_topology(topology, [i]), separators=(',', ':'))) for i in ids]
+    print(f"Single commune: {sum(sizes) / len(sizes) / 1e3:.1f} kB on average, {max(sizes) / 1e3:.1f} kB max")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+import functools
+import json
+import os
+
+import ee
+import streamlit as st
+from shapely.geometry import mapping
+
+from utils.data import EXCEL_FILE, GEOJSON_FILE, file_signature, load_commune_table, load_communes
+
+# Optional Earth Engine table holding the communes (see export_communes_asset). When set,
+# requests reference the table instead of carrying the boundary coordinates inline.
+COMMUNES_ASSET = os.environ.get("COMMUNES_ASSET")
+
+# Boundaries sent to Earth Engine are simplified with the largest tolerance whose
+# symmetric difference with the original boundary stays below this fraction of the
+# commune area, so any reduction over the simplified geometry covers the same pixels
+# to within 0.5% of the commune area.
+SIMPLIFY_MAX_AREA_ERROR = 0.005
+SIMPLIFY_TOLERANCES = [0.002, 0.001, 0.0005, 0.0002, 0.0001]  # degrees (~200 m to ~10 m)
+
+
+def simplify_geometry(geometry, max_area_error=SIMPLIFY_MAX_AREA_ERROR):
+    """
+    Simplify a boundary as much as possible within an area-error bound.
+
+    Each tolerance is applied with shapely's topology-preserving simplification (the
+    result stays valid, rings do not self-intersect or disappear).
+
+    Args:
+        geometry (shapely.geometry.base.BaseGeometry): The boundary (EPSG:4326).
+        max_area_error (float): The maximum area of the symmetric difference between
+            the simplified and original boundaries, as a fraction of the original area.
+
+    Returns:
+        tuple: The simplified geometry and its relative area error (the original
+        geometry and 0.0 if no tolerance meets the bound).
+    """
+    for tolerance in SIMPLIFY_TOLERANCES:
+        simplified = geometry.simplify(tolerance, preserve_topology=True)
+        if simplified.is_empty or not simplified.is_valid:
+            continue
+        error = simplified.symmetric_difference(geometry).area / geometry.area
+        if error <= max_area_error:
+            return simplified, error
+    return geometry, 0.0
+
+
+@functools.lru_cache(maxsize=1)
+def _geod():
+    from pyproj import Geod
+    return Geod(ellps="WGS84")
+
+
+def geometry_metrics(geometry):
+    """
+    Geodesic area and centroid of a boundary, computed locally (no Earth Engine request).
+
+    Args:
+        geometry: The boundary, as a shapely geometry or a GeoJSON geometry (EPSG:4326).
+
+    Returns:
+        dict: {'area_ha': float, 'centroid': [lon, lat]}.
+    """
+    if isinstance(geometry, dict):
+        from shapely.geometry import shape
+        geometry = shape(geometry)
+    area, _ = _geod().geometry_area_perimeter(geometry)
+    return {'area_ha': abs(area) / 10000, 'centroid': [geometry.centroid.x, geometry.centroid.y]}
+
+
+def build_commune_index(communes, table):
+    """
+    Build the commune index from the commune boundaries and the commune table.
+
+    Centroid, bounding box and geodesic area are computed locally with shapely/pyproj,
+    so lookups never need an Earth Engine request.
+
+    Args:
+        communes (gpd.GeoDataFrame): The commune boundaries (EPSG:4326).
+        table (pd.DataFrame): The commune table with 'id_commune' and 'commune' columns.
+
+    Returns:
+        dict: {'by_id': {id: commune}, 'by_name': {name: commune}, 'names': [name, ...]}, where
+        each commune is a dict with 'id', 'name', 'geojson', 'properties', 'centroid' ([lon, lat]),
+        'bbox' ([min_lon, min_lat, max_lon, max_lat]), 'area_ha', the simplified boundary sent to
+        Earth Engine in 'simplified' (with its relative area error in 'simplify_error') and the
+        table row in 'data'.
+    """
+    if not all(col in table.columns for col in ['id_commune', 'commune']):
+        raise ValueError("The Excel file must contain 'id_commune' and 'commune' columns.")
+
+    rows = {int(row['id_commune']): row for row in table.to_dict('records')}
+
+    by_id = {}
+    properties = communes.drop(columns=communes.geometry.name).to_dict('records')
+    for feature_properties, geometry in zip(properties, communes.geometry):
+        if geometry is None or geometry.geom_type not in ('Polygon', 'MultiPolygon'):
+            continue
+        commune_id = int(feature_properties['id_commune'])
+        metrics = geometry_metrics(geometry)
+        simplified, simplify_error = simplify_geometry(geometry)
+        row = rows.get(commune_id, {})
+        by_id[commune_id] = {
+            'id': commune_id,
+            'name': row.get('commune', feature_properties.get('commune')),
+            'geojson': json.loads(json.dumps(mapping(geometry))),
+            'properties': feature_properties,
+            'centroid': metrics['centroid'],
+            'bbox': list(geometry.bounds),
+            'area_ha': metrics['area_ha'],
+            'simplified': json.loads(json.dumps(mapping(simplified))),
+            'simplify_error': simplify_error,
+            'data': row,
+        }
+
+    names = list(table['commune'].unique())
+    by_name = {}
+    for row in table.to_dict('records'):
+        commune = by_id.get(int(row['id_commune']))
+        if commune is not None:
+            by_name.setdefault(row['commune'], commune)
+
+    return {'by_id': by_id, 'by_name': by_name, 'names': names}
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _commune_index(signature):
+    return build_commune_index(load_communes(), load_commune_table())
+
+
+def get_commune_index():
+    """
+    Index the communes once per process by ID and by name (rebuilt if the data files change).
+
+    Returns:
+        dict: The index built by build_commune_index.
+    """
+    return _commune_index((file_signature(GEOJSON_FILE), file_signature(EXCEL_FILE)))
+
+
+def commune_names():
+    """
+    Names of the communes, in the order of the commune table.
+
+    Returns:
+        list: The commune names.
+    """
+    return get_commune_index()['names']
+
+
+def get_commune(commune_id):
+    """
+    Look up a commune by ID.
+
+    Args:
+        commune_id (int): The ID of the commune.
+
+    Returns:
+        dict: The commune entry.
+    """
+    commune = get_commune_index()['by_id'].get(int(commune_id))
+    if commune is None:
+        raise ValueError(f"Commune with ID '{commune_id}' not found.")
+    return commune
+
+
+def get_commune_by_name(name):
+    """
+    Look up a commune by name.
+
+    Args:
+        name (str): The name of the commune, as listed in the commune table.
+
+    Returns:
+        dict: The commune entry.
+    """
+    commune = get_commune_index()['by_name'].get(name)
+    if commune is None:
+        raise ValueError(f"Commune '{name}' not found.")
+    return commune
+
+
+def geojson_ee_geometry(geometry):
+    """
+    Earth Engine geometry of a GeoJSON boundary, with all its parts and holes (no network call).
+
+    Args:
+        geometry (dict): The GeoJSON geometry (Polygon or MultiPolygon).
+
+    Returns:
+        ee.Geometry: The geometry.
+
+    Raises:
+        ValueError: If the geometry is neither a Polygon nor a MultiPolygon.
+    """
+    if geometry['type'] == 'Polygon':
+        return ee.Geometry.Polygon(geometry['coordinates'])
+    if geometry['type'] == 'MultiPolygon':
+        return ee.Geometry.MultiPolygon(geometry['coordinates'])
+    raise ValueError(f"Unsupported geometry type {geometry['type']}: only Polygon and MultiPolygon are supported.")
+
+
+def commune_ee_geometry(commune, full_resolution=False):
+    """
+    Earth Engine geometry of a commune, built on first use (no network call).
+
+    By default the simplified boundary is used, or a reference to the communes table
+    when COMMUNES_ASSET is set, which keeps request payloads small.
+
+    Args:
+        commune (dict): The commune entry.
+        full_resolution (bool): Whether to send the original boundary coordinates.
+
+    Returns:
+        ee.Geometry: The commune geometry.
+    """
+    key = 'ee_geometry_full' if full_resolution else 'ee_geometry'
+    if key not in commune:
+        if full_resolution:
+            commune[key] = geojson_ee_geometry(commune['geojson'])
+        elif COMMUNES_ASSET:
+            commune[key] = ee.FeatureCollection(COMMUNES_ASSET) \
+                .filter(ee.Filter.eq('id_commune', commune['id'])) \
+                .geometry()
+        else:
+            commune[key] = geojson_ee_geometry(commune['simplified'])
+    return commune[key]
+
+
+def commune_ee_bounds(commune):
+    """
+    Bounding box of a commune as an ee.Geometry, for cheap filterBounds calls.
+
+    Args:
+        commune (dict): The commune entry.
+
+    Returns:
+        ee.Geometry: The bounding rectangle.
+    """
+    if 'ee_bounds' not in commune:
+        commune['ee_bounds'] = ee.Geometry.Rectangle(commune['bbox'])
+    return commune['ee_bounds']
+
+
+def export_communes_asset(asset_id):
+    """
+    Upload the communes once as an Earth Engine table, to be referenced through COMMUNES_ASSET.
+
+    Args:
+        asset_id (str): The destination asset (e.g., 'users/<user>/communes').
+
+    Returns:
+        ee.batch.Task: The started export task.
+    """
+    features = [
+        ee.Feature(geojson_ee_geometry(commune['geojson']), {'id_commune': commune['id'], 'commune': commune['name']})
+        for commune in get_commune_index()['by_id'].values()
+    ]
+    task = ee.batch.Export.table.toAsset(
+        collection=ee.FeatureCollection(features),
+        description='communes',
+        assetId=asset_id
+    )
+    task.start()
+    return task
@@ -0,0 +1,133 @@
+import hashlib
+import os
+
+import streamlit as st
+
+GEOJSON_FILE = "finale_communes_4326.geojson"
+EXCEL_FILE = "Weighted_Averages_of_UF_and_KG_per_Commune.xlsx"
+
+# Columnar copies of the source files, rebuilt when the source checksum changes
+DATA_CACHE_DIR = os.path.join(".cache", "data")
+
+
+def file_signature(path):
+    """
+    Cheap signature of a file, used to notice when it changes.
+
+    Args:
+        path (str): The file path.
+
+    Returns:
+        tuple: (modification time in ns, size in bytes).
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_checksum(path):
+    """
+    SHA-256 checksum of a file.
+
+    Args:
+        path (str): The file path.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ensure_columnar(path, extension, convert):
+    """
+    Convert a source file to a columnar file once, keyed on the source checksum.
+
+    The conversion is written to a temporary file and moved into place, so concurrent
+    processes never read a partial file.
+
+    Args:
+        path (str): The source file.
+        extension (str): The extension of the columnar file (e.g., '.parquet').
+        convert (callable): convert(source_path, target_path) writes the columnar file.
+
+    Returns:
+        str: The path of the up-to-date columnar file.
+    """
+    target = os.path.join(DATA_CACHE_DIR, os.path.basename(path) + extension)
+    checksum_file = target + ".sha256"
+    checksum = file_checksum(path)
+
+    if os.path.exists(target) and os.path.exists(checksum_file):
+        with open(checksum_file) as f:
+            if f.read().strip() == checksum:
+                return target
+
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    convert(path, tmp)
+    os.replace(tmp, target)
+    with open(f"{checksum_file}.{os.getpid()}.tmp", "w") as f:
+        f.write(checksum)
+    os.replace(f"{checksum_file}.{os.getpid()}.tmp", checksum_file)
+    return target
+
+
+# geopandas, pandas and pyarrow are imported on first use: a warm process never needs
+# the GeoJSON or Excel readers, and the home page needs none of them
+def _geojson_to_parquet(source, target):
+    import geopandas as gpd
+    gpd.read_file(source).to_parquet(target)
+
+
+def _excel_to_feather(source, target):
+    import pandas as pd
+    pd.read_excel(source).to_feather(target)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_communes(path, signature):
+    import geopandas as gpd
+    target = ensure_columnar(path, ".parquet", _geojson_to_parquet)
+    return gpd.read_parquet(target, memory_map=True)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_table(path, signature):
+    import pyarrow.feather as feather
+    target = ensure_columnar(path, ".feather", _excel_to_feather)
+    return feather.read_table(target, memory_map=True).to_pandas()
+
+
+def load_communes(path=GEOJSON_FILE):
+    """
+    Commune boundaries, shared by every session of the process.
+
+    The GeoJSON is converted once to GeoParquet and memory-mapped; the process-level
+    cache is keyed on the file signature, so editing the source invalidates it.
+
+    Args:
+        path (str): The communes GeoJSON file.
+
+    Returns:
+        gpd.GeoDataFrame: The communes (shared object, do not modify in place).
+    """
+    return _load_communes(path, file_signature(path))
+
+
+def load_commune_table(path=EXCEL_FILE):
+    """
+    Commune table (IDs, names, average UF and KG), shared by every session of the process.
+
+    The Excel file is converted once to Feather and memory-mapped; the process-level
+    cache is keyed on the file signature, so editing the source invalidates it.
+
+    Args:
+        path (str): The Excel file.
+
+    Returns:
+        pd.DataFrame: The commune table (shared object, do not modify in place).
+    """
+    return _load_table(path, file_signature(path))
@@ -0,0 +1,97 @@
+import ee
+import pandas as pd
+
+from utils.communes import commune_ee_geometry, get_commune_index
+from utils.ee_cache import ee_cached
+
+# Columns of the per-commune result table
+RESULT_COLUMNS = ['id_commune', 'commune', 'index_mean', 'phytomass_sum', 'area_ha', 'uf_total', 'uf_ha']
+
+
+def communes_bbox():
+    """
+    Bounding box of all the communes.
+
+    Returns:
+        list: [min_lon, min_lat, max_lon, max_lat].
+    """
+    bboxes = [commune['bbox'] for commune in get_commune_index()['by_id'].values()]
+    return [
+        min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+        max(b[2] for b in bboxes), max(b[3] for b in bboxes)
+    ]
+
+
+def communes_bounds():
+    """
+    Bounding box of all the communes, used to build a single composite for the province.
+
+    Returns:
+        ee.Geometry: The bounding rectangle.
+    """
+    return ee.Geometry.Rectangle(communes_bbox())
+
+
+def communes_feature_collection():
+    """
+    All the communes as an ee.FeatureCollection (simplified boundaries, or the
+    communes table when COMMUNES_ASSET is set).
+
+    Returns:
+        ee.FeatureCollection: One feature per commune with 'id_commune' and 'commune'.
+    """
+    return ee.FeatureCollection([
+        ee.Feature(commune_ee_geometry(commune), {'id_commune': commune['id'], 'commune': commune['name']})
+        for commune in get_commune_index()['by_id'].values()
+    ])
+
+
+@ee_cached()
+def _reduce_communes(stacked, communes, scale):
+    reducer = ee.Reducer.mean().combine(ee.Reducer.sum(), sharedInputs=True)
+    reduced = stacked.reduceRegions(
+        collection=communes,
+        reducer=reducer,
+        scale=scale,
+        tileScale=4
+    )
+    return reduced.map(lambda feature: feature.setGeometry(None)).getInfo()['features']
+
+
+def compute_all_communes(index_image, index, phytomass_image, scale=30):
+    """
+    Compute the index mean, phytomass sum, area and UF/ha of every commune in one request.
+
+    The index and phytomass images are reduced with reduceRegions over the
+    FeatureCollection of all the communes, so the composite is built once for the
+    whole province. The areas come from the local commune index.
+
+    Args:
+        index_image (ee.Image): The vegetation index image covering all the communes.
+        index (str): The name of the index band (e.g., "NDVI").
+        phytomass_image (ee.Image): The phytomass image (band 'Phytomass').
+        scale (int): The spatial resolution in meters (default is 30 to keep the
+            province-wide request within Earth Engine limits).
+
+    Returns:
+        pd.DataFrame: One row per commune with the RESULT_COLUMNS.
+    """
+    stacked = index_image.select([index], ['index']).addBands(phytomass_image.select(['Phytomass'], ['phytomass']))
+    features = _reduce_communes(stacked, communes_feature_collection(), scale)
+
+    by_id = get_commune_index()['by_id']
+    rows = []
+    for feature in features:
+        properties = feature['properties']
+        area_ha = by_id[int(properties['id_commune'])]['area_ha']
+        phytomass_sum = properties.get('phytomass_sum')
+        rows.append({
+            'id_commune': properties['id_commune'],
+            'commune': properties['commune'],
+            'index_mean': properties.get('index_mean'),
+            'phytomass_sum': phytomass_sum,
+            'area_ha': area_ha,
+            'uf_total': phytomass_sum / 10 if phytomass_sum is not None else None,
+            'uf_ha': phytomass_sum / (area_ha * 10) if phytomass_sum is not None and area_ha else None,
+        })
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
@@ -0,0 +1,216 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# On-disk store shared by every Streamlit session and surviving restarts
+CACHE_PATH = os.environ.get("EE_CACHE_PATH", os.path.join(".cache", "ee_cache.sqlite"))
+CACHE_MAX_BYTES = int(os.environ.get("EE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+DEFAULT_TTL = 24 * 60 * 60  # seconds
+
+_lock = threading.Lock()
+_connection = None
+
+
+def _connect():
+    """
+    Open (once per process) the SQLite cache database and create its tables.
+
+    Returns:
+        sqlite3.Connection: The shared connection.
+    """
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+        connection = sqlite3.connect(CACHE_PATH, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT, size INTEGER, expires_at REAL, last_access REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, hits INTEGER, misses INTEGER)"
+        )
+        connection.commit()
+        _connection = connection
+    return _connection
+
+
+def fingerprint(value):
+    """
+    Build a stable, JSON-serializable fingerprint of a function argument.
+
+    Earth Engine objects are represented by their serialized expression graph, so two
+    calls building the same computation share a key even if the objects differ.
+
+    Args:
+        value: Any argument (ee object, container or plain value).
+
+    Returns:
+        A JSON-serializable representation of the value.
+    """
+    import ee
+    if isinstance(value, ee.ComputedObject):
+        return {"ee": value.serialize()}
+    if isinstance(value, dict):
+        return {str(k): fingerprint(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [fingerprint(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def make_key(name, args, kwargs):
+    """
+    Hash a function name and its arguments into a cache key.
+
+    Args:
+        name (str): The name of the cached function.
+        args (tuple): Positional arguments.
+        kwargs (dict): Keyword arguments.
+
+    Returns:
+        str: The SHA-256 hex digest of the call.
+    """
+    payload = json.dumps([name, fingerprint(list(args)), fingerprint(kwargs)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cache_get(key):
+    """
+    Look up a key, dropping it if its TTL has expired.
+
+    Args:
+        key (str): The cache key.
+
+    Returns:
+        tuple: (found, value).
+    """
+    now = time.time()
+    with _lock:
+        connection = _connect()
+        row = connection.execute(
+            "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return False, None
+        if row[1] < now:
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            connection.commit()
+            return False, None
+        connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        connection.commit()
+    return True, json.loads(row[0])
+
+
+def cache_set(key, value, ttl=DEFAULT_TTL):
+    """
+    Store a value, then evict the least recently used entries above CACHE_MAX_BYTES.
+
+    Args:
+        key (str): The cache key.
+        value: A JSON-serializable value (e.g., the result of getInfo()).
+        ttl (int): Time to live in seconds.
+    """
+    data = json.dumps(value)
+    now = time.time()
+    with _lock:
+        connection = _connect()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data), now + ttl, now)
+        )
+        connection.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > CACHE_MAX_BYTES:
+            for old_key, size in connection.execute(
+                "SELECT key, size FROM entries ORDER BY last_access"
+            ).fetchall():
+                connection.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                total -= size
+                if total <= CACHE_MAX_BYTES * 0.9:
+                    break
+        connection.commit()
+
+
+def _record(name, hit):
+    column = "hits" if hit else "misses"
+    try:
+        with _lock:
+            connection = _connect()
+            connection.execute("INSERT OR IGNORE INTO stats (name, hits, misses) VALUES (?, 0, 0)", (name,))
+            connection.execute(f"UPDATE stats SET {column} = {column} + 1 WHERE name = ?", (name,))
+            connection.commit()
+    except sqlite3.Error as e:
+        logger.warning("Earth Engine cache statistics unavailable: %s", e)
+
+
+def cache_stats():
+    """
+    Hit/miss counters per cached function, accumulated across processes.
+
+    Returns:
+        dict: {name: {'hits': int, 'misses': int, 'hit_rate': float}}; every hit is one
+        Earth Engine request saved.
+    """
+    try:
+        with _lock:
+            rows = _connect().execute("SELECT name, hits, misses FROM stats ORDER BY name").fetchall()
+    except sqlite3.Error as e:
+        logger.warning("Earth Engine cache unavailable: %s", e)
+        return {}
+    return {
+        name: {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+        for name, hits, misses in rows
+    }
+
+
+def ee_cached(ttl=DEFAULT_TTL, name=None):
+    """
+    Memoize a function returning client-side Earth Engine results on disk.
+
+    The key hashes the function name and the serialized ee expression graph of its
+    arguments. If the store is unavailable the function is simply called.
+
+    Args:
+        ttl (int): Time to live of the results in seconds.
+        name (str, optional): Name under which results and statistics are stored
+            (default: the function name).
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(func):
+        cache_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = make_key(cache_name, args, kwargs)
+                found, value = cache_get(key)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning("Earth Engine cache lookup failed for %s: %s", cache_name, e)
+                return func(*args, **kwargs)
+
+            if found:
+                _record(cache_name, hit=True)
+                return value
+
+            _record(cache_name, hit=False)
+            value = func(*args, **kwargs)
+            try:
+                cache_set(key, value, ttl)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning("Earth Engine cache store failed for %s: %s", cache_name, e)
+            return value
+
+        return wrapper
+    return decorator
@@ -0,0 +1,148 @@
+import ee
+
+from utils.ee_cache import ee_cached
+from utils.ee_stats import STATISTICS, combined_reducer
+from utils.indices import ee_indices, index_bands
+
+S2_COLLECTION = 'COPERNICUS/S2_SR_HARMONIZED'
+
+# Scene pre-selection: scenes above this tile-level cloud cover are dropped before mapping
+DEFAULT_MAX_CLOUD = 60  # CLOUDY_PIXEL_PERCENTAGE
+
+# Cloud masks: QA60 (opaque clouds and cirrus bits) or the scene classification layer
+CLOUD_MASKS = {
+    'qa60': "QA60 (nuages)",
+    'scl': "SCL (nuages, ombres, cirrus)",
+}
+DEFAULT_CLOUD_MASK = 'qa60'
+# SCL classes removed: no data, saturated, cloud shadow, cloud medium/high probability, cirrus
+SCL_MASKED_CLASSES = [0, 1, 3, 8, 9, 10]
+
+
+def select_scenes(collection, max_cloud=DEFAULT_MAX_CLOUD, max_scenes=None):
+    """
+    Keep the clearest scenes of a Sentinel-2 collection.
+
+    Args:
+        collection (ee.ImageCollection): The filtered Sentinel-2 collection.
+        max_cloud (float, optional): The maximum CLOUDY_PIXEL_PERCENTAGE (None keeps all).
+        max_scenes (int, optional): Keep only this many scenes, clearest first (None keeps all).
+            The cloud percentage is per tile, so on communes spanning two tiles a small
+            value may favour one of them.
+
+    Returns:
+        ee.ImageCollection: The selected scenes.
+    """
+    if max_cloud is not None:
+        collection = collection.filter(ee.Filter.lte('CLOUDY_PIXEL_PERCENTAGE', max_cloud))
+    if max_scenes:
+        collection = collection.sort('CLOUDY_PIXEL_PERCENTAGE').limit(max_scenes)
+    return collection
+
+
+def cloud_mask_image(image, cloud_mask):
+    """
+    Mask the cloudy pixels of a Sentinel-2 image.
+
+    Args:
+        image (ee.Image): The image, with the 'QA60' or 'SCL' band.
+        cloud_mask (str): 'qa60' or 'scl' (see CLOUD_MASKS).
+
+    Returns:
+        ee.Image: The masked image.
+    """
+    if cloud_mask == 'qa60':
+        return image.updateMask(image.select('QA60').lt(1))
+    if cloud_mask == 'scl':
+        scl = image.select('SCL')
+        return image.updateMask(scl.remap(SCL_MASKED_CLASSES, [0] * len(SCL_MASKED_CLASSES), 1))
+    raise ValueError(f"Unsupported cloud mask: {cloud_mask}")
+
+
+def index_collection(region, start_date, end_date, indices, mask_clouds=True, bounds=None,
+                     cloud_mask=DEFAULT_CLOUD_MASK, max_cloud=DEFAULT_MAX_CLOUD, max_scenes=None):
+    """
+    Sentinel-2 collection with every requested index as a band of each image.
+
+    The collection is filtered once (date, bounds, cloud cover, clearest scenes), only
+    the bands of the indices and of the cloud mask are kept, and each image is mapped
+    once, whatever the number of indices.
+
+    Args:
+        region (ee.Geometry): The region of interest.
+        start_date (str): The start date in 'YYYY-MM-DD' format (inclusive).
+        end_date (str): The end date in 'YYYY-MM-DD' format (exclusive).
+        indices (list): The names of the indices (e.g., ['NDVI', 'SAVI']).
+        mask_clouds (bool): Whether to apply cloud masking (default: True).
+        bounds (ee.Geometry, optional): A lighter geometry (e.g., the bounding box) used to
+            select the scenes instead of the region itself.
+        cloud_mask (str): The cloud mask, 'qa60' or 'scl' (see CLOUD_MASKS).
+        max_cloud (float, optional): The maximum CLOUDY_PIXEL_PERCENTAGE of a scene.
+        max_scenes (int, optional): The maximum number of scenes, clearest first.
+
+    Returns:
+        ee.ImageCollection: One band per index, named after it.
+    """
+    collection = select_scenes(
+        ee.ImageCollection(S2_COLLECTION)
+        .filterBounds(bounds if bounds is not None else region)
+        .filterDate(start_date, end_date),
+        max_cloud=max_cloud,
+        max_scenes=max_scenes
+    )
+    mask_bands = {'qa60': ['QA60'], 'scl': ['SCL']}.get(cloud_mask, []) if mask_clouds else []
+    collection = collection.select(index_bands(indices) + mask_bands)
+
+    def add_indices(image):
+        if mask_clouds:
+            image = cloud_mask_image(image, cloud_mask)
+        return ee.Image(ee_indices(image, indices).copyProperties(image, ['system:time_start']))
+
+    return collection.map(add_indices)
+
+
+def index_composite(region, start_date, end_date, indices, mask_clouds=True, bounds=None, **scene_options):
+    """
+    Median composite of several indices, clipped to the region.
+
+    Args:
+        region (ee.Geometry): The region of interest.
+        start_date (str): The start date in 'YYYY-MM-DD' format (inclusive).
+        end_date (str): The end date in 'YYYY-MM-DD' format (exclusive).
+        indices (list): The names of the indices.
+        mask_clouds (bool): Whether to apply QA60 cloud masking (default: True).
+        bounds (ee.Geometry, optional): A lighter geometry used to select the scenes.
+        **scene_options: cloud_mask, max_cloud and max_scenes (see index_collection).
+
+    Returns:
+        ee.Image: One band per index (the median of each index over the period).
+    """
+    collection = index_collection(region, start_date, end_date, indices, mask_clouds, bounds, **scene_options)
+    return collection.median().clip(region)
+
+
+@ee_cached()
+def composite_statistics(composite, region, scale=10):
+    """
+    Statistics of every band of a composite with one multi-band reduceRegion.
+
+    Args:
+        composite (ee.Image): The composite (e.g., from index_composite).
+        region (ee.Geometry): The region over which the statistics are calculated.
+        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
+
+    Returns:
+        dict: {band: {statistic: value}} for each name of STATISTICS.
+    """
+    bundle = ee.Dictionary({
+        'bands': composite.bandNames(),
+        'stats': composite.reduceRegion(
+            reducer=combined_reducer(),
+            geometry=region,
+            scale=scale,
+            maxPixels=1e9
+        ),
+    }).getInfo()
+
+    stats = bundle['stats']
+    return {band: {stat: stats.get(f'{band}_{stat}') for stat in STATISTICS} for band in bundle['bands']}
@@ -0,0 +1,161 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+logger = logging.getLogger(__name__)
+
+# Bounded pool shared by every session of the process
+MAX_WORKERS = int(os.environ.get("EE_MAX_WORKERS", 8))
+DEFAULT_DEADLINE = 120  # seconds, per call (retries included)
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_MAX = 30.0  # seconds
+
+# Quota (429) and transient server errors are retried; anything else (bad
+# arguments, "Computation timed out", ...) fails immediately
+RETRYABLE_ERROR = re.compile(
+    r"\b(429|500|502|503|504)\b|too many (requests|concurrent)|quota exceeded|rate limit|"
+    r"service unavailable|backend error|internal error|connection (reset|aborted)",
+    re.IGNORECASE
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # HTTP requests time out too, so a hung getInfo() cannot hold a worker forever
+            import ee
+            ee.data.setDeadline(DEFAULT_DEADLINE * 1000)
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ee")
+    return _executor
+
+
+def is_retryable(error):
+    """
+    Whether an Earth Engine error is worth retrying (quota or transient server error).
+
+    Args:
+        error (Exception): The error raised by the call.
+
+    Returns:
+        bool: True for 429/quota errors, 5xx errors and dropped connections.
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return bool(RETRYABLE_ERROR.search(str(error)))
+
+
+def call_with_retry(func, *args, retries=DEFAULT_RETRIES, deadline=DEFAULT_DEADLINE, **kwargs):
+    """
+    Call func, retrying retryable errors with jittered exponential backoff.
+
+    Args:
+        func (callable): The blocking Earth Engine call (e.g., image.getInfo).
+        *args: Positional arguments of func.
+        retries (int): The maximum number of retries.
+        deadline (float): No retry is attempted past this many seconds.
+        **kwargs: Keyword arguments of func.
+
+    Returns:
+        The result of func.
+    """
+    stop = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            # Full jitter: sleep a random time up to the exponential backoff
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            if time.monotonic() + delay >= stop:
+                raise
+            attempt += 1
+            logger.warning("Earth Engine call failed (%s), retry %d/%d in %.1fs", e, attempt, retries, delay)
+            time.sleep(delay)
+
+
+def submit(func, *args, retries=DEFAULT_RETRIES, deadline=DEFAULT_DEADLINE, **kwargs):
+    """
+    Run a blocking Earth Engine call on the shared pool.
+
+    The Streamlit script context of the caller is attached to the worker thread, so
+    st.cache_* functions and session state keep working inside the call.
+
+    Args:
+        func (callable): The blocking call.
+        *args: Positional arguments of func.
+        retries (int): The maximum number of retries.
+        deadline (float): The deadline of the call in seconds.
+        **kwargs: Keyword arguments of func.
+
+    Returns:
+        concurrent.futures.Future: The future of the result.
+    """
+    ctx = get_script_run_ctx()
+
+    def task():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return call_with_retry(func, *args, retries=retries, deadline=deadline, **kwargs)
+
+    return _get_executor().submit(task)
+
+
+def run(func, *args, retries=DEFAULT_RETRIES, deadline=DEFAULT_DEADLINE, **kwargs):
+    """
+    Run a blocking Earth Engine call with retries and a deadline.
+
+    Args:
+        func (callable): The blocking call.
+        *args: Positional arguments of func.
+        retries (int): The maximum number of retries.
+        deadline (float): The deadline of the call in seconds.
+        **kwargs: Keyword arguments of func.
+
+    Returns:
+        The result of func; raises TimeoutError if the deadline is exceeded.
+    """
+    future = submit(func, *args, retries=retries, deadline=deadline, **kwargs)
+    try:
+        return future.result(timeout=deadline)
+    except TimeoutError:
+        future.cancel()
+        raise TimeoutError(f"Earth Engine request exceeded its {deadline:.0f} s deadline.")
+
+
+def gather(calls, retries=DEFAULT_RETRIES, deadline=DEFAULT_DEADLINE):
+    """
+    Run independent Earth Engine calls concurrently.
+
+    Args:
+        calls (dict): {name: zero-argument callable} (e.g., functools.partial objects).
+        retries (int): The maximum number of retries of each call.
+        deadline (float): The deadline shared by all the calls, in seconds.
+
+    Returns:
+        dict: {name: result}; the first error (or TimeoutError) is raised.
+    """
+    stop = time.monotonic() + deadline
+    futures = {name: submit(call, retries=retries, deadline=deadline) for name, call in calls.items()}
+    results = {}
+    try:
+        for name, future in futures.items():
+            results[name] = future.result(timeout=max(0, stop - time.monotonic()))
+    except TimeoutError:
+        raise TimeoutError(f"Earth Engine requests exceeded their {deadline:.0f} s deadline.")
+    finally:
+        for future in futures.values():
+            future.cancel()
+    return results
@@ -0,0 +1,220 @@
+"""
+GeoTIFF export of Earth Engine images, tile by tile.
+
+A single getDownloadURL over a large commune exceeds the Earth Engine request-size
+limit, so the commune is split into a grid of tiles on a UTM grid aligned on the
+export scale. The tiles are downloaded concurrently (with retries) on the shared Earth
+Engine pool and each one is written into its window of the output as soon as it
+arrives, so memory holds a few tiles rather than the whole raster. The result is copied
+to a compressed Cloud Optimized GeoTIFF with overviews. Exports are cached on disk by
+image graph and options, for EXPORT_TTL like the other Earth Engine results.
+"""
+import math
+import os
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import as_completed
+
+from utils.ee_cache import DEFAULT_TTL, make_key
+from utils.ee_executor import submit
+
+EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(".cache", "exports"))
+EXPORT_MAX_BYTES = int(os.environ.get("EXPORT_MAX_BYTES", 1024 * 1024 * 1024))
+TILE_SIZE = 1024  # pixels per tile side (4 MB of float32, well below the request limit)
+EXPORT_DEADLINE = 600  # seconds, for all the tiles of an export
+EXPORT_TTL = DEFAULT_TTL  # seconds: recent dates may get new scenes
+FLOAT_NODATA = -9999.0
+INT16_NODATA = -32768
+INT16_MAX = 32767
+
+
+def utm_crs(lon, lat):
+    """
+    EPSG code of the UTM zone containing a point.
+
+    Returns:
+        str: E.g. 'EPSG:32630'.
+    """
+    zone = min(int((lon + 180) // 6) + 1, 60)
+    return f"EPSG:{32600 + zone if lat >= 0 else 32700 + zone}"
+
+
+def tile_grid(geojson, scale, crs, tile_size=TILE_SIZE):
+    """
+    Tiles of the export grid that intersect a region.
+
+    The grid is aligned on multiples of the scale in the target CRS, so the same region
+    always yields the same tiles.
+
+    Args:
+        geojson (dict): The region (GeoJSON geometry, EPSG:4326).
+        scale (float): The pixel size in meters.
+        crs (str): The projected CRS of the export.
+        tile_size (int): The tile side in pixels.
+
+    Returns:
+        tuple: (grid, tiles) where grid is {'x0', 'y0', 'width', 'height'} (upper-left
+        corner and size in pixels) and tiles a list of (col_off, row_off, width, height).
+    """
+    from pyproj import Transformer
+    from shapely.geometry import box, shape
+    from shapely.ops import transform
+
+    to_crs = Transformer.from_crs("EPSG:4326", crs, always_xy=True).transform
+    region = transform(to_crs, shape(geojson))
+    min_x, min_y, max_x, max_y = region.bounds
+    x0 = math.floor(min_x / scale) * scale
+    y0 = math.ceil(max_y / scale) * scale
+    width = math.ceil((max_x - x0) / scale)
+    height = math.ceil((y0 - min_y) / scale)
+
+    tiles = []
+    for row_off in range(0, height, tile_size):
+        for col_off in range(0, width, tile_size):
+            w, h = min(tile_size, width - col_off), min(tile_size, height - row_off)
+            left, top = x0 + col_off * scale, y0 - row_off * scale
+            if region.intersects(box(left, top - h * scale, left + w * scale, top)):
+                tiles.append((col_off, row_off, w, h))
+    return {'x0': x0, 'y0': y0, 'width': width, 'height': height}, tiles
+
+
+def fit_int16_scale(preferred, value_range):
+    """
+    Scale of the int16 encoding of a band, reduced until its whole range fits.
+
+    Indices computed on raw Sentinel-2 values (e.g., DVI) and large phytomass values do not
+    fit in int16 at the scale giving the usual precision, so the scale is divided by ten
+    until round(value * scale) stays within ±INT16_MAX over the range.
+
+    Args:
+        preferred (float): The scale giving the wanted precision (e.g., 10000 for an index in [-1, 1]).
+        value_range (tuple): (min, max) of the band over the region.
+
+    Returns:
+        float: The scale.
+    """
+    if value_range is None or any(value is None or not math.isfinite(value) for value in value_range):
+        raise ValueError("L'encodage int16 nécessite la plage des valeurs de la carte.")
+    bound = max(abs(value) for value in value_range)
+    scale = preferred
+    while bound * scale > INT16_MAX:
+        scale /= 10
+    return scale
+
+
+def _download_tile(image, crs, scale, left, top, width, height):
+    url = image.getDownloadURL({
+        'crs': crs,
+        'crsTransform': [scale, 0, left, 0, -scale, top],
+        'dimensions': f"{width}x{height}",
+        'format': 'GEO_TIFF',
+    })
+    with urllib.request.urlopen(url, timeout=EXPORT_DEADLINE) as response:
+        return response.read()
+
+
+def export_geotiff(image, geojson, scale=10, int16_scale=None, name='export', value_range=None):
+    """
+    Export a single-band image over a region as a Cloud Optimized GeoTIFF.
+
+    Args:
+        image (ee.Image): The image to export (masked outside the region).
+        geojson (dict): The region (GeoJSON geometry, EPSG:4326).
+        scale (float): The pixel size in meters.
+        int16_scale (float, optional): Store round(value * int16_scale) as int16 instead of
+            float32 (the file records the inverse scale, so GDAL/QGIS read the values back).
+            The scale is reduced when value_range would not fit (see fit_int16_scale).
+        name (str): The band description.
+        value_range (tuple, optional): (min, max) of the image over the region, required
+            with int16_scale.
+
+    Returns:
+        str: The path of the cached COG.
+    """
+    if int16_scale:
+        int16_scale = fit_int16_scale(int16_scale, value_range)
+    key = make_key('export_geotiff', [image, geojson], {'scale': scale, 'int16_scale': int16_scale})
+    path = os.path.join(EXPORT_DIR, f"{key}.tif")
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < EXPORT_TTL:
+        # The modification time is the export time; the access time orders the eviction
+        os.utime(path, (time.time(), os.path.getmtime(path)))
+        return path
+
+    import rasterio
+    from rasterio.io import MemoryFile
+    from rasterio.shutil import copy as copy_dataset
+    from rasterio.transform import Affine
+    from rasterio.windows import Window
+    from shapely.geometry import shape
+
+    centroid = shape(geojson).centroid
+    crs = utm_crs(centroid.x, centroid.y)
+    grid, tiles = tile_grid(geojson, scale, crs)
+
+    if int16_scale:
+        image = image.multiply(int16_scale).round().clamp(-INT16_MAX, INT16_MAX).toInt16().unmask(INT16_NODATA)
+        dtype, nodata = 'int16', INT16_NODATA
+    else:
+        image = image.toFloat().unmask(FLOAT_NODATA)
+        dtype, nodata = 'float32', FLOAT_NODATA
+
+    profile = {
+        'driver': 'GTiff', 'dtype': dtype, 'nodata': nodata, 'count': 1,
+        'width': grid['width'], 'height': grid['height'], 'crs': crs,
+        'transform': Affine(scale, 0, grid['x0'], 0, -scale, grid['y0']),
+        'tiled': True, 'blockxsize': 512, 'blockysize': 512,
+    }
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=EXPORT_DIR) as tmp_dir:
+        tmp = os.path.join(tmp_dir, "mosaic.tif")
+        # Blocks without any tile are written with the nodata value when the file is closed
+        with rasterio.open(tmp, 'w', **profile) as dst:
+            dst.set_band_description(1, name)
+            if int16_scale:
+                dst.scales = (1 / int16_scale,)
+            futures = {
+                submit(_download_tile, image, crs, scale, grid['x0'] + tile[0] * scale, grid['y0'] - tile[1] * scale,
+                       tile[2], tile[3], deadline=EXPORT_DEADLINE): tile
+                for tile in tiles
+            }
+            try:
+                for future in as_completed(futures, timeout=EXPORT_DEADLINE):
+                    col_off, row_off, width, height = futures.pop(future)
+                    with MemoryFile(future.result()) as memfile, memfile.open() as src:
+                        dst.write(src.read(1)[:height, :width], 1, window=Window(col_off, row_off, width, height))
+            except TimeoutError:
+                raise TimeoutError(f"The export tiles exceeded their {EXPORT_DEADLINE:.0f} s deadline.")
+            finally:
+                for future in futures:
+                    future.cancel()
+        cog = os.path.join(tmp_dir, "cog.tif")
+        copy_dataset(
+            tmp, cog, driver='COG', compress='DEFLATE',
+            predictor='2' if int16_scale else '3', overviews='AUTO', blocksize=512
+        )
+        # Moved into place in one step, so concurrent sessions never read a partial file
+        os.replace(cog, path)
+    _evict(keep=path)
+    return path
+
+
+def _evict(keep):
+    """Delete the expired exports, then the least recently used ones above EXPORT_MAX_BYTES."""
+    now = time.time()
+    files = []
+    for f in os.listdir(EXPORT_DIR):
+        f = os.path.join(EXPORT_DIR, f)
+        if not f.endswith(".tif") or f == keep:
+            continue
+        if now - os.path.getmtime(f) >= EXPORT_TTL:
+            os.remove(f)
+        else:
+            files.append(f)
+    files.sort(key=os.path.getatime)
+    total = os.path.getsize(keep) + sum(os.path.getsize(f) for f in files)
+    for f in files:
+        if total <= EXPORT_MAX_BYTES:
+            break
+        total -= os.path.getsize(f)
+        os.remove(f)
@@ -0,0 +1,84 @@
+import ee
+
+from utils.ee_cache import ee_cached
+from utils.phytomass import ee_phytomass_all, formula_band
+
+# Statistics computed for every band by the combined reducer
+STATISTICS = ['mean', 'sum', 'min', 'max', 'count']
+
+
+def combined_reducer():
+    """
+    Build a single reducer returning the mean, sum, min, max and valid-pixel count.
+
+    Returns:
+        ee.Reducer: The combined reducer (outputs are named '<band>_<statistic>').
+    """
+    return (
+        ee.Reducer.mean()
+        .combine(ee.Reducer.sum(), sharedInputs=True)
+        .combine(ee.Reducer.minMax(), sharedInputs=True)
+        .combine(ee.Reducer.count(), sharedInputs=True)
+    )
+
+
+@ee_cached()
+def compute_statistics(index_image, index, phytomass_image, region, scale=10):
+    """
+    Compute the index and phytomass statistics of the phytomasse page in a single Earth Engine request.
+
+    The index and phytomass bands are stacked and reduced together, so the whole bundle
+    costs one getInfo() instead of one per value. The area and centroid of a commune come
+    from the local commune index (see utils.communes.geometry_metrics).
+
+    Args:
+        index_image (ee.Image): The vegetation index image.
+        index (str): The name of the index band (e.g., "NDVI").
+        phytomass_image (ee.Image): The phytomass image (band 'Phytomass').
+        region (ee.Geometry): The region over which the statistics are calculated.
+        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
+
+    Returns:
+        dict: {'index': {...}, 'phytomass': {...}}, each mapping the names of STATISTICS
+        to their values.
+    """
+    stacked = index_image.select([index]).addBands(phytomass_image.select(['Phytomass']))
+
+    stats = stacked.reduceRegion(
+        reducer=combined_reducer(),
+        geometry=region,
+        scale=scale,
+        maxPixels=1e9
+    ).getInfo()
+
+    return {
+        'index': {stat: stats.get(f'{index}_{stat}') for stat in STATISTICS},
+        'phytomass': {stat: stats.get(f'Phytomass_{stat}') for stat in STATISTICS},
+    }
+
+
+@ee_cached()
+def compute_formula_totals(index_image, formulas, region, scale=10):
+    """
+    Total phytomass of several formulas in a single Earth Engine request.
+
+    Every formula is a band of one image (see ee_phytomass_all); the area of the commune
+    comes from the local commune index.
+
+    Args:
+        index_image (ee.Image): An image with the index bands of the formulas.
+        formulas (list): The names of the formulas.
+        region (ee.Geometry): The region over which the totals are calculated.
+        scale (int): The spatial resolution in meters (default is 10 for Sentinel-2).
+
+    Returns:
+        dict: {formula: phytomass sum}.
+    """
+    sums = ee_phytomass_all(index_image, formulas).reduceRegion(
+        reducer=ee.Reducer.sum(),
+        geometry=region,
+        scale=scale,
+        maxPixels=1e9
+    ).getInfo()
+
+    return {formula: sums.get(formula_band(formula)) for formula in formulas}
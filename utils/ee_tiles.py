@@ -0,0 +1,88 @@
+from functools import partial
+
+from utils.ee_cache import ee_cached, make_key
+from utils.ee_executor import gather
+from utils.tile_proxy import get_tile_proxy
+
+# Earth Engine map IDs stay valid for a few hours: cached tile URLs expire well before
+MAP_ID_TTL = 60 * 60  # seconds
+
+
+@ee_cached(ttl=MAP_ID_TTL)
+def get_tile_url(image, vis_params):
+    """
+    XYZ tile URL of an Earth Engine image, cached by image graph and vis params.
+
+    Args:
+        image (ee.Image): The image to display.
+        vis_params (dict): The visualization parameters (min, max, palette, ...).
+
+    Returns:
+        str: The tile URL template ('.../{z}/{x}/{y}').
+    """
+    return image.getMapId(vis_params)['tile_fetcher'].url_format
+
+
+def ee_layer(image, vis_params, name):
+    """
+    Definition of an Earth Engine map layer, kept in session state instead of the
+    folium layer, so its tile URL is looked up (and refreshed once expired) at each render.
+
+    Args:
+        image (ee.Image): The image to display.
+        vis_params (dict): The visualization parameters.
+        name (str): The name of the layer in the layer control.
+
+    Returns:
+        dict: The layer definition.
+    """
+    return {'image': image, 'vis_params': vis_params, 'name': name}
+
+
+def tile_layer(url, name):
+    """
+    Build a folium tile layer from an XYZ tile URL.
+
+    Args:
+        url (str): The tile URL template.
+        name (str): The name of the layer in the layer control.
+
+    Returns:
+        folium.raster_layers.TileLayer: The tile layer.
+    """
+    import folium
+    return folium.raster_layers.TileLayer(
+        tiles=url,
+        attr='Google Earth Engine',
+        name=name,
+        overlay=True,
+        control=True
+    )
+
+
+def resolve_layers(layers):
+    """
+    Turn session map layers into folium layers.
+
+    Earth Engine layer definitions (see ee_layer) get their tile URL from the cache;
+    the URLs missing or expired are requested concurrently. When the local tile proxy
+    is enabled, the layers point at it instead of Earth Engine. Other layers are
+    returned as is.
+
+    Args:
+        layers (list): Folium layers and Earth Engine layer definitions.
+
+    Returns:
+        list: Folium layers, in the same order.
+    """
+    urls = gather({
+        i: partial(get_tile_url, layer['image'], layer['vis_params'])
+        for i, layer in enumerate(layers) if isinstance(layer, dict)
+    })
+    proxy = get_tile_proxy()
+    if proxy is not None:
+        for i, url in urls.items():
+            # Stable key: tiles stay cached when an expired map ID is replaced
+            layer = layers[i]
+            urls[i] = proxy.register(make_key('tile_layer', [layer['image']], {'vis_params': layer['vis_params']}), url)
+    return [tile_layer(urls[i], layer['name']) if i in urls else layer for i, layer in enumerate(layers)]
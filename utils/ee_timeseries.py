@@ -0,0 +1,104 @@
+import datetime
+import ee
+import pandas as pd
+
+CHIRPS_COLLECTION = 'UCSB-CHG/CHIRPS/DAILY'
+MODIS_COLLECTION = 'MODIS/006/MOD13Q1'
+
+
+def month_labels(start_date, end_date):
+    """
+    List the months covered by [start_date, end_date), as 'YYYY-MM' labels.
+
+    Args:
+        start_date (datetime.date): The start date (inclusive).
+        end_date (datetime.date): The end date (exclusive).
+
+    Returns:
+        list: One label per month, the first one being the month of start_date.
+    """
+    labels = []
+    current_date = start_date
+    while current_date < end_date:
+        labels.append(current_date.strftime("%Y-%m"))
+        current_date = (current_date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return labels
+
+
+def get_monthly_series(geometry, start_date, end_date, index, bounds=None):
+    """
+    Retrieve monthly precipitation and mean vegetation index in a single Earth Engine request.
+
+    The month sequence is built on the server with ee.List.sequence and the CHIRPS sum
+    and MODIS mean are mapped over it, so the whole table comes back in one getInfo().
+    Months are cut exactly as in the page's month-by-month loop: the first window
+    starts at start_date and the last one is clipped at end_date.
+
+    Args:
+        geometry (ee.Geometry): The commune geometry.
+        start_date (datetime.date): The start date.
+        end_date (datetime.date): The end date.
+        index (str): The MODIS band to average (e.g., "NDVI", "EVI").
+        bounds (ee.Geometry, optional): A lighter geometry (e.g., the bounding box) used to
+            select the images instead of the commune geometry.
+
+    Returns:
+        tuple: (precipitation DataFrame, vegetation index DataFrame); months without
+        images are kept as NaN.
+    """
+    labels = month_labels(start_date, end_date)
+    if not labels:
+        return (
+            pd.DataFrame(columns=['Month', 'Precipitation (mm)']),
+            pd.DataFrame(columns=['Month', f'Mean {index}'])
+        )
+
+    start = ee.Date(start_date.strftime("%Y-%m-%d"))
+    end = ee.Date(end_date.strftime("%Y-%m-%d"))
+    first_month = ee.Date.fromYMD(start_date.year, start_date.month, 1)
+
+    bounds = bounds if bounds is not None else geometry
+    chirps = ee.ImageCollection(CHIRPS_COLLECTION).filterBounds(bounds).select('precipitation')
+    modis = ee.ImageCollection(MODIS_COLLECTION).filterBounds(bounds).select(index)
+
+    def monthly_values(i):
+        month = first_month.advance(i, 'month')
+        month_start = ee.Date(ee.Number(month.millis()).max(start.millis()))
+        month_end = ee.Date(ee.Number(month.advance(1, 'month').millis()).min(end.millis()))
+
+        month_chirps = chirps.filterDate(month_start, month_end)
+        precipitation = ee.Algorithms.If(
+            month_chirps.size().gt(0),
+            month_chirps.sum().reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=geometry,
+                scale=5000,
+                maxPixels=1e9
+            ).get('precipitation'),
+            None
+        )
+
+        month_modis = modis.filterDate(month_start, month_end)
+        mean_index = ee.Algorithms.If(
+            month_modis.size().gt(0),
+            month_modis.mean().reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=geometry,
+                scale=500,
+                maxPixels=1e9
+            ).get(index),
+            None
+        )
+        return ee.List([precipitation, mean_index])
+
+    values = ee.List.sequence(0, len(labels) - 1).map(monthly_values).getInfo()
+
+    precipitation_df = pd.DataFrame({
+        'Month': labels,
+        'Precipitation (mm)': [p if p is not None else float('nan') for p, _ in values]
+    })
+    index_df = pd.DataFrame({
+        'Month': labels,
+        f'Mean {index}': [v / 10000 if v is not None else float('nan') for _, v in values]
+    })
+    return precipitation_df, index_df
@@ -0,0 +1,142 @@
+"""
+Custom phytomass formulas: validated against an AST whitelist, compiled once and
+previewed with NumPy before anything is sent to Earth Engine.
+
+A formula may only use numbers, the selected index, + - * / % ** (with a small constant
+exponent), parentheses and the functions of FUNCTIONS, which are valid both for
+ee.Image.expression and for NumPy.
+"""
+import ast
+import functools
+
+import numpy as np
+import pandas as pd
+
+from utils.indices import index_vis_params
+
+MAX_LENGTH = 500
+MAX_EXPONENT = 10  # ** only accepts constant exponents up to this absolute value
+PREVIEW_POINTS = 201
+
+# Functions shared by the Earth Engine expression language and NumPy
+FUNCTIONS = {
+    'sqrt': np.sqrt,
+    'exp': np.exp,
+    'log': np.log,
+    'abs': np.abs,
+}
+
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow, ast.UAdd, ast.USub)
+
+
+def _check(node, variables):
+    if isinstance(node, ast.Expression):
+        _check(node.body, variables)
+    elif isinstance(node, ast.BinOp):
+        if isinstance(node.op, ast.BitXor):
+            raise ValueError("Utilisez ** pour les puissances (^ n'est pas accepté).")
+        if not isinstance(node.op, _OPERATORS):
+            raise ValueError(f"Opérateur non autorisé : {type(node.op).__name__}.")
+        if isinstance(node.op, ast.Pow):
+            try:
+                exponent = ast.literal_eval(node.right)
+            except ValueError:
+                exponent = None
+            if not isinstance(exponent, (int, float)) or abs(exponent) > MAX_EXPONENT:
+                raise ValueError(f"L'exposant de ** doit être un nombre entre -{MAX_EXPONENT} et {MAX_EXPONENT}.")
+        _check(node.left, variables)
+        _check(node.right, variables)
+    elif isinstance(node, ast.UnaryOp):
+        if not isinstance(node.op, _OPERATORS):
+            raise ValueError(f"Opérateur non autorisé : {type(node.op).__name__}.")
+        _check(node.operand, variables)
+    elif isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"Constante non autorisée : {node.value!r}.")
+    elif isinstance(node, ast.Name):
+        if node.id not in variables:
+            raise ValueError(f"Variable inconnue : {node.id} (variables disponibles : {', '.join(variables)}).")
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ValueError(f"Fonction non autorisée (fonctions disponibles : {', '.join(FUNCTIONS)}).")
+        if node.keywords or len(node.args) != 1:
+            raise ValueError(f"La fonction {node.func.id} prend un seul argument.")
+        _check(node.args[0], variables)
+    else:
+        raise ValueError(f"Élément non autorisé dans la formule : {type(node).__name__}.")
+
+
+class _FloatConstants(ast.NodeTransformer):
+    """Turn integer constants into floats, so constant powers never become huge exact integers."""
+
+    def visit_Constant(self, node):
+        return ast.copy_location(ast.Constant(float(node.value)), node)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_formula(formula, variables):
+    """
+    Validate and compile a custom formula.
+
+    Compiled formulas are cached, so re-running the page with the same formula is free.
+
+    Args:
+        formula (str): The formula (e.g., "35 + 100 * NDVI - 50 * (NDVI ** 2)").
+        variables (tuple): The names the formula may use (e.g., ('NDVI',)).
+
+    Returns:
+        dict: {'expression': the normalized formula for ee.Image.expression,
+        'variables': the variables used, 'evaluate': evaluate(**arrays) with NumPy}.
+        Raises ValueError with a readable message when the formula is invalid.
+    """
+    formula = formula.strip()
+    if not formula:
+        raise ValueError("La formule est vide.")
+    if len(formula) > MAX_LENGTH:
+        raise ValueError(f"La formule dépasse {MAX_LENGTH} caractères.")
+
+    try:
+        tree = ast.parse(formula, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Erreur de syntaxe dans la formule : {e.msg}.")
+    _check(tree, variables)
+    tree = ast.fix_missing_locations(_FloatConstants().visit(tree))
+
+    used = sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)} - set(FUNCTIONS))
+    code = compile(tree, '<formula>', 'eval')
+
+    def evaluate(**arrays):
+        with np.errstate(all='ignore'):
+            try:
+                return eval(code, {'__builtins__': {}, **FUNCTIONS}, arrays)
+            except ArithmeticError as e:
+                raise ValueError(f"La formule ne peut pas être évaluée : {e}.")
+
+    return {'expression': ast.unparse(tree), 'variables': used, 'evaluate': evaluate}
+
+
+def preview_formula(formula, index, points=PREVIEW_POINTS):
+    """
+    Response curve of a formula over the display range of its index.
+
+    Args:
+        formula (str): The formula, using the index name as variable.
+        index (str): The name of the index (e.g., "NDVI").
+        points (int): The number of sampled index values.
+
+    Returns:
+        tuple: (pd.DataFrame with the index values and 'Phytomasse', dict with the
+        'min', 'max' and 'invalid' count of the phytomass values).
+    """
+    compiled = compile_formula(formula, (index,))
+    vis = index_vis_params(index)
+    x = np.linspace(vis['min'], vis['max'], points)
+    y = np.broadcast_to(np.asarray(compiled['evaluate'](**{index: x}), dtype='float64'), x.shape)
+
+    valid = np.isfinite(y)
+    summary = {
+        'min': float(y[valid].min()) if valid.any() else None,
+        'max': float(y[valid].max()) if valid.any() else None,
+        'invalid': int((~valid).sum()),
+    }
+    return pd.DataFrame({index: x, 'Phytomasse': np.where(valid, y, np.nan)}), summary
@@ -0,0 +1,241 @@
+"""
+Registry of the vegetation indices, compiled both to Earth Engine and to NumPy.
+
+Each index is declared once (bands, formula, constants, display range) and used by
+every page, on ee.Image objects and on local band arrays.
+"""
+import functools
+
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:  # NumPy fallback
+    numexpr = None
+
+# Formulas use the Sentinel-2 band names and the constants of their definition;
+# only arithmetic, ** and sqrt() are allowed, so they are valid for both
+# ee.Image.expression and numexpr. Normalized differences use the dedicated
+# Earth Engine algorithm.
+INDICES = {
+    'NDVI': {
+        'bands': ['B8', 'B4'],
+        'normalized_difference': ['B8', 'B4'],
+        'formula': '(B8 - B4) / (B8 + B4)',
+        'constants': {},
+        'vis': {"min": -1.0, "max": 1.0, "palette": ["blue", "green", "yellow", "red"]},
+    },
+    'RVI': {
+        'bands': ['B4', 'B8'],
+        'formula': 'B4 / B8',
+        'constants': {},
+        'vis': {"min": 0, "max": 10, "palette": ["white", "blue", "green"]},
+    },
+    'DVI': {
+        'bands': ['B8', 'B4'],
+        'formula': 'B8 - B4',
+        'constants': {},
+        'vis': {"min": 0, "max": 1.0, "palette": ["purple", "green", "yellow"]},
+    },
+    'SAVI': {
+        'bands': ['B8', 'B4'],
+        'formula': '((B8 - B4) / (B8 + B4 + L)) * (1 + L)',
+        'constants': {'L': 0.5},
+        'vis': {"min": -1.0, "max": 1.0, "palette": ["blue", "green", "yellow", "red"]},
+    },
+    'EVI': {
+        'bands': ['B8', 'B4', 'B2'],
+        'formula': '2.5 * ((B8 - B4) / (B8 + 6 * B4 - 7.5 * B2 + 1))',
+        'constants': {},
+        'vis': {"min": -1.0, "max": 2.0, "palette": ["blue", "green", "yellow", "red"]},
+    },
+    'GNDVI': {
+        'bands': ['B8', 'B3'],
+        'normalized_difference': ['B8', 'B3'],
+        'formula': '(B8 - B3) / (B8 + B3)',
+        'constants': {},
+        'vis': {"min": -1.0, "max": 1.0, "palette": ["blue", "green", "yellow"]},
+    },
+    'IPVI': {
+        'bands': ['B8', 'B4'],
+        'formula': 'B8 / (B8 + B4)',
+        'constants': {},
+        'vis': {"min": 0, "max": 1.0, "palette": ["green", "yellow", "red"]},
+    },
+    'NDWI': {
+        'bands': ['B3', 'B8'],
+        'normalized_difference': ['B3', 'B8'],
+        'formula': '(B3 - B8) / (B3 + B8)',
+        'constants': {},
+        'vis': {"min": -1.0, "max": 1.0, "palette": ["cyan", "blue", "green"]},
+    },
+    'MSAVI': {
+        'bands': ['B8', 'B4'],
+        'formula': '(2 * B8 + 1 - sqrt((2 * B8 + 1) ** 2 - 8 * (B8 - B4))) / 2',
+        'constants': {},
+        'vis': {"min": -1.0, "max": 1.0, "palette": ["blue", "green", "yellow"]},
+    },
+    'TSAVI': {
+        'bands': ['B8', 'B4'],
+        'formula': 'a * (B8 - a * B4 - b) / (B8 + B4 - a * b + 0.08 * (1 + a ** 2))',
+        'constants': {'a': 1.339198, 'b': 0.006262},  # Soil line slope and intercept for 2020
+        'vis': {"min": 0, "max": 1.0, "palette": ["yellow", "orange", "red"]},
+    },
+    'ARVI': {
+        'bands': ['B8', 'B4', 'B2'],
+        'formula': '(B8 - (2 * B4 - B2)) / (B8 + (2 * B4 - B2))',
+        'constants': {},
+        'vis': {"min": -1.0, "max": 1.0, "palette": ["blue", "green", "yellow", "red"]},
+    },
+}
+
+DEFAULT_VIS = {"min": -1.0, "max": 1.0, "palette": ["green", "yellow", "red"]}
+
+# Pixels evaluated at once by numpy_indices, so the bands of a chunk stay in cache
+# while every index is computed
+CHUNK_SIZE = 64 * 1024
+
+
+def get_index(index):
+    """
+    Definition of a vegetation index.
+
+    Args:
+        index (str): The name of the index (e.g., "NDVI").
+
+    Returns:
+        dict: {'bands', 'formula', 'constants', 'vis'} and, for normalized differences,
+        'normalized_difference'.
+    """
+    try:
+        return INDICES[index]
+    except KeyError:
+        raise ValueError(f"Unsupported index: {index}")
+
+
+def index_bands(indices):
+    """
+    Sentinel-2 bands needed by a list of indices.
+
+    Args:
+        indices (list): The names of the indices.
+
+    Returns:
+        list: The band names, without duplicates, in order of first use.
+    """
+    bands = []
+    for index in indices:
+        for band in get_index(index)['bands']:
+            if band not in bands:
+                bands.append(band)
+    return bands
+
+
+def index_vis_params(index):
+    """
+    Display range and palette of an index.
+
+    Args:
+        index (str): The name of the index.
+
+    Returns:
+        dict: Earth Engine visualization parameters.
+    """
+    return dict(INDICES.get(index, {}).get('vis', DEFAULT_VIS))
+
+
+def ee_index(image, index):
+    """
+    Compute a vegetation index on an Earth Engine image.
+
+    Args:
+        image (ee.Image): A Sentinel-2 image.
+        index (str): The name of the index.
+
+    Returns:
+        ee.Image: A single band named after the index.
+    """
+    definition = get_index(index)
+    if 'normalized_difference' in definition:
+        return image.normalizedDifference(definition['normalized_difference']).rename(index)
+    variables = {band: image.select(band) for band in definition['bands']}
+    variables.update(definition['constants'])
+    return image.expression(definition['formula'], variables).rename(index)
+
+
+def ee_indices(image, indices):
+    """
+    Compute several vegetation indices on an Earth Engine image.
+
+    Args:
+        image (ee.Image): A Sentinel-2 image.
+        indices (list): The names of the indices.
+
+    Returns:
+        ee.Image: One band per index, named after it.
+    """
+    bands = [ee_index(image, index) for index in indices]
+    result = bands[0]
+    for band in bands[1:]:
+        result = result.addBands(band)
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy_kernel(index):
+    definition = get_index(index)
+    if numexpr is not None:
+        def kernel(arrays):
+            return numexpr.evaluate(definition['formula'], local_dict={**arrays, **definition['constants']})
+    else:
+        code = compile(definition['formula'], f"<{index}>", "eval")
+
+        def kernel(arrays):
+            return eval(code, {'__builtins__': {}, 'sqrt': np.sqrt}, {**arrays, **definition['constants']})
+    return kernel
+
+
+def numpy_index(bands, index):
+    """
+    Compute a vegetation index on local band arrays.
+
+    Args:
+        bands (dict): {band name: array} with at least the bands of the index.
+        index (str): The name of the index.
+
+    Returns:
+        np.ndarray: float32 index values (inf and invalid results as NaN).
+    """
+    return numpy_indices(bands, [index])[index]
+
+
+def numpy_indices(bands, indices):
+    """
+    Compute several vegetation indices in one pass over shared band arrays.
+
+    The bands are converted to float32 once and processed chunk by chunk: every index
+    is evaluated on a chunk before moving to the next one.
+
+    Args:
+        bands (dict): {band name: array}, all of the same shape.
+        indices (list): The names of the indices.
+
+    Returns:
+        dict: {index: float32 array of the shape of the bands}.
+    """
+    needed = index_bands(indices)
+    arrays = {band: np.asarray(bands[band], dtype='float32').ravel() for band in needed}
+    shape = np.shape(bands[needed[0]])
+    size = arrays[needed[0]].size
+    results = {index: np.empty(size, dtype='float32') for index in indices}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, size, CHUNK_SIZE):
+            chunk = {band: values[start:start + CHUNK_SIZE] for band, values in arrays.items()}
+            for index in indices:
+                results[index][start:start + CHUNK_SIZE] = _numpy_kernel(index)(chunk)
+
+    for index, values in results.items():
+        values[~np.isfinite(values)] = np.nan
+        results[index] = values.reshape(shape)
+    return results
@@ -0,0 +1,300 @@
+"""
+Background jobs for long computations (timelapses, province-wide runs, ...).
+
+Jobs are stored in SQLite, so they survive a browser refresh and a server restart: a
+page submits a job, keeps its ID (e.g., in the URL query parameters) and polls its
+progress; a reconnecting session finds the finished result under the same ID. A small
+worker pool per process runs the queued jobs outside the Streamlit script thread.
+
+A job is a function of a utils module called as func(progress, **params), where params
+are JSON-serializable and progress(fraction, message=None) reports its advancement.
+Submitting the same function with the same params again returns the existing job, so
+finished results are not recomputed until their TTL expires.
+
+Results are stored as JSON, so they must be made of JSON-serializable values, numpy
+scalars and pandas DataFrames (stored in 'split' orientation); reading the database
+never runs code from it.
+"""
+import hashlib
+import importlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+JOBS_PATH = os.environ.get("JOBS_PATH", os.path.join(".cache", "jobs.sqlite"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+POLL_INTERVAL = 2  # seconds, between two looks at the queue (and two progress refreshes)
+JOB_RETENTION = 7 * 24 * 60 * 60  # seconds, finished jobs are deleted after this
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_lock = threading.Lock()
+_connection = None
+_wakeup = threading.Event()
+_dispatcher = None
+_WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _connect():
+    """
+    Open (once per process) the SQLite job database and create its table.
+
+    Returns:
+        sqlite3.Connection: The shared connection.
+    """
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(JOBS_PATH) or ".", exist_ok=True)
+        connection = sqlite3.connect(JOBS_PATH, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, func TEXT, params TEXT, status TEXT, progress REAL, message TEXT, "
+            "result BLOB, error TEXT, worker TEXT, created_at REAL, updated_at REAL, expires_at REAL, ttl REAL)"
+        )
+        # Databases created before the TTL started at completion
+        if 'ttl' not in [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]:
+            connection.execute("ALTER TABLE jobs ADD COLUMN ttl REAL")
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        connection.commit()
+        _connection = connection
+    return _connection
+
+
+def _default(value):
+    # DataFrames and numpy scalars, the only non-JSON values of job results
+    if hasattr(value, 'columns') and hasattr(value, 'to_dict'):
+        return {'__dataframe__': value.to_dict(orient='split')}
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Job results must be JSON-serializable, not {type(value).__name__}")
+
+
+def _object_hook(value):
+    if '__dataframe__' in value:
+        import pandas as pd
+
+        return pd.DataFrame(**value['__dataframe__'])
+    return value
+
+
+def _encode(result):
+    return json.dumps(result, default=_default)
+
+
+def _decode(blob):
+    if isinstance(blob, bytes):
+        blob = blob.decode("utf-8")
+    return json.loads(blob, object_hook=_object_hook)
+
+
+def _func_path(func):
+    path = f"{func.__module__}:{func.__qualname__}"
+    if not func.__module__.startswith("utils."):
+        raise ValueError(f"Job functions must be defined in a utils module: {path}")
+    return path
+
+
+def _resolve(path):
+    module, name = path.split(":")
+    if not module.startswith("utils."):
+        raise ValueError(f"Job functions must be defined in a utils module: {path}")
+    return getattr(importlib.import_module(module), name)
+
+
+def submit_job(func, ttl=None, **params):
+    """
+    Queue a job, or return the existing job for the same function and params.
+
+    A failed job, or a finished job whose result has expired, is queued again.
+
+    Args:
+        func (callable): The job function, defined in a utils module.
+        ttl (int, optional): Lifetime of the result in seconds, from the end of the job
+            (default: JOB_RETENTION).
+        **params: The JSON-serializable parameters of the job.
+
+    Returns:
+        str: The job ID.
+    """
+    path = _func_path(func)
+    payload = json.dumps(params, sort_keys=True)
+    job_id = hashlib.sha256(f"{path}\n{payload}".encode("utf-8")).hexdigest()[:32]
+    now = time.time()
+
+    with _lock:
+        connection = _connect()
+        row = connection.execute("SELECT status, expires_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] == FAILED or (row[0] == DONE and row[1] < now):
+            # The job expires ttl seconds after it ends (see _run)
+            connection.execute(
+                "INSERT OR REPLACE INTO jobs (id, func, params, status, progress, message, result, error, worker, "
+                "created_at, updated_at, expires_at, ttl) VALUES (?, ?, ?, ?, 0, NULL, NULL, NULL, NULL, ?, ?, NULL, ?)",
+                (job_id, path, payload, QUEUED, now, now, ttl or JOB_RETENTION)
+            )
+            connection.commit()
+    _start_dispatcher()
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id):
+    """
+    State of a job.
+
+    Args:
+        job_id (str): The job ID.
+
+    Returns:
+        dict: {'id', 'status', 'progress', 'message', 'result', 'error', 'created_at',
+        'updated_at'}, or None if the job does not exist (or its result has expired).
+    """
+    _start_dispatcher()
+    with _lock:
+        row = _connect().execute(
+            "SELECT id, status, progress, message, result, error, created_at, updated_at, expires_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+    if row is None or (row[1] == DONE and row[8] < time.time()):
+        return None
+    job = dict(zip(['id', 'status', 'progress', 'message', 'result', 'error', 'created_at', 'updated_at'], row[:8]))
+    if job['result'] is not None:
+        try:
+            job['result'] = _decode(job['result'])
+        except (ValueError, UnicodeDecodeError):
+            # Pickled by an older version: dropped, so that the next submission computes it again
+            with _lock:
+                connection = _connect()
+                connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                connection.commit()
+            return None
+    return job
+
+
+@st.fragment(run_every=POLL_INTERVAL)
+def job_progress(job_id, label="En attente d'un emplacement libre..."):
+    """
+    Progress bar of a queued or running job, refreshed in place; reruns the page once it ends.
+
+    Args:
+        job_id (str): The job ID.
+        label (str): The text shown until the job reports a message.
+    """
+    job = get_job(job_id)
+    if job is None or job['status'] in (DONE, FAILED):
+        st.rerun()
+    st.progress(job['progress'], text=job['message'] or label)
+    st.caption("Le calcul continue en arrière-plan : vous pouvez quitter ou recharger la page.")
+
+
+def _update(job_id, **fields):
+    fields['updated_at'] = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with _lock:
+        connection = _connect()
+        connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        connection.commit()
+
+
+def _claim():
+    """Mark the oldest queued job as running in this process, and return it."""
+    with _lock:
+        connection = _connect()
+        row = connection.execute(
+            "SELECT id, func, params, ttl FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is None:
+            return None
+        claimed = connection.execute(
+            "UPDATE jobs SET status = ?, worker = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (RUNNING, _WORKER, time.time(), row[0], QUEUED)
+        ).rowcount
+        connection.commit()
+    return row if claimed else None
+
+
+def _recover():
+    """Queue again the jobs left running by a dead process of this host, and drop old jobs."""
+    host = socket.gethostname()
+    with _lock:
+        connection = _connect()
+        for job_id, worker in connection.execute(
+            "SELECT id, worker FROM jobs WHERE status = ?", (RUNNING,)
+        ).fetchall():
+            worker_host, _, pid = (worker or "").rpartition(":")
+            if worker_host != host or not pid.isdigit():
+                continue
+            # This process has not claimed anything yet: its own PID means a previous
+            # process (e.g., a restarted container) reused it
+            alive = worker != _WORKER
+            if alive:
+                try:
+                    os.kill(int(pid), 0)
+                except ProcessLookupError:
+                    alive = False
+                except PermissionError:
+                    pass  # Alive, owned by another user
+            if not alive:
+                connection.execute("UPDATE jobs SET status = ?, worker = NULL WHERE id = ?", (QUEUED, job_id))
+        connection.execute("DELETE FROM jobs WHERE status IN (?, ?) AND expires_at < ?", (DONE, FAILED, time.time()))
+        connection.commit()
+
+
+def _run(job_id, path, payload, ttl):
+    last_update = 0.0
+
+    def progress(fraction, message=None):
+        nonlocal last_update
+        # Progress is written at most once per second
+        if time.monotonic() - last_update >= 1 or fraction >= 1:
+            last_update = time.monotonic()
+            _update(job_id, progress=float(fraction), message=message)
+
+    try:
+        result = _resolve(path)(progress, **json.loads(payload))
+        _update(job_id, status=DONE, progress=1.0, result=_encode(result),
+                expires_at=time.time() + (ttl or JOB_RETENTION))
+    except Exception as e:
+        logger.warning("Job %s (%s) failed:\n%s", job_id, path, traceback.format_exc())
+        _update(job_id, status=FAILED, error=str(e) or type(e).__name__,
+                expires_at=time.time() + (ttl or JOB_RETENTION))
+
+
+def _dispatch():
+    _recover()
+    slots = threading.Semaphore(JOB_WORKERS)
+    with ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job") as pool:
+        while True:
+            slots.acquire()
+            try:
+                job = _claim()
+            except sqlite3.Error as e:
+                logger.warning("Job queue unavailable: %s", e)
+                job = None
+            if job is None:
+                slots.release()
+                # Woken up by a submission in this process, or polls for other processes
+                _wakeup.wait(POLL_INTERVAL)
+                _wakeup.clear()
+                continue
+            future = pool.submit(_run, *job)
+            future.add_done_callback(lambda _: slots.release())
+
+
+def _start_dispatcher():
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None:
+            _dispatcher = threading.Thread(target=_dispatch, name="job-dispatcher", daemon=True)
+            _dispatcher.start()
@@ -0,0 +1,214 @@
+"""
+Local Sentinel-2 backend: the vegetation index, phytomass and commune statistics of the
+phytomasse page computed with NumPy on Sentinel-2 L2A tiles held on disk, for when
+Earth Engine is unavailable or the scenes are already downloaded.
+
+Expected layout (one directory per scene, named after its acquisition date, one
+GeoTIFF/COG per band with the Earth Engine band names):
+
+    <S2_LOCAL_DIR>/<YYYYMMDD>_<anything>/B2.tif, B3.tif, B4.tif, B8.tif, QA60.tif
+
+Only the window covering the commune is read from each file (through a WarpedVRT on a
+common 10 m grid), and the per-scene index stack is kept in a memory-mapped temporary
+file, so whole tiles are never loaded in RAM.
+"""
+import glob
+import math
+import os
+import tempfile
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+from utils.indices import get_index, numpy_index
+from utils.phytomass import get_formula, numpy_phytomass
+from utils.windows import DEFAULT_WINDOW, composite_window
+
+S2_LOCAL_DIR = os.environ.get("S2_LOCAL_DIR", os.path.join("data", "sentinel2"))
+PIXEL_SIZE = 10  # meters
+ROW_BLOCK = 256  # rows of the stack reduced at once by the median
+
+def list_scenes(start_date, end_date, root=S2_LOCAL_DIR):
+    """
+    Local scenes acquired in [start_date, end_date).
+
+    Args:
+        start_date (datetime): The start date (inclusive).
+        end_date (datetime): The end date (exclusive).
+        root (str): The directory holding one sub-directory per scene.
+
+    Returns:
+        list: The scene directories, sorted by date.
+    """
+    scenes = []
+    for path in sorted(glob.glob(os.path.join(root, "*"))):
+        try:
+            acquired = datetime.strptime(os.path.basename(path)[:8], "%Y%m%d")
+        except ValueError:
+            continue
+        if os.path.isdir(path) and start_date <= acquired < end_date:
+            scenes.append(path)
+    return scenes
+
+
+def _target_grid(region, scene):
+    import rasterio
+    from rasterio.transform import Affine
+    from rasterio.warp import transform_bounds
+    from shapely.geometry import shape
+
+    # 10 m grid aligned on the first scene's CRS, covering the region only
+    with rasterio.open(os.path.join(scene, "B4.tif")) as src:
+        crs = src.crs
+    left, bottom, right, top = transform_bounds("EPSG:4326", crs, *shape(region).bounds, densify_pts=21)
+    left = math.floor(left / PIXEL_SIZE) * PIXEL_SIZE
+    top = math.ceil(top / PIXEL_SIZE) * PIXEL_SIZE
+    width = math.ceil((right - left) / PIXEL_SIZE)
+    height = math.ceil((top - bottom) / PIXEL_SIZE)
+    return crs, Affine(PIXEL_SIZE, 0, left, 0, -PIXEL_SIZE, top), width, height
+
+
+def _read_band(scene, band, grid):
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.vrt import WarpedVRT
+
+    crs, transform, width, height = grid
+    with rasterio.open(os.path.join(scene, f"{band}.tif")) as src:
+        with WarpedVRT(src, crs=crs, transform=transform, width=width, height=height,
+                       resampling=Resampling.nearest) as vrt:
+            return vrt.read(1, out_dtype='float32')
+
+
+def _region_mask(region, grid):
+    from rasterio.features import geometry_mask
+    from rasterio.warp import transform_geom
+
+    crs, transform, width, height = grid
+    return geometry_mask(
+        [transform_geom("EPSG:4326", crs, region)],
+        out_shape=(height, width),
+        transform=transform,
+        invert=True
+    )
+
+
+def calculate_index(region, date, index, mask_clouds=True, scale_factor=1, window=DEFAULT_WINDOW):
+    """
+    Calculate a vegetation index over the specified geometry from local scenes.
+
+    Args:
+        region (dict): The GeoJSON geometry (EPSG:4326) for which the index will be calculated.
+        date (str): The end date in "YYYY-MM-DD" format.
+        index (str): The name of the vegetation index to calculate (e.g., "NDVI", "RVI", "DVI", etc.).
+        mask_clouds (bool): Whether to apply QA60 cloud masking (default: True).
+        scale_factor (float): Factor to scale the index values (default: 1).
+        window (str): The composite window policy (see utils.windows.WINDOW_POLICIES).
+
+    Returns:
+        dict: {'bands': {index: 2-D float32 array (NaN outside the region or without
+        clear observation)}, 'crs', 'transform', 'region'}: the median composite.
+    """
+    start_date, end_date = composite_window(date, window)
+    scenes = list_scenes(start_date, end_date)
+    if not scenes:
+        raise ValueError("Aucune scène Sentinel-2 locale sur la période sélectionnée.")
+
+    grid = _target_grid(region, scenes[0])
+    _, _, width, height = grid
+    bands = get_index(index)['bands']
+
+    composite = np.empty((height, width), dtype='float32')
+    with tempfile.TemporaryFile() as f:
+        stack = np.memmap(f, dtype='float32', mode='w+', shape=(len(scenes), height, width))
+        for i, scene in enumerate(scenes):
+            values = {band: _read_band(scene, band, grid) for band in bands}
+            # 0 is the Sentinel-2 L2A no-data value (and fills outside the scene footprint)
+            valid = np.logical_and.reduce([values[band] > 0 for band in bands])
+            if mask_clouds:
+                valid &= _read_band(scene, 'QA60', grid) < 1
+            scene_index = numpy_index(values, index)
+            scene_index[~valid] = np.nan
+            stack[i] = scene_index
+
+        # Median composite, a block of rows at a time to bound memory
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # pixels never observed
+            for row in range(0, height, ROW_BLOCK):
+                composite[row:row + ROW_BLOCK] = np.nanmedian(stack[:, row:row + ROW_BLOCK], axis=0)
+        del stack
+
+    if scale_factor != 1:
+        composite *= scale_factor
+
+    # Clip the image to the region
+    composite[~_region_mask(region, grid)] = np.nan
+
+    crs, transform, _, _ = grid
+    return {'bands': {index: composite}, 'crs': crs, 'transform': transform, 'region': region}
+
+
+def calculate_phytomass(index_image, formula):
+    """
+    Calculate phytomass using the selected formula.
+
+    Args:
+        index_image (dict): The vegetation index image returned by calculate_index.
+        formula (str): The formula to use for phytomass calculation.
+
+    Returns:
+        tuple: A tuple containing the phytomass image (band 'Phytomass') and the R² value of the formula.
+    """
+    row = get_formula(formula)
+    if row['index'] not in index_image['bands']:
+        raise ValueError(f"Formula '{formula}' needs the {row['index']} index.")
+
+    phytomass = numpy_phytomass(index_image['bands'][row['index']], [formula])[0]
+    return dict(index_image, bands={'Phytomass': phytomass}), row['r_squared']
+
+
+def _band_statistics(values):
+    values = values[~np.isnan(values)]
+    if not values.size:
+        return {'mean': None, 'sum': None, 'min': None, 'max': None, 'count': 0}
+    return {
+        'mean': float(values.mean(dtype='float64')),
+        'sum': float(values.sum(dtype='float64')),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'count': int(values.size),
+    }
+
+
+def compute_statistics(index_image, index, phytomass_image, region, scale=10):
+    """
+    Compute the statistics of the phytomasse page from local images.
+
+    Same output as utils.ee_stats.compute_statistics.
+
+    Args:
+        index_image (dict): The vegetation index image returned by calculate_index.
+        index (str): The name of the index band (e.g., "NDVI").
+        phytomass_image (dict): The phytomass image returned by calculate_phytomass.
+        region (dict): Unused (the images are already cut to the region); kept for the same signature.
+        scale (int): Unused (the local grid is always 10 m); kept for the same signature.
+
+    Returns:
+        dict: {'index': {...}, 'phytomass': {...}}.
+    """
+    return {
+        'index': _band_statistics(index_image['bands'][index]),
+        'phytomass': _band_statistics(phytomass_image['bands']['Phytomass']),
+    }
+
+
+def is_available():
+    """
+    Whether the local backend can run (rasterio installed and S2_LOCAL_DIR present).
+
+    Returns:
+        bool: True if local scenes can be processed.
+    """
+    import importlib.util
+    return os.path.isdir(S2_LOCAL_DIR) and importlib.util.find_spec("rasterio") is not None
@@ -0,0 +1,171 @@
+"""
+Phytomass models: one row of coefficients per formula, evaluated on Earth Engine
+images or NumPy arrays.
+
+Every model has the form  a + b * X + c * (X - d) ** 2  on a vegetation index X
+(linear models have c = 0), optionally clamped at 0. Adding a model is adding a row.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+COMPARISON_COLUMNS = ['formula', 'index', 'r_squared', 'phytomass_sum', 'uf_total', 'uf_ha']
+FORMULA_COLUMNS = ['index', 'a', 'b', 'c', 'd', 'clip_negative', 'r_squared']
+
+# R² is the fixed 0.8 used so far for every model
+PHYTOMASS_FORMULAS = {
+    'NDVI Linéaire': ('NDVI', 2.53, 28.70, 0, 0, False, 0.8),
+    'NDVI Polynomial': ('NDVI', -1.82, 21.44, 116.10, 0, False, 0.8),
+    'RVI Linéaire': ('RVI', -10.80, 9.05, 0, 0, False, 0.8),
+    'RVI Polynomial': ('RVI', -6.95, 5.90, 15.49, 0, False, 0.8),
+    'DVI Linéaire': ('DVI', -2.99, 48.50, 0, 0, False, 0.8),
+    'DVI Polynomial': ('DVI', -2.62, 39.86, 1901.45, 0, False, 0.8),
+    'SAVI Linéaire': ('SAVI', -3.29, 40.13, 0, 0, False, 0.8),
+    'SAVI Polynomial': ('SAVI', -1.68, 20.76, 682.13, 0, False, 0.8),
+    'MSAVI Linéaire': ('MSAVI', 1.09, -1.12, 0, 0, False, 0.8),
+    'MSAVI Polynomial': ('MSAVI', 1.87, 14.94, -97.55, 0.26, False, 0.8),
+    'TSAVI Linéaire': ('TSAVI', -0.97, -3.90, 0, 0, True, 0.8),
+    'TSAVI Polynomial': ('TSAVI', -1.53, -5.38, 2.23, 0.4551, True, 0.8),
+    'ARVI Linéaire': ('ARVI', 2.95, 20.97, 0, 0, False, 0.8),
+    'ARVI Polynomial': ('ARVI', 2.19, 15.17, 75.16, 0.1027, False, 0.8),
+    'IPVI Linéaire': ('IPVI', -27.13, 49.81, 0, 0, False, 0.8),
+    'IPVI Polynomial': ('IPVI', -1.87, 14.94, -97.55, 0.27, False, 0.8),
+}
+
+
+def get_formula(formula):
+    """
+    Coefficients of a phytomass model.
+
+    Args:
+        formula (str): The name of the formula (e.g., "NDVI Polynomial").
+
+    Returns:
+        dict: The FORMULA_COLUMNS of the model.
+    """
+    try:
+        return dict(zip(FORMULA_COLUMNS, PHYTOMASS_FORMULAS[formula]))
+    except KeyError:
+        raise ValueError(f"Unsupported formula: {formula}")
+
+
+def formulas_for(indices):
+    """
+    Formulas that can be evaluated from the given indices.
+
+    Args:
+        indices (list): The names of the available indices.
+
+    Returns:
+        list: The formula names, in table order.
+    """
+    return [formula for formula, row in PHYTOMASS_FORMULAS.items() if row[0] in indices]
+
+
+def formula_band(formula):
+    """
+    Earth Engine band name of a formula (ASCII, no spaces).
+
+    Args:
+        formula (str): The name of the formula.
+
+    Returns:
+        str: E.g. 'NDVI_Lineaire' for 'NDVI Linéaire'.
+    """
+    ascii_name = unicodedata.normalize('NFKD', formula).encode('ascii', 'ignore').decode()
+    return re.sub(r'\W+', '_', ascii_name)
+
+
+def ee_phytomass(index_image, formula, band='Phytomass'):
+    """
+    Evaluate a phytomass model on an Earth Engine index image.
+
+    Args:
+        index_image (ee.Image): An image with the index band of the formula.
+        formula (str): The name of the formula.
+        band (str): The name of the output band (default: 'Phytomass').
+
+    Returns:
+        ee.Image: The phytomass band.
+    """
+    row = get_formula(formula)
+    phytomass = index_image.expression(
+        'a + b * X + c * (X - d) ** 2',
+        {'X': index_image.select(row['index']), 'a': row['a'], 'b': row['b'], 'c': row['c'], 'd': row['d']}
+    ).rename(band)
+    if row['clip_negative']:
+        # Set negative values to 0
+        phytomass = phytomass.where(phytomass.lt(0), 0)
+    return phytomass
+
+
+def ee_phytomass_all(index_image, formulas):
+    """
+    Evaluate several phytomass models as bands of one Earth Engine image.
+
+    Args:
+        index_image (ee.Image): An image with the index bands of the formulas.
+        formulas (list): The names of the formulas.
+
+    Returns:
+        ee.Image: One band per formula, named formula_band(formula).
+    """
+    bands = [ee_phytomass(index_image, formula, formula_band(formula)) for formula in formulas]
+    result = bands[0]
+    for band in bands[1:]:
+        result = result.addBands(band)
+    return result
+
+
+def numpy_phytomass(index_values, formulas):
+    """
+    Evaluate several phytomass models on the same index array at once.
+
+    The coefficients of the formulas are stacked into column vectors and broadcast
+    against the index values, so all the models cost one vectorized expression.
+
+    Args:
+        index_values (np.ndarray): The values of the index shared by the formulas.
+        formulas (list): The names of the formulas (all on the same index).
+
+    Returns:
+        np.ndarray: float32 array of shape (len(formulas),) + index_values.shape.
+    """
+    rows = [get_formula(formula) for formula in formulas]
+    if len({row['index'] for row in rows}) > 1:
+        raise ValueError("numpy_phytomass expects formulas of a single index.")
+
+    shape = (len(rows),) + (1,) * np.ndim(index_values)
+    a, b, c, d = (np.array([row[key] for row in rows], dtype='float32').reshape(shape) for key in 'abcd')
+    clip = np.array([row['clip_negative'] for row in rows]).reshape(shape)
+
+    x = np.asarray(index_values, dtype='float32')[np.newaxis]
+    phytomass = a + b * x + c * (x - d) ** 2
+    return np.where(clip & (phytomass < 0), 0, phytomass).astype('float32')
+
+
+def comparison_table(sums, area_ha):
+    """
+    Commune totals of several formulas, side by side.
+
+    Args:
+        sums (dict): {formula: phytomass sum over the commune}.
+        area_ha (float): The area of the commune in hectares.
+
+    Returns:
+        pd.DataFrame: One row per formula with the COMPARISON_COLUMNS.
+    """
+    rows = []
+    for formula, phytomass_sum in sums.items():
+        row = get_formula(formula)
+        rows.append({
+            'formula': formula,
+            'index': row['index'],
+            'r_squared': row['r_squared'],
+            'phytomass_sum': phytomass_sum,
+            'uf_total': phytomass_sum / 10 if phytomass_sum is not None else None,
+            'uf_ha': phytomass_sum / (area_ha * 10) if phytomass_sum is not None and area_ha else None,
+        })
+    return pd.DataFrame(rows, columns=COMPARISON_COLUMNS)
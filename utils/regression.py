@@ -0,0 +1,237 @@
+"""
+Lagged rain → vegetation index regressions, fitted for every commune at once.
+
+For each commune and each lag L of LAGS, the monthly index mean is regressed on the
+precipitation L months earlier: index[t] = intercept + slope * rain[t - L]. The series of
+all the communes are stacked into one (communes, lags, months, 2) design array, where
+missing months are zero rows that drop out of the fit, and solved with one batched
+pseudo-inverse instead of one model per commune and lag.
+
+Province-wide fits (regression_job) store their coefficients, R² and residuals in
+Parquet, one run per index and period, so the rain/index page reads them back without
+refitting or any Earth Engine call.
+"""
+import datetime
+import os
+from concurrent.futures import as_completed
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.data import file_signature
+
+REGRESSION_FILE = os.environ.get(
+    "REGRESSION_FILE", os.path.join("data", "results", "rain_regression.parquet")
+)
+RESIDUALS_FILE = os.environ.get(
+    "RESIDUALS_FILE", os.path.join("data", "results", "rain_regression_residuals.parquet")
+)
+
+LAGS = (0, 1, 2, 3)  # months between the rain and the index response
+MIN_MONTHS = 6  # fewer valid months than this leave the fit undefined (NaN)
+RUN_KEYS = ['index', 'start_date', 'end_date']
+
+
+def fit_lagged(rain, index, lags=LAGS):
+    """
+    Fit index = intercept + slope * lagged rain for every series and lag in one batch.
+
+    Args:
+        rain (np.ndarray): The monthly precipitation, shape (series, months), NaN when missing.
+        index (np.ndarray): The monthly index means, same shape.
+        lags (tuple): The lags in months.
+
+    Returns:
+        dict: 'slope', 'intercept', 'r2' and 'n_months' of shape (series, lags), and
+        'residuals' of shape (series, lags, months); NaN where the fit is undefined.
+    """
+    rain = np.atleast_2d(np.asarray(rain, dtype=np.float64))
+    index = np.atleast_2d(np.asarray(index, dtype=np.float64))
+    n_series, n_months = rain.shape
+
+    x = np.full((n_series, len(lags), n_months), np.nan)
+    for j, lag in enumerate(lags):
+        if lag < n_months:
+            x[:, j, lag:] = rain[:, :n_months - lag]
+    y = np.broadcast_to(index[:, None, :], x.shape)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+
+    design = np.stack([np.where(valid, x, 0.0), valid.astype(np.float64)], axis=-1)
+    target = np.where(valid, y, 0.0)[..., None]
+    coefficients = (np.linalg.pinv(design) @ target)[..., 0]
+    slope, intercept = coefficients[..., 0], coefficients[..., 1]
+
+    residuals = np.where(valid, y - (slope[..., None] * x + intercept[..., None]), np.nan)
+    n_months_valid = valid.sum(axis=-1)
+    mean = target[..., 0].sum(axis=-1) / np.maximum(n_months_valid, 1)
+    ss_total = np.where(valid, (y - mean[..., None]) ** 2, 0.0).sum(axis=-1)
+    ss_residual = np.nansum(residuals ** 2, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = 1 - ss_residual / ss_total
+
+    defined = (n_months_valid >= MIN_MONTHS) & (ss_total > 0)
+    return {
+        'slope': np.where(defined, slope, np.nan),
+        'intercept': np.where(defined, intercept, np.nan),
+        'r2': np.where(defined, r2, np.nan),
+        'n_months': n_months_valid,
+        'residuals': np.where(defined[..., None], residuals, np.nan),
+    }
+
+
+def fit_tables(ids, names, months, fit, lags=LAGS):
+    """
+    Long tables of a batched fit.
+
+    Args:
+        ids (list): The commune IDs, one per series.
+        names (list): The commune names, one per series.
+        months (list): The month labels of the series.
+        fit (dict): The result of fit_lagged.
+        lags (tuple): The lags of the fit.
+
+    Returns:
+        tuple: (fits, residuals) DataFrames; fits has one row per commune and lag
+        ('id_commune', 'commune', 'lag', 'slope', 'intercept', 'r2', 'n_months'),
+        residuals one row per commune, lag and fitted month ('id_commune', 'lag',
+        'month', 'residual').
+    """
+    n_series, n_lags = fit['r2'].shape
+    fits = pd.DataFrame({
+        'id_commune': np.repeat(ids, n_lags),
+        'commune': np.repeat(names, n_lags),
+        'lag': np.tile(lags, n_series),
+        'slope': fit['slope'].ravel(),
+        'intercept': fit['intercept'].ravel(),
+        'r2': fit['r2'].ravel(),
+        'n_months': fit['n_months'].ravel(),
+    })
+    residuals = pd.DataFrame({
+        'id_commune': np.repeat(ids, n_lags * len(months)),
+        'lag': np.tile(np.repeat(lags, len(months)), n_series),
+        'month': np.tile(months, n_series * n_lags),
+        'residual': fit['residuals'].ravel(),
+    }).dropna(subset=['residual'])
+    return fits, residuals.reset_index(drop=True)
+
+
+def best_lags(fits):
+    """
+    Lag with the highest R² of each commune.
+
+    Args:
+        fits (pd.DataFrame): The fits table (see fit_tables).
+
+    Returns:
+        pd.DataFrame: One row per commune with a defined fit.
+    """
+    fits = fits.dropna(subset=['r2'])
+    return fits.loc[fits.groupby('id_commune')['r2'].idxmax()].reset_index(drop=True)
+
+
+def _replace_run(path, table, run):
+    """Store a run in a Parquet file, replacing the rows of the same run (moved into place in one step)."""
+    table = table.assign(**run)
+    if os.path.exists(path):
+        previous = pd.read_parquet(path)
+        same_run = np.logical_and.reduce([previous[key] == value for key, value in run.items()])
+        table = pd.concat([previous[~same_run], table], ignore_index=True)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    table.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def save_regression(fits, residuals, index, start_date, end_date):
+    """
+    Store the fits and residuals of a province-wide run.
+
+    Args:
+        fits (pd.DataFrame): The fits table (see fit_tables).
+        residuals (pd.DataFrame): The residuals table.
+        index (str): The MODIS index.
+        start_date (str): The start date in "YYYY-MM-DD" format.
+        end_date (str): The end date in "YYYY-MM-DD" format.
+    """
+    run = {'index': index, 'start_date': start_date, 'end_date': end_date}
+    fits = fits.assign(computed_at=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'))
+    _replace_run(REGRESSION_FILE, fits, run)
+    _replace_run(RESIDUALS_FILE, residuals, run)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_table(path, signature):
+    return pd.read_parquet(path)
+
+
+def load_regression(index, start_date, end_date, residuals=False):
+    """
+    Stored fits (or residuals) of a run, cached until the file changes.
+
+    Args:
+        index (str): The MODIS index.
+        start_date (str): The start date in "YYYY-MM-DD" format.
+        end_date (str): The end date in "YYYY-MM-DD" format.
+        residuals (bool): Return the residuals instead of the fits.
+
+    Returns:
+        pd.DataFrame: The rows of the run (empty when it has not been computed).
+    """
+    path = RESIDUALS_FILE if residuals else REGRESSION_FILE
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    table = _load_table(path, file_signature(path))
+    run = (table['index'] == index) & (table['start_date'] == start_date) & (table['end_date'] == end_date)
+    return table[run].drop(columns=RUN_KEYS).reset_index(drop=True)
+
+
+def regression_job(progress, start_date, end_date, index):
+    """
+    Lagged regressions of every commune: monthly series from the store, one batched fit, saved.
+
+    The months missing from the time-series store are fetched concurrently, one request
+    per commune and run of missing months (see utils.timeseries_store).
+
+    Args:
+        progress (callable): progress(fraction, message), see utils.jobs.
+        start_date (str): The start date in "YYYY-MM-DD" format.
+        end_date (str): The end date in "YYYY-MM-DD" format.
+        index (str): The MODIS index (e.g., "NDVI").
+
+    Returns:
+        dict: {'fits', 'months'}, the fits table and the number of months.
+    """
+    import ee
+
+    from utils.communes import get_commune_index
+    from utils.ee_executor import submit
+    from utils.ee_timeseries import month_labels
+    from utils.timeseries_store import monthly_series
+
+    if not ee.data.is_initialized():
+        ee.Initialize()
+
+    communes = sorted(get_commune_index()['by_id'].values(), key=lambda commune: commune['id'])
+    start, end = datetime.date.fromisoformat(start_date), datetime.date.fromisoformat(end_date)
+    futures = {submit(monthly_series, commune, start, end, index): i for i, commune in enumerate(communes)}
+
+    series = [None] * len(communes)
+    for done, future in enumerate(as_completed(futures), start=1):
+        series[futures[future]] = future.result()[:2]
+        progress(0.9 * done / len(futures), f"Séries mensuelles : {done}/{len(futures)} communes")
+
+    months = month_labels(datetime.date(start.year, start.month, 1), end)
+    for (precipitation_df, index_df), commune in zip(series, communes):
+        if list(precipitation_df['Month']) != months or list(index_df['Month']) != months:
+            raise ValueError(f"Unexpected months in the series of commune {commune['id']}.")
+    rain = np.stack([precipitation_df['Precipitation (mm)'].to_numpy() for precipitation_df, _ in series])
+    index_values = np.stack([index_df[f'Mean {index}'].to_numpy() for _, index_df in series])
+
+    progress(0.95, "Ajustement des régressions")
+    fits, residuals = fit_tables(
+        [commune['id'] for commune in communes], [commune['name'] for commune in communes],
+        months, fit_lagged(rain, index_values)
+    )
+    save_regression(fits, residuals, index, start_date, end_date)
+    return {'fits': fits, 'months': len(months)}
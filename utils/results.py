@@ -0,0 +1,179 @@
+"""
+Precomputed per-commune results, read by the overview page without any Earth Engine call.
+
+Every province-wide run (precompute_job, submitted by the batch section of the phytomasse
+page or run from the command line) appends its table to one Parquet file, one row per
+commune and run. Runs are identified by their date and formula; saving a run again
+replaces it.
+
+Precompute a run (e.g., from a scheduled job):
+    python -m utils.results --date 2024-03-15 --formula "NDVI Linéaire"
+"""
+import argparse
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+import streamlit as st
+
+from utils.data import file_signature
+
+RESULTS_FILE = os.environ.get("RESULTS_FILE", os.path.join("data", "results", "communes.parquet"))
+
+RUN_COLUMNS = ['date', 'formula', 'index', 'window', 'computed_at']
+# Supply classes: quintiles of UF/ha over the communes of a run
+SUPPLY_CLASSES = ["Très faible", "Faible", "Moyenne", "Élevée", "Très élevée"]
+SUPPLY_COLORS = ['#d7191c', '#fdae61', '#ffffbf', '#a6d96a', '#1a9641']
+
+
+def supply_class(uf_ha):
+    """
+    Supply class of each commune, from the quintiles of UF/ha within a run.
+
+    Args:
+        uf_ha (pd.Series): The UF/ha of the communes of one run.
+
+    Returns:
+        pd.Series: One of SUPPLY_CLASSES per commune (None when UF/ha is missing).
+    """
+    valid = uf_ha.dropna()
+    if len(valid) < len(SUPPLY_CLASSES):
+        return pd.Series(None, index=uf_ha.index, dtype='object')
+    classes = pd.qcut(valid.rank(method='first'), len(SUPPLY_CLASSES), labels=SUPPLY_CLASSES)
+    return classes.astype('object').reindex(uf_ha.index)
+
+
+def save_results(table, date, formula, index, window, path=RESULTS_FILE):
+    """
+    Store the table of a province-wide run, replacing a previous run with the same date and formula.
+
+    The file is rewritten through a temporary file and moved into place, so readers
+    never see a partial file.
+
+    Args:
+        table (pd.DataFrame): One row per commune (see utils.ee_batch.RESULT_COLUMNS).
+        date (str): The requested date in "YYYY-MM-DD" format.
+        formula (str): The phytomass formula.
+        index (str): The index of the formula.
+        window (str): The description of the composite window.
+        path (str): The results file.
+    """
+    run = table.copy()
+    run['supply_class'] = supply_class(run['uf_ha'])
+    run['date'] = date
+    run['formula'] = formula
+    run['index'] = index
+    run['window'] = window
+    run['computed_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    if os.path.exists(path):
+        previous = pd.read_parquet(path)
+        previous = previous[~((previous['date'] == date) & (previous['formula'] == formula))]
+        run = pd.concat([previous, run], ignore_index=True)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    run.sort_values(['date', 'formula', 'id_commune']).to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _load_results(path, signature):
+    return pd.read_parquet(path)
+
+
+def load_results(path=RESULTS_FILE):
+    """
+    All the stored runs, cached until the file changes.
+
+    Args:
+        path (str): The results file.
+
+    Returns:
+        pd.DataFrame: The results (empty when nothing has been precomputed yet).
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return _load_results(path, file_signature(path))
+
+
+def list_runs(results):
+    """
+    Runs available in the results, latest first.
+
+    Args:
+        results (pd.DataFrame): The results from load_results.
+
+    Returns:
+        pd.DataFrame: One row per run with the RUN_COLUMNS.
+    """
+    if results.empty:
+        return pd.DataFrame(columns=RUN_COLUMNS)
+    runs = results[RUN_COLUMNS].drop_duplicates(['date', 'formula'], keep='last')
+    return runs.sort_values(['date', 'computed_at'], ascending=False, ignore_index=True)
+
+
+def precompute_job(progress, date, formula, window=None, scale=30, **scene_options):
+    """
+    Province-wide run: index mean, phytomass and UF/ha of every commune, saved to the results.
+
+    One composite is built over the whole province and reduced over every commune at
+    once. Runs as a background job (see utils.jobs) or from the command line.
+
+    Args:
+        progress (callable): progress(fraction, message), see utils.jobs.
+        date (str): The requested date in "YYYY-MM-DD" format.
+        formula (str): The phytomass formula.
+        window (str): The composite window policy (default: utils.windows.DEFAULT_WINDOW).
+        scale (int): The reduction scale in meters.
+        **scene_options: cloud_mask and max_cloud (see utils.ee_composite.index_collection);
+            by default every scene is kept, whatever its cloud cover.
+
+    Returns:
+        dict: {'table', 'date', 'window', 'formula'}, the table having one row per commune.
+    """
+    import ee
+
+    from utils.ee_batch import communes_bounds, compute_all_communes
+    from utils.ee_composite import index_composite
+    from utils.phytomass import ee_phytomass, get_formula
+    from utils.windows import DEFAULT_WINDOW, composite_window, describe_window
+
+    if not ee.data.is_initialized():
+        ee.Initialize()
+
+    index = get_formula(formula)['index']
+    start_date, end_date = composite_window(date, window or DEFAULT_WINDOW)
+    # The province spans several tiles: the scene count limit would favour one of them
+    index_image = index_composite(
+        communes_bounds(), start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), [index],
+        **{'max_cloud': None, **scene_options, 'max_scenes': None}
+    )
+    progress(0.1, "Réduction sur toutes les communes")
+    table = compute_all_communes(index_image, index, ee_phytomass(index_image, formula), scale=scale)
+
+    progress(0.9, "Enregistrement des résultats")
+    window_label = describe_window(start_date, end_date)
+    save_results(table, date, formula, index, window_label)
+    return {'table': table, 'date': date, 'window': window_label, 'formula': formula}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", required=True, help="requested date, YYYY-MM-DD")
+    parser.add_argument("--formula", required=True, help="phytomass formula (see utils.phytomass.PHYTOMASS_FORMULAS)")
+    parser.add_argument("--window", default=None, help="composite window policy (see utils.windows.WINDOW_POLICIES)")
+    parser.add_argument("--scale", type=int, default=30, help="reduction scale in meters")
+    parser.add_argument("--max-cloud", type=float, default=None,
+                        help="maximum cloud cover of the scenes in percent (default: keep every scene)")
+    args = parser.parse_args()
+
+    run = precompute_job(
+        lambda fraction, message=None: None, args.date, args.formula, args.window, args.scale, max_cloud=args.max_cloud
+    )
+    print(f"{len(run['table'])} communes saved to {RESULTS_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
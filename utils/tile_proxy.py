@@ -0,0 +1,284 @@
+"""
+Local XYZ tile proxy for Earth Engine layers.
+
+The folium maps point at this proxy instead of Earth Engine: a tile is fetched from the
+upstream URL on a miss, stored on disk (LRU size limit and TTL) and served from disk on
+the next request. Layers are registered under a stable key (the image graph and vis
+params), so tiles survive the refresh of an expired map ID.
+
+Enabled with TILE_PROXY=1; TILE_PROXY_URL is the address of the proxy as seen by the
+browser (default http://localhost:<TILE_PROXY_PORT>).
+"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("TILE_PROXY") == "1"
+TILE_PROXY_HOST = os.environ.get("TILE_PROXY_HOST", "127.0.0.1")
+TILE_PROXY_PORT = int(os.environ.get("TILE_PROXY_PORT", 8765))
+TILE_PROXY_URL = os.environ.get("TILE_PROXY_URL", f"http://localhost:{TILE_PROXY_PORT}")
+TILE_CACHE_DIR = os.environ.get("TILE_CACHE_DIR", os.path.join(".cache", "tiles"))
+TILE_CACHE_MAX_BYTES = int(os.environ.get("TILE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+TILE_TTL = int(os.environ.get("TILE_TTL", 7 * 24 * 60 * 60))  # seconds
+UPSTREAM_TIMEOUT = 30  # seconds
+
+TILE_PATH = re.compile(r"^/tiles/(?P<layer>[0-9a-f]{8,64})/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)$")
+
+
+class TileStore:
+    """
+    Tiles on disk, indexed in SQLite with their size, expiry and last access.
+    """
+
+    def __init__(self, directory=TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES, ttl=TILE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tiles ("
+            "key TEXT PRIMARY KEY, content_type TEXT, size INTEGER, expires_at REAL, last_access REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS tiles_last_access ON tiles (last_access)")
+        self._db.commit()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _delete(self, key):
+        self._db.execute("DELETE FROM tiles WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        """
+        Read a tile, dropping it if its TTL has expired.
+
+        Args:
+            key (str): The tile key.
+
+        Returns:
+            tuple: (content_type, body), or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT content_type, expires_at FROM tiles WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._delete(key)
+                self._db.commit()
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    body = f.read()
+            except FileNotFoundError:
+                self._delete(key)
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE tiles SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return row[0], body
+
+    def put(self, key, content_type, body):
+        """
+        Store a tile, then evict the least recently used tiles above max_bytes.
+
+        Args:
+            key (str): The tile key.
+            content_type (str): The MIME type of the tile.
+            body (bytes): The tile.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tiles (key, content_type, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, content_type, len(body), now + self.ttl, now)
+            )
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in self._db.execute("SELECT key, size FROM tiles ORDER BY last_access").fetchall():
+                    self._delete(old_key)
+                    total -= size
+                    if total <= self.max_bytes * 0.9:
+                        break
+            self._db.commit()
+
+
+class TileProxy:
+    """
+    XYZ tile proxy: /tiles/<layer>/<z>/<x>/<y> is served from the store or fetched from
+    the upstream URL template registered for the layer.
+    """
+
+    def __init__(self, store=None, host=TILE_PROXY_HOST, port=TILE_PROXY_PORT, public_url=None):
+        self.store = store if store is not None else TileStore()
+        self.host = host
+        self.port = port
+        self.public_url = public_url
+        self._layers = {}
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'errors': 0, 'hit_seconds': 0.0, 'miss_seconds': 0.0}
+        self._server = None
+
+    def register(self, layer, upstream_url):
+        """
+        Register (or update) the upstream URL template of a layer.
+
+        Args:
+            layer (str): A stable hex key of the layer (e.g., hash of image graph and vis params).
+            upstream_url (str): The upstream template with {z}, {x} and {y}.
+
+        Returns:
+            str: The proxied template to give to the map.
+        """
+        with self._lock:
+            self._layers[layer] = upstream_url
+        return f"{self.public_url or f'http://localhost:{self.port}'}/tiles/{layer}/{{z}}/{{x}}/{{y}}"
+
+    def fetch(self, layer, z, x, y):
+        """
+        Serve one tile, from the store or the upstream server.
+
+        Returns:
+            tuple: (HTTP status, content_type, body).
+        """
+        start = time.perf_counter()
+        key = hashlib.sha256(f"{layer}/{z}/{x}/{y}".encode()).hexdigest()
+        cached = self.store.get(key)
+        if cached is not None:
+            self._count('hits', 'hit_seconds', start)
+            return 200, cached[0], cached[1]
+
+        with self._lock:
+            upstream_url = self._layers.get(layer)
+        if upstream_url is None:
+            return 404, "text/plain", b"Unknown layer"
+        try:
+            url = upstream_url.replace("{z}", str(z)).replace("{x}", str(x)).replace("{y}", str(y))
+            with urllib.request.urlopen(url, timeout=UPSTREAM_TIMEOUT) as response:
+                content_type = response.headers.get("Content-Type", "image/png")
+                body = response.read()
+        except (urllib.error.URLError, OSError) as e:
+            logger.warning("Tile %s/%s/%s of layer %s failed: %s", z, x, y, layer, e)
+            self._count('errors', 'miss_seconds', start)
+            return 502, "text/plain", b"Upstream error"
+
+        self.store.put(key, content_type, body)
+        self._count('misses', 'miss_seconds', start)
+        return 200, content_type, body
+
+    def _count(self, counter, timer, start):
+        with self._lock:
+            self._counters[counter] += 1
+            self._counters[timer] += time.perf_counter() - start
+
+    def stats(self):
+        """
+        Hit rate and latency counters since the proxy started.
+
+        Returns:
+            dict: {'hits', 'misses', 'errors', 'hit_rate', 'hit_ms', 'miss_ms'} (mean latencies).
+        """
+        with self._lock:
+            c = dict(self._counters)
+        served = c['hits'] + c['misses']
+        return {
+            'hits': c['hits'],
+            'misses': c['misses'],
+            'errors': c['errors'],
+            'hit_rate': c['hits'] / served if served else 0.0,
+            'hit_ms': 1000 * c['hit_seconds'] / c['hits'] if c['hits'] else None,
+            'miss_ms': 1000 * c['miss_seconds'] / (c['misses'] + c['errors']) if c['misses'] + c['errors'] else None,
+        }
+
+    def start(self):
+        """
+        Serve in a background thread (idempotent).
+
+        Returns:
+            TileProxy: self.
+        """
+        if self._server is not None:
+            return self
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = TILE_PATH.match(self.path)
+                if match is None:
+                    status, content_type, body = 404, "text/plain", b"Not found"
+                else:
+                    status, content_type, body = proxy.fetch(
+                        match['layer'], int(match['z']), int(match['x']), int(match['y'])
+                    )
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                if status == 200:
+                    self.send_header("Cache-Control", f"max-age={proxy.store.ttl}")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="tile-proxy", daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+_proxy = None
+_proxy_lock = threading.Lock()
+
+
+def get_tile_proxy():
+    """
+    The process-wide proxy, started on first use; None unless TILE_PROXY=1.
+
+    Returns:
+        TileProxy: The running proxy, or None.
+    """
+    global _proxy
+    if not ENABLED:
+        return None
+    with _proxy_lock:
+        if _proxy is None:
+            try:
+                _proxy = TileProxy(public_url=TILE_PROXY_URL).start()
+            except OSError as e:
+                # Not retried: tiles keep coming from Earth Engine for this process
+                logger.warning("Tile proxy could not start, tiles are served by Earth Engine: %s", e)
+                _proxy = False
+    return _proxy or None
@@ -0,0 +1,151 @@
+"""
+Timelapse GIFs and period statistics of vegetation indices, run as background jobs
+(see utils.jobs) by the indice_evolution page.
+"""
+from concurrent.futures import as_completed
+
+import ee
+
+from utils.communes import commune_ee_bounds, commune_ee_geometry, get_commune
+from utils.ee_cache import ee_cached
+from utils.ee_composite import composite_statistics, index_collection, index_composite
+from utils.ee_executor import submit
+from utils.indices import index_vis_params
+
+# Earth Engine thumbnail URLs are short-lived: a URL is cached for at most half of their
+# lifetime and a finished timelapse job is kept for the other half, so no page is ever
+# served an expired URL
+THUMBNAIL_TTL = 60 * 60  # seconds
+URL_TTL = THUMBNAIL_TTL // 2
+JOB_TTL = THUMBNAIL_TTL - URL_TTL
+
+
+def generate_timelapse(collection, region, index, dimensions=215):
+    """
+    Generate the timelapse GIF of one vegetation index.
+
+    Args:
+        collection (ee.ImageCollection): The multi-index collection (see index_collection),
+            clipped to the region.
+        region (ee.Geometry): The region for the timelapse.
+        index (str): The vegetation index (e.g., 'NDVI'), a band of the collection.
+        dimensions (int): The maximum dimensions (width or height) of the GIF.
+
+    Returns:
+        str: The GIF URL.
+    """
+    # Get the display range and palette for the index
+    vis_params = index_vis_params(index)
+
+    # Add visualization and overlay dates
+    def add_date(img):
+        """
+        Annotates an image with its acquisition date.
+
+        Args:
+            img (ee.Image): The image to annotate.
+
+        Returns:
+            ee.Image: Annotated image.
+        """
+        # Check if 'system:time_start' exists and retrieve the date
+        date = ee.Date(img.get('system:time_start')).format('YYYY-MM-dd')
+
+        # Ensure the date is not null
+        date = ee.Algorithms.If(img.propertyNames().contains('system:time_start'), date, 'No Date')
+
+        # Create a feature with the date as a property
+        date_feature = ee.Feature(region.centroid(), {'label': date})
+
+        # Create an image layer from the feature
+        text_layer = ee.Image().paint(date_feature.geometry(), 1, 300)  # Adjust size and thickness
+
+        # Visualize the text
+        text_visualized = text_layer.visualize(palette=['black'])
+
+        # Blend the text layer with the visualized image
+        return img.visualize(**vis_params).blend(text_visualized)
+
+    collection = collection.select([index]).map(add_date)
+
+    # Export the GIF with reduced dimensions
+    gif_params = {
+        'dimensions': dimensions,  # Reduce dimensions to reduce pixel count
+        'region': region,
+        'framesPerSecond': 2,
+        'crs': 'EPSG:4326',
+    }
+
+    return collection.getVideoThumbURL(gif_params)
+
+
+@ee_cached(ttl=URL_TTL)
+def timelapse_url(commune_id, start_date, end_date, index, dimensions=215):
+    """
+    Timelapse GIF URL of one index for one commune and period, cached on disk.
+
+    Args:
+        commune_id (int): The ID of the commune.
+        start_date (str): The start date in 'YYYY-MM-DD' format.
+        end_date (str): The end date in 'YYYY-MM-DD' format.
+        index (str): The vegetation index (e.g., 'NDVI').
+        dimensions (int): The maximum dimensions (width or height) of the GIF.
+
+    Returns:
+        str: The GIF URL.
+    """
+    commune = get_commune(commune_id)
+    region = commune_ee_geometry(commune)
+    # Every scene of the period is a frame, however cloudy
+    collection = index_collection(
+        region, start_date, end_date, [index], mask_clouds=False, bounds=commune_ee_bounds(commune), max_cloud=None
+    ).map(lambda img: img.clip(region))
+    return generate_timelapse(collection, region, index, dimensions)
+
+
+def timelapse_job(progress, commune_id, start_date, end_date, indices, dimensions=215, statistics=False):
+    """
+    Timelapse GIF of each index, and optionally their statistics over the period, for one commune.
+
+    Each GIF URL is cached on its own (see timelapse_url), so asking for more indices, or
+    the same ones in another order, only requests the missing ones. The statistics of
+    the multi-index median composite cost one more reduction over the whole period, so
+    they are only requested, concurrently with the URLs, when asked for.
+
+    Args:
+        progress (callable): progress(fraction, message), see utils.jobs.
+        commune_id (int): The ID of the commune.
+        start_date (str): The start date in 'YYYY-MM-DD' format.
+        end_date (str): The end date in 'YYYY-MM-DD' format.
+        indices (list): The vegetation indices (e.g., ['NDVI', 'EVI']).
+        dimensions (int): The maximum dimensions (width or height) of the GIFs.
+        statistics (bool): Whether to compute the statistics of the median composite.
+
+    Returns:
+        dict: {'urls': {index: GIF URL}, 'means': {index: {statistic: value}}}, with
+        empty 'means' unless statistics is set.
+    """
+    if not ee.data.is_initialized():
+        ee.Initialize()
+
+    futures = {
+        submit(timelapse_url, commune_id, start_date, end_date, index, dimensions): index for index in indices
+    }
+    if statistics:
+        commune = get_commune(commune_id)
+        region = commune_ee_geometry(commune)
+        composite = index_composite(
+            region, start_date, end_date, list(indices), bounds=commune_ee_bounds(commune), max_cloud=None
+        )
+        futures[submit(composite_statistics, composite, region, scale=30)] = None
+
+    result = {'urls': {}, 'means': {}}
+    for done, future in enumerate(as_completed(futures), start=1):
+        index = futures[future]
+        if index is None:
+            result['means'] = future.result()
+        else:
+            result['urls'][index] = future.result()
+        progress(done / len(futures), f"{index or 'Statistiques'} prêt ({done}/{len(futures)})")
+    result['urls'] = {index: result['urls'][index] for index in indices}
+    return result
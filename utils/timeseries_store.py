@@ -0,0 +1,259 @@
+"""
+Local store of monthly commune time series (CHIRPS precipitation, MODIS index means).
+
+Past months never change, so they are fetched from Earth Engine once and kept on disk,
+partitioned by commune and dataset:
+
+    data/timeseries/commune=<id>/dataset=<name>/part-<uuid>.parquet
+
+with one row per month ('month', 'value', 'fetched_at'). A query plans the delta: the
+months already stored are read from disk, the missing ones are grouped into runs of
+consecutive months, each fetched with one server-side request (see
+utils.ee_timeseries.get_monthly_series) and appended as a new part file, written to a
+temporary name and moved into place. Recent months, whose products may still be
+revised, are fetched every time and never stored.
+"""
+import datetime
+import os
+import threading
+import uuid
+
+import pandas as pd
+
+from utils.ee_timeseries import month_labels
+
+TIMESERIES_DIR = os.environ.get("TIMESERIES_DIR", os.path.join("data", "timeseries"))
+# Months ending less than this many days ago are not final (CHIRPS final and MODIS
+# products are published a few weeks after the end of the month)
+FINAL_DELAY_DAYS = 45
+MAX_PARTS = 16  # part files of a partition before they are compacted into one
+
+PRECIPITATION = 'chirps'
+
+_lock = threading.Lock()
+_frames = {}  # partition path -> (part file names, DataFrame)
+
+
+def index_dataset(index):
+    """
+    Dataset name of a MODIS index.
+
+    Args:
+        index (str): The MODIS band (e.g., "NDVI").
+
+    Returns:
+        str: E.g. 'modis_NDVI'.
+    """
+    return f"modis_{index}"
+
+
+def partition_path(commune_id, dataset, root=TIMESERIES_DIR):
+    """
+    Directory of the parts of one commune and dataset.
+
+    Returns:
+        str: The partition directory.
+    """
+    return os.path.join(root, f"commune={int(commune_id)}", f"dataset={dataset}")
+
+
+def _parts(path):
+    try:
+        return tuple(sorted(f for f in os.listdir(path) if f.startswith("part-") and f.endswith(".parquet")))
+    except FileNotFoundError:
+        return ()
+
+
+def read_partition(commune_id, dataset, root=TIMESERIES_DIR):
+    """
+    Stored months of one commune and dataset, cached in memory until a part is added.
+
+    Args:
+        commune_id (int): The ID of the commune.
+        dataset (str): The dataset (PRECIPITATION or index_dataset(index)).
+        root (str): The store directory.
+
+    Returns:
+        pd.Series: The values indexed by month label ('YYYY-MM'), sorted.
+    """
+    path = partition_path(commune_id, dataset, root)
+    for _ in range(2):
+        parts = _parts(path)
+        with _lock:
+            cached = _frames.get(path)
+        if cached is not None and cached[0] == parts:
+            return cached[1]
+        try:
+            frames = [pd.read_parquet(os.path.join(path, part)) for part in parts]
+        except FileNotFoundError:
+            continue  # Compacted meanwhile: list the parts again
+        break
+    else:
+        raise OSError(f"Partition {path} changed while it was being read.")
+
+    if frames:
+        data = pd.concat(frames, ignore_index=True).sort_values('fetched_at')
+        series = data.drop_duplicates('month', keep='last').set_index('month')['value'].sort_index()
+    else:
+        series = pd.Series(dtype='float64', name='value')
+    with _lock:
+        _frames[path] = (parts, series)
+    return series
+
+
+def append_partition(commune_id, dataset, values, root=TIMESERIES_DIR):
+    """
+    Append months to a partition (a new part file, moved into place in one step).
+
+    Args:
+        commune_id (int): The ID of the commune.
+        dataset (str): The dataset.
+        values (dict): {month label: value (NaN when no image)}.
+        root (str): The store directory.
+    """
+    if not values:
+        return
+    path = partition_path(commune_id, dataset, root)
+    os.makedirs(path, exist_ok=True)
+    data = pd.DataFrame({
+        'month': list(values),
+        'value': pd.Series(list(values.values()), dtype='float64'),
+        'fetched_at': pd.Timestamp.now(tz='UTC'),
+    })
+    _write_part(path, data)
+    if len(_parts(path)) > MAX_PARTS:
+        _compact(commune_id, dataset, root)
+
+
+def _write_part(path, data):
+    name = f"part-{uuid.uuid4().hex}.parquet"
+    tmp = os.path.join(path, f".{name}.tmp")
+    data.to_parquet(tmp, index=False)
+    os.replace(tmp, os.path.join(path, name))
+
+
+def _compact(commune_id, dataset, root):
+    path = partition_path(commune_id, dataset, root)
+    parts = _parts(path)
+    series = read_partition(commune_id, dataset, root)
+    _write_part(path, pd.DataFrame({
+        'month': series.index,
+        'value': series.values,
+        'fetched_at': pd.Timestamp.now(tz='UTC'),
+    }))
+    for part in parts:
+        try:
+            os.remove(os.path.join(path, part))
+        except FileNotFoundError:
+            pass
+
+
+def is_final(month, today):
+    """
+    Whether a month is old enough for its values to be stored.
+
+    Args:
+        month (str): The month label ('YYYY-MM').
+        today (datetime.date): The current date.
+
+    Returns:
+        bool: True if the month ended at least FINAL_DELAY_DAYS ago.
+    """
+    year, number = map(int, month.split("-"))
+    month_end = datetime.date(year + number // 12, number % 12 + 1, 1)
+    return month_end + datetime.timedelta(days=FINAL_DELAY_DAYS) <= today
+
+
+def plan_fetch(months, stored, today):
+    """
+    Months to request from Earth Engine, grouped into runs of consecutive months.
+
+    Args:
+        months (list): The wanted month labels, in order.
+        stored (set): The month labels already stored in every needed dataset.
+        today (datetime.date): The current date.
+
+    Returns:
+        list: [(first_month, last_month), ...], one request each.
+    """
+    runs = []
+    previous = None
+    for i, month in enumerate(months):
+        if month in stored and is_final(month, today):
+            continue
+        if previous is not None and previous == i - 1:
+            runs[-1] = (runs[-1][0], month)
+        else:
+            runs.append((month, month))
+        previous = i
+    return runs
+
+
+def _month_start(month):
+    year, number = map(int, month.split("-"))
+    return datetime.date(year, number, 1)
+
+
+def _next_month(month):
+    year, number = map(int, month.split("-"))
+    return datetime.date(year + number // 12, number % 12 + 1, 1)
+
+
+def monthly_series(commune, start_date, end_date, index, today=None, root=TIMESERIES_DIR):
+    """
+    Monthly precipitation and index mean of a commune, from the store and Earth Engine.
+
+    Whole calendar months are used: every month touching [start_date, end_date).
+
+    Args:
+        commune (dict): The commune entry (see utils.communes).
+        start_date (datetime.date): The start date.
+        end_date (datetime.date): The end date (exclusive).
+        index (str): The MODIS band (e.g., "NDVI").
+        today (datetime.date, optional): The current date (default: today).
+        root (str): The store directory.
+
+    Returns:
+        tuple: (precipitation DataFrame, vegetation index DataFrame, dict with the number
+        of 'stored' months read from disk, 'fetched' months and Earth Engine 'requests').
+    """
+    today = today or datetime.date.today()
+    months = month_labels(datetime.date(start_date.year, start_date.month, 1), end_date)
+    datasets = [PRECIPITATION, index_dataset(index)]
+
+    stored = [read_partition(commune['id'], dataset, root) for dataset in datasets]
+    in_store = set(stored[0].index) & set(stored[1].index)
+    runs = plan_fetch(months, in_store, today)
+
+    fetched = [{}, {}]
+    if runs:
+        import ee
+
+        from utils.communes import commune_ee_bounds, commune_ee_geometry
+        from utils.ee_timeseries import get_monthly_series
+
+        if not ee.data.is_initialized():
+            ee.Initialize()
+        geometry, bounds = commune_ee_geometry(commune), commune_ee_bounds(commune)
+        for first, last in runs:
+            precipitation_df, index_df = get_monthly_series(
+                geometry, _month_start(first), _next_month(last), index, bounds=bounds
+            )
+            fetched[0].update(zip(precipitation_df['Month'], precipitation_df['Precipitation (mm)']))
+            fetched[1].update(zip(index_df['Month'], index_df[f'Mean {index}']))
+
+        for dataset, values in zip(datasets, fetched):
+            append_partition(commune['id'], dataset, {m: v for m, v in values.items() if is_final(m, today)}, root)
+
+    columns = []
+    for series, values in zip(stored, fetched):
+        merged = series.to_dict()
+        merged.update(values)
+        columns.append([merged.get(month, float('nan')) for month in months])
+
+    precipitation_df = pd.DataFrame({'Month': months, 'Precipitation (mm)': columns[0]})
+    index_df = pd.DataFrame({'Month': months, f'Mean {index}': columns[1]})
+    fetched_months = len(set(fetched[0]) | set(fetched[1]))
+    return precipitation_df, index_df, {
+        'stored': len(months) - fetched_months, 'fetched': fetched_months, 'requests': len(runs)
+    }
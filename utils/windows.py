@@ -0,0 +1,80 @@
+"""
+Composite windows: requests are snapped to canonical periods (dekads, half-months or
+calendar months), so nearby dates share the same composite, and its cached reductions.
+"""
+from datetime import datetime, timedelta
+
+# Policy -> label shown in the UI
+WINDOW_POLICIES = {
+    'dekad': "3 décades",
+    'half-month': "2 quinzaines",
+    'month': "Mois calendaire",
+    'rolling': "30 jours glissants",
+}
+DEFAULT_WINDOW = 'dekad'
+
+ROLLING_DAYS = 30
+# Number of whole periods in a window (about 30 days each)
+PERIODS = {'dekad': 3, 'half-month': 2, 'month': 1}
+
+
+def period_start(day, policy):
+    """
+    First day of the period containing a day.
+
+    Args:
+        day (datetime): The day.
+        policy (str): 'dekad' (1-10, 11-20, 21-end), 'half-month' (1-15, 16-end) or 'month'.
+
+    Returns:
+        datetime: The first day of the period.
+    """
+    if policy == 'dekad':
+        return day.replace(day=min((day.day - 1) // 10, 2) * 10 + 1)
+    if policy == 'half-month':
+        return day.replace(day=1 if day.day <= 15 else 16)
+    if policy == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unsupported window policy: {policy}")
+
+
+def composite_window(date, policy=DEFAULT_WINDOW):
+    """
+    Composite window for a requested date.
+
+    With 'rolling' the window is the 30 days before the date. Otherwise it is made of
+    the last whole periods ending on or before the date (a date on the last day of a
+    period includes that period), so every date of a period maps to the same window.
+
+    Args:
+        date (str): The requested date in "YYYY-MM-DD" format.
+        policy (str): One of WINDOW_POLICIES.
+
+    Returns:
+        tuple: (start_date, end_date) as datetime, start inclusive and end exclusive.
+    """
+    day = datetime.strptime(date, "%Y-%m-%d")
+    if policy == 'rolling':
+        return day - timedelta(days=ROLLING_DAYS), day
+    if policy not in PERIODS:
+        raise ValueError(f"Unsupported window policy: {policy}")
+
+    end_date = period_start(day + timedelta(days=1), policy)
+    start_date = end_date
+    for _ in range(PERIODS[policy]):
+        start_date = period_start(start_date - timedelta(days=1), policy)
+    return start_date, end_date
+
+
+def describe_window(start_date, end_date):
+    """
+    Human-readable window, with the inclusive last day.
+
+    Args:
+        start_date (datetime): The start date (inclusive).
+        end_date (datetime): The end date (exclusive).
+
+    Returns:
+        str: E.g. "du 2024-02-11 au 2024-03-10".
+    """
+    return f"du {start_date:%Y-%m-%d} au {end_date - timedelta(days=1):%Y-%m-%d}"